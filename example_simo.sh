@@ -63,6 +63,7 @@ pids[0]="${SDRTERM_PID}";
 host="";
 port="";
 decimatedFs="";
+outputRate="";
 mainPid="";
 declare -a outFiles;
 
@@ -107,6 +108,9 @@ while IFS= ; read -r line; do
   if [[ ! -z "$(echo $line | grep "decimatedFs" -)" ]]; then
     decimatedFs=$(sed -E "`generateRegex "decimatedFs" "([0-9]+)"`" <<< $line);
   fi
+  if [[ ! -z "$(echo $line | grep "outputRate" -)" ]]; then
+    outputRate=$(sed -E "`generateRegex "outputRate" "([0-9]+)"`" <<< $line);
+  fi
   if [[ ! -z $(echo $line | grep "Started proc Main") ]]; then
     mainPid=$(sed -E "`generateRegex "Started proc Main" "([0-9]+)"`" <<< $line);
     pids[1]=$mainPid;
@@ -135,12 +139,12 @@ for i in "${vfos[@]}"; do
 ## swap this out if you're not using the dsd code from: https://github.com/peads/dsd
 #  outFile="${OUT_PATH}/out-${freq}-${ts}.wav"
 #  set -u;
-#  cmd="socat TCP4:${host}:${port} - | sox -q -D -B -traw -b64 -ef -r${decimatedFs} - -traw -b16 -es -r48k - 2>/dev/null | ${DSD_CMD} -w ${outFile} 2>${fileName}"
+#  cmd="{ echo ${freq}; cat; } | socat TCP4:${host}:${port} - | sox -q -D -B -traw -b64 -ef -r${decimatedFs} - -traw -b16 -es -r48k - 2>/dev/null | ${DSD_CMD} -w ${outFile} 2>${fileName}"
 
   outFile="${OUT_PATH}/out-${freq}-${ts}.mp3"
   set -u;
-  cmd="socat TCP4:${host}:${port} - |
-    sox -q -D -B -traw -b64 -ef -r${decimatedFs} - -traw -b16 -es -r48k - 2>/dev/null |
+  cmd="{ echo ${freq}; cat; } | socat TCP4:${host}:${port} - |
+    sox -q -D -B -traw -b64 -ef -r${outputRate:-$decimatedFs} - -traw -b16 -es -r48k - 2>/dev/null |
     ${DSD_CMD} -w - 2>${fileName} |
     lame -q0 --bitwidth 16 --signed -s8 -r -mm --preset medium - ${outFile} 2>&1 > /dev/null";
   set -u;
@@ -158,16 +162,13 @@ for i in "${vfos[@]}"; do
   unset coprocName;
   unset tmp_in;
   unset tmp_out;
-  sleep 0.1; #TODO figure out a better way to sync this
 done
 unset i;
 
+# clients may come and go from here on, so keep logging without waiting on them
 while IFS= ; read -r line; do
   log "${line}"
-  if [[ $line == *"established"* ]]; then
-    break;
-  fi
-done <&"${SDR_IN}"
+done <&"${SDR_IN}" &
 
 trap cleanup EXIT;
 
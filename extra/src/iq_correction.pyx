@@ -34,6 +34,10 @@ cimport cython
 cimport numpy as np; np.import_array()
 from numpy cimport ndarray
 
+ctypedef fused complex_t:
+    np.complex64_t
+    np.complex128_t
+
 cdef class IQCorrection:
     cdef unsigned long _fs
     cdef readonly double inductance
@@ -43,7 +47,7 @@ cdef class IQCorrection:
         self.inductance = impedance / fs
 
     @cython.cdivision(True)
-    cpdef void correctIq(self, ndarray[np.complex128_t] data, ndarray[np.complex128_t] off):
+    cpdef void correctIq(self, ndarray[complex_t] data, ndarray[complex_t] off):
         cdef Py_ssize_t i
         cdef Py_ssize_t size = data.shape[0]
         with nogil:
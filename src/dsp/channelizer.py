@@ -0,0 +1,166 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from typing import Iterable
+
+from numba import njit
+from numpy import ndarray, dtype, complex128, float64, int64, zeros, array, rint, empty
+from scipy.fft import ifft
+
+from dsp.decimator import generateDecimationTaps
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _channelize(x: ndarray[any, dtype[complex128]],
+                taps: ndarray[any, dtype[float64]],
+                buf: ndarray[any, dtype[complex128]],
+                v: ndarray[any, dtype[complex128]],
+                state: ndarray[any, dtype[int64]],
+                factor: int,
+                res: ndarray[any, dtype[complex128]]) -> int:
+    n = x.shape[0]
+    nTaps = taps.shape[0]
+    h = nTaps - 1
+    M = res.shape[1]
+    blockSize = buf.shape[0] - h
+    offset, t = state[0], state[1]
+    m = 0
+
+    for i0 in range(0, n, blockSize):
+        b = min(blockSize, n - i0)
+        for i in range(b):
+            buf[h + i] = x[i0 + i]
+
+        for j in range(offset, b, factor):
+            # polyphase partial sums of the (time-reversed) prototype over the window ending at j + h
+            window = buf[j:j + nTaps]
+            v[:] = 0j
+            for p in range(0, nTaps, M):
+                for c in range(M):
+                    v[M - 1 - c] += taps[p + c] * window[p + c]
+
+            # rotate by the absolute time of the newest sample, so that each channel is
+            # phase-continuous with having mixed it down from the start of the stream
+            s = (t + i0 + j) % M
+            out = res[m]
+            for r in range(M):
+                out[(r - s) % M] = v[r]
+            m += 1
+
+        offset = (offset - b) % factor
+        for k in range(h):
+            buf[k] = buf[b + k]
+
+    state[0] = offset
+    state[1] = (t + n) % M
+    return m
+
+
+class Channelizer:
+    """
+    Polyphase filter bank analysis channelizer. Splits the input into `channels` channels spaced
+    fs / channels apart, each decimated by `factor`; i.e. critically sampled if channels equals
+    factor, and oversampled by channels / factor otherwise. Every output block costs a single
+    inverse FFT for all the channels, irrespective of how many of them are kept. Frequencies that
+    are not on the channel grid are assigned to their nearest channel, and the remaining offset is
+    reported by residuals; it is left to the caller to correct, e.g. with an Nco at the output rate
+    """
+    _BLOCK_SIZE = 4096
+
+    def __init__(self,
+                 fs: int,
+                 factor: int,
+                 channels: int,
+                 freqs: Iterable[float],
+                 taps: ndarray[any, dtype[float64]] = None):
+        if factor < 1:
+            raise ValueError('Decimation factor must be positive')
+        if channels < 1:
+            raise ValueError('Number of channels must be positive')
+        self._fs = fs
+        self._factor = factor
+        self._channels = channels
+        taps = generateDecimationTaps(factor) if taps is None else taps
+        # zero-pad the prototype to a whole number of polyphase branches
+        self._taps = zeros(-(-taps.size // channels) * channels, dtype=float64)
+        self._taps[:taps.size] = taps
+        self._taps = self._taps[::-1].copy()
+        self._buf = None
+        self._v = None
+        self._blocks = None
+        self._state = array([0, 0], dtype=int64)
+        self._bins = None
+        self._residuals = None
+        self._freqs = None
+        self.freqs = freqs
+
+    @property
+    def spacing(self) -> float:
+        return self._fs / self._channels
+
+    @property
+    def channels(self) -> int:
+        return self._channels
+
+    @property
+    def factor(self) -> int:
+        return self._factor
+
+    @property
+    def freqs(self) -> ndarray[any, dtype[float64]]:
+        return self._freqs
+
+    @freqs.setter
+    def freqs(self, freqs: Iterable[float]) -> None:
+        self._freqs = array(freqs, dtype=float64).reshape(-1)
+        nearest = rint(self._freqs / self.spacing)
+        self._bins = nearest.astype(int64) % self._channels
+        self._residuals = self._freqs - nearest * self.spacing
+
+    @property
+    def bins(self) -> ndarray[any, dtype[int64]]:
+        return self._bins
+
+    @property
+    def residuals(self) -> ndarray[any, dtype[float64]]:
+        """Offset of each frequency from the center of the channel it was assigned"""
+        return self._residuals
+
+    def outputSize(self, n: int) -> int:
+        return -(-n // self._factor)
+
+    def __call__(self, x: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[complex128]]) -> int:
+        """
+        Writes the channel assigned to each frequency into the corresponding row of res, and returns
+        the number of samples written per row
+        """
+        size = self.outputSize(x.shape[0])
+        if self._buf is None:
+            self._buf = zeros(self._taps.size - 1 + max(self._BLOCK_SIZE, self._taps.size << 2),
+                              dtype=x.dtype)
+            self._v = empty(self._channels, dtype=x.dtype)
+        if self._blocks is None or self._blocks.shape[0] < size:
+            self._blocks = empty((size, self._channels), dtype=x.dtype)
+
+        k = _channelize(x, self._taps, self._buf, self._v, self._state, self._factor, self._blocks)
+        if k:
+            # Y = M * ifft(v), since the channels are mixed down, i.e. by e^(-j * 2 * pi * f * t)
+            blocks = ifft(self._blocks[:k], axis=1, norm='forward', overwrite_x=True)
+            res[:, :k] = blocks[:, self._bins].T
+        return k
@@ -0,0 +1,127 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from numba import njit
+from numpy import ndarray, dtype, complex128, float64, zeros, count_nonzero
+from scipy.signal import firwin
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _updateHistory(x: ndarray[any, dtype[complex128]], history: ndarray[any, dtype[complex128]]) -> None:
+    rows, n = x.shape
+    h = history.shape[1]
+    for r in range(rows):
+        if n >= h:
+            for k in range(h):
+                history[r, k] = x[r, n - h + k]
+        else:
+            for k in range(h - n):
+                history[r, k] = history[r, k + n]
+            for k in range(n):
+                history[r, h - n + k] = x[r, k]
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _decimate(x: ndarray[any, dtype[complex128]],
+              taps: ndarray[any, dtype[float64]],
+              history: ndarray[any, dtype[complex128]],
+              offset: int,
+              factor: int,
+              res: ndarray[any, dtype[complex128]]) -> tuple[int, int]:
+    rows, n = x.shape
+    nTaps = taps.shape[0]
+    h = nTaps - 1
+    count = 0 if offset >= n else (n - offset + factor - 1) // factor
+
+    for r in range(rows):
+        # only the retained outputs are computed, i.e. each input sample costs nTaps / factor MACs
+        for m in range(count):
+            start = offset + m * factor - h
+            acc = 0j
+            if start >= 0:
+                for k in range(nTaps):
+                    acc += taps[k] * x[r, start + k]
+            else:
+                for k in range(-start):
+                    acc += taps[k] * history[r, h + start + k]
+                for k in range(-start, nTaps):
+                    acc += taps[k] * x[r, start + k]
+            res[r, m] = acc
+
+    _updateHistory(x, history)
+    return count, offset + count * factor - n
+
+
+def generateDecimationTaps(factor: int, halfLength: int = 10) -> ndarray[any, dtype[float64]]:
+    # same design scipy.signal.decimate uses for ftype='fir'
+    return firwin(2 * halfLength * factor + 1, 1. / factor, window='hamming')
+
+
+class PolyphaseDecimator:
+    """
+    Streaming FIR decimator. Taps are designed once, and the delay line, as well as the
+    decimation phase, are carried across calls, so consecutive chunks are filtered as though
+    they were one continuous signal.
+    """
+
+    def __init__(self, factor: int, taps: ndarray[any, dtype[float64]] = None):
+        if factor < 1:
+            raise ValueError('Decimation factor must be positive')
+        self._factor = factor
+        self._taps = (generateDecimationTaps(factor) if taps is None else taps)[::-1].copy()
+        self._history = None
+        self._offset = 0
+
+    @property
+    def factor(self) -> int:
+        return self._factor
+
+    @property
+    def taps(self) -> ndarray[any, dtype[float64]]:
+        return self._taps[::-1]
+
+    def outputSize(self, n: int) -> int:
+        """Upper bound on the number of samples produced from an input of length n"""
+        return -(-n // self._factor)
+
+    @property
+    def macsPerSample(self) -> float:
+        """Multiply-accumulates per input sample, and row"""
+        return count_nonzero(self._taps) / self._factor
+
+    @property
+    def plan(self) -> list[str]:
+        return [str(self)]
+
+    def reset(self) -> None:
+        self._history = None
+        self._offset = 0
+
+    def __call__(self,
+                 x: ndarray[any, dtype[complex128]],
+                 res: ndarray[any, dtype[complex128]]) -> int:
+        """Decimates each row of x into res, and returns the number of samples written per row"""
+        if self._history is None or self._history.shape[0] != x.shape[0]:
+            self._history = zeros((x.shape[0], self._taps.size - 1), dtype=x.dtype)
+        count, self._offset = _decimate(x, self._taps, self._history, self._offset, self._factor,
+                                        res)
+        return count
+
+    def __str__(self):
+        return f'FIR(factor={self._factor}, taps={self._taps.size})'
@@ -17,58 +17,124 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from numba import guvectorize, complex128 as nbComplex128, float64 as nbFloat64
-from numpy import angle, ndarray, conj, abs, real, imag, dtype, complex128, float64, square
-from scipy.signal import resample
+from math import atan2, pi
 
+from numba import guvectorize, njit, complex128 as nbComplex128, float64 as nbFloat64, \
+    complex64 as nbComplex64, float32 as nbFloat32
+from numpy import ndarray, abs, real, imag, dtype, complex128, float64, square
 
-@guvectorize([(nbComplex128[:], nbFloat64[:])], '(n)->(n)',
-             nopython=True,
-             cache=True,
-             boundscheck=False,
-             fastmath=True)
-def _fmDemod(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
-    for i in range(0, data.shape[0], 2):
-        res[i >> 1] = angle(data[i] * conj(data[i + 1]))
 
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def fastAtan2(y: float, x: float) -> float:
+    ax = abs(x)
+    ay = abs(y)
+    if ax == ay == 0:
+        return 0.
+    # reduce to the first octant, where a minimax polynomial in r is accurate to ~1e-5 radians
+    swap = ay > ax
+    r = ax / ay if swap else ay / ax
+    rr = r * r
+    a = r * (0.99997726 + rr * (-0.33262347 + rr * (0.19354346 + rr * (-0.11643287
+                                                                        + rr * (0.05265332
+                                                                                - rr * 0.01172120)))))
+    if swap:
+        a = pi / 2 - a
+    if x < 0:
+        a = pi - a
+    return -a if y < 0 else a
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _discriminate(data: ndarray[any, dtype[complex128]],
+                  prev: ndarray[any, dtype[complex128]],
+                  fast: bool,
+                  res: ndarray[any, dtype[float64]]) -> None:
+    for r in range(data.shape[0]):
+        p = prev[r]
+        for i in range(data.shape[1]):
+            c = data[r, i]
+            v = p * c.conjugate()
+            res[r, i] = fastAtan2(v.imag, v.real) if fast else atan2(v.imag, v.real)
+            p = c
+        if data.shape[1]:
+            prev[r] = p
+
+
+def fmDemod(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+    # stateless, so the first output of each row is zero; c.f. FmDiscriminator for streams
+    _discriminate(data, data[:, 0].copy(), False, res)
+
+
+class FmDiscriminator:
+    """
+    Full-rate polar discriminator. The last sample of each row is carried into the next call, so
+    the differentiator is continuous across chunks. If fast is set, the arctangent is computed by
+    a polynomial approximation instead.
+    """
+
+    def __init__(self, fast: bool = False):
+        self._fast = fast
+        self._prev = None
+
+    @property
+    def fast(self) -> bool:
+        return self._fast
+
+    def reset(self) -> None:
+        self._prev = None
 
-def fmDemod(data: ndarray[any, dtype[complex128]], tmp: ndarray[any, dtype[float64]]):
-    _fmDemod(data, tmp)
-    for i in range(tmp.shape[0]):
-        tmp[i] = resample(tmp[i][:tmp.shape[1] >> 1], tmp.shape[1])
+    def __call__(self, data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+        if self._prev is None or self._prev.shape[0] != data.shape[0]:
+            # start from the first sample, so the first output of the stream is zero, as for fmDemod
+            self._prev = data[:, 0].copy()
+        _discriminate(data, self._prev, self._fast, res)
 
 
-@guvectorize([(nbComplex128[:], nbFloat64[:])], '(n)->(n)',
+@guvectorize([(nbComplex128[:], nbFloat64[:]), (nbComplex64[:], nbFloat32[:])], '(n)->(n)',
              nopython=True,
              cache=True,
              boundscheck=False,
              fastmath=True)
-def amDemod(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+def _amDemod(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
     for i in range(data.shape[0]):
         res[i] = abs(square(data[i]))
 
 
-@guvectorize([(nbComplex128[:], nbFloat64[:])], '(n)->(n)',
+# gufuncs are pickled by value, which fails in spawned processes; plain functions are pickled by reference
+def amDemod(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+    _amDemod(data, res)
+
+
+@guvectorize([(nbComplex128[:], nbFloat64[:]), (nbComplex64[:], nbFloat32[:])], '(n)->(n)',
              nopython=True,
              cache=True,
              boundscheck=False,
              fastmath=True)
-def realOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+def _realOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
     for i in range(data.shape[0]):
         res[i] = real(data[i])
 
 
-@guvectorize([(nbComplex128[:], nbFloat64[:])], '(n)->(n)',
+def realOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+    _realOutput(data, res)
+
+
+@guvectorize([(nbComplex128[:], nbFloat64[:]), (nbComplex64[:], nbFloat32[:])], '(n)->(n)',
              nopython=True,
              cache=True,
              boundscheck=False,
              fastmath=True)
-def imagOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+def _imagOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
     for i in range(data.shape[0]):
         res[i] = imag(data[i])
 
 
-@guvectorize([(nbComplex128[:], nbComplex128[:, :], nbComplex128[:, :])], '(n),(m,n)->(m,n)',
+def imagOutput(data: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]):
+    _imagOutput(data, res)
+
+
+@guvectorize([(nbComplex128[:], nbComplex128[:, :], nbComplex128[:, :]),
+              (nbComplex64[:], nbComplex64[:, :], nbComplex64[:, :])], '(n),(m,n)->(m,n)',
              nopython=True,
              cache=True,
              boundscheck=False,
@@ -18,22 +18,22 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 from multiprocessing import Value, Queue
-from sys import stdout
 from typing import Callable, Iterable, Any
 
-from numpy import ndarray, dtype, complex128, float64, exp, arange, pi, empty, array
-from scipy.signal import decimate, dlti, savgol_filter, sosfilt, ellip
+from numpy import ndarray, dtype, complex128, float64, empty
+from scipy.signal import dlti, savgol_filter, ellip
 
 from dsp.data_processor import DataProcessor
-from dsp.demodulation import amDemod, fmDemod, realOutput, imagOutput, shiftFreq
+from dsp.decimator import PolyphaseDecimator
+from dsp.multistage_decimator import MultiStageDecimator, planDecimation
+from dsp.demodulation import amDemod, realOutput, imagOutput, FmDiscriminator
+from dsp.nco import Nco
+from dsp.resampler import RationalResampler
+from dsp.sos_filter import SosFilter
 from misc.general_util import vprint
-
-
-def applyFilters(y: ndarray | Iterable, *filters) -> ndarray[
-    any, dtype[float64 | complex128]]:
-    for sos in filters:
-        y = sosfilt(sos, y)
-    return y
+from misc.async_sink import AsyncSink
+from misc.outputs import openOutput
+from misc.sample_writer import SampleWriter, parseEncoding
 
 
 def generateEllipFilter(fs: int, deg: int, Wn: float | Iterable[float], btype: str) -> tuple[
@@ -56,24 +56,40 @@ class DspProcessor(DataProcessor):
                  dec: int = 2,
                  smooth: bool = False,
                  fileInfo: dict = None,
+                 fastAtan: bool = False,
+                 outputRate: int = None,
+                 outputEncoding: str = None,
+                 outputGain: float = 1.,
+                 dither: bool = False,
                  **kwargs):
 
         self._demod = None
-        self._shift = None
+        self._shift: Nco | None = None
+        self._centerFreq = 0
         self.bandwidth = None
         self.__fs = None
         self.__decimatedFs = None
         self._isDead = False
-        self._outputFilters = []
+        self._outputFilters: list[SosFilter] = []
+        self._resampler: RationalResampler | None = None
+        self._resampled = None
         self.tmp = None
         self._nFreq = 1
 
         self._decimationFactor = dec
+        self._decimator = self._createDecimator(dec)
         self.fs = fs
         self.centerFreq = center
         self.tunedFreq = tuned
         self.omegaOut = omegaOut
         self.smooth = smooth
+        self.fastAtan = fastAtan
+        self.outputRate = outputRate
+        # validated here, so that a bad encoding is reported before any process starts
+        parseEncoding(outputEncoding)
+        self.outputEncoding = outputEncoding
+        self.outputGain = outputGain
+        self.dither = dither
         self.__fileInfo = fileInfo
 
     @property
@@ -84,6 +100,18 @@ class DspProcessor(DataProcessor):
     def fs(self, fs: int) -> None:
         self.__fs = fs
         self.__decimatedFs = fs // self._decimationFactor
+        if self._shift is not None:
+            self._shift.fs = fs
+
+    @property
+    def centerFreq(self) -> int:
+        return self._centerFreq
+
+    @centerFreq.setter
+    def centerFreq(self, centerFreq: int) -> None:
+        self._centerFreq = centerFreq
+        if self._shift is not None:
+            self._shift.freqs = self._shiftFrequencies()
 
     @property
     def decimation(self) -> int:
@@ -94,8 +122,13 @@ class DspProcessor(DataProcessor):
         if decimation < 2:
             raise ValueError("Decimation must be at least 2.")
         self._decimationFactor = decimation
+        self._decimator = self._createDecimator(decimation)
         self.fs = self.__fs
 
+    @staticmethod
+    def _createDecimator(decimation: int) -> PolyphaseDecimator | MultiStageDecimator:
+        return planDecimation(decimation)
+
     @property
     def decimatedFs(self) -> int:
         return self.__decimatedFs
@@ -108,7 +141,7 @@ class DspProcessor(DataProcessor):
         if fun is not None:
             self._outputFilters.clear()
             if len(filters):
-                self._outputFilters.extend(*filters)
+                self._outputFilters.extend(SosFilter(sos) for sos in filters)
             setattr(self, 'demod', fun)
             return self.demod
         raise ValueError("Demodulation function, or filters not defined")
@@ -116,7 +149,7 @@ class DspProcessor(DataProcessor):
     def selectOutputFm(self):
         vprint('NFM Selected')
         self.bandwidth = 12500
-        self._setDemod(fmDemod,
+        self._setDemod(FmDiscriminator(self.fastAtan),
                        generateEllipFilter(self.__decimatedFs, self._FILTER_DEGREE, self.omegaOut,
                                            'lowpass'))
 
@@ -137,29 +170,47 @@ class DspProcessor(DataProcessor):
         self.bandwidth = self.decimatedFs
         self._setDemod(imagOutput)
 
+    def _demodulate(self,
+                    x: ndarray[any, dtype[complex128]],
+                    y: ndarray[any, dtype[complex128]],
+                    z: ndarray[any, dtype[float64]]) -> int:
+        if self._shift is not None:
+            self._shift(x[0], x)
+        k = self._decimator(x, y)
+        self.demod(y[:, :k], z[:, :k])
+        return k
+
     def _processChunk(self,
                       x: ndarray[any, dtype[complex128]],
                       y: ndarray[any, dtype[complex128]],
-                      z: ndarray[any, dtype[float64]]) -> None:
-        if self._shift is not None:
-            shiftFreq(x[0], self._shift, x)
-            # y = y * self._shift
-        y[:] = decimate(x, self._decimationFactor)
-        self.demod(y, z)
-        z[:] = applyFilters(z, self._outputFilters)
+                      z: ndarray[any, dtype[float64]]) -> ndarray[any, dtype[float64]]:
+        k = self._demodulate(x, y, z)
+        z = z[:, :k]
+        for outputFilter in self._outputFilters:
+            outputFilter(z)
+        return self._resample(z) if self.outputRate else z
+
+    def _resample(self, z: ndarray[any, dtype[float64]]) -> ndarray[any, dtype[float64]]:
+        if self._resampler is None or self._resampler.inputFs != self.__decimatedFs:
+            self._resampler = RationalResampler(self.__decimatedFs, self.outputRate)
+        size = self._resampler.outputSize(z.shape[1])
+        if (self._resampled is None
+                or self._resampled.shape[0] != z.shape[0]
+                or self._resampled.shape[1] < size):
+            self._resampled = empty((z.shape[0], size), dtype=z.dtype)
+        return self._resampled[:, :self._resampler(z, self._resampled)]
 
     def _transformData(self,
                        x: ndarray[any, dtype[complex128]],
                        y: ndarray[any, dtype[complex128]],
                        z: ndarray[any, dtype[float64]],
-                       file) -> None:
-        from struct import pack
-        self._processChunk(x, y, z)
+                       file: AsyncSink) -> None:
+        z = self._processChunk(x, y, z)
 
         if self.smooth:
             z[:] = savgol_filter(z, self.smooth, self._FILTER_DEGREE)
 
-        file.write(pack('@' + (z.size * 'd'), *z.flat))
+        file.write(z)
 
     def _processData(self, isDead: Value, buffer: Queue, file=None) -> None:
         x = None
@@ -170,26 +221,35 @@ class DspProcessor(DataProcessor):
                 x[0, :] = buffer.get()
             else:
                 x = buffer.get()
-                shape = (self._nFreq, x.size // self._decimationFactor)
+                shape = (self._nFreq, self._decimator.outputSize(x.size))
                 tmp = empty((self._nFreq, x.size), dtype=x.dtype)
                 tmp[0, :] = x
                 x = tmp
                 y = empty(shape, dtype=x.dtype)
-                z = empty(shape, dtype=float64)
+                z = empty(shape, dtype=x.real.dtype)
 
             if self._shift is None:
-                self._generateShift(x.shape[1])
+                self._generateShift()
 
             self._transformData(x, y, z, file)
 
-    def _generateShift(self, c: int) -> None:
-        if self.centerFreq:
-            self._shift = array([exp(-2j * pi * (self.centerFreq / self.__fs) * arange(c))])
+    def _shiftFrequencies(self) -> Iterable[int]:
+        return self._centerFreq,
+
+    def _generateShift(self) -> None:
+        if self._centerFreq:
+            self._shift = Nco(self.__fs, self._shiftFrequencies())
+
+    def _createSink(self, file, byteorder: str = '=', name: str = 'Sink') -> AsyncSink:
+        return AsyncSink(SampleWriter(file, parseEncoding(self.outputEncoding, byteorder),
+                                      self.outputGain, self.dither), name=name)
 
     def processData(self, isDead: Value, buffer: Queue, f: str, *args, **kwargs) -> None:
-        with open(f, 'wb') if f is not None else open(stdout.fileno(), 'wb', closefd=False) as file:
+        with openOutput(f, parseEncoding(self.outputEncoding)) as file:
+            sink = self._createSink(file)
             try:
-                self._processData(isDead, buffer, file)
+                self._processData(isDead, buffer, sink)
+                sink.close()
                 file.write(b'')
                 file.flush()
             except KeyboardInterrupt:
@@ -198,6 +258,14 @@ class DspProcessor(DataProcessor):
             #     from misc.general_util import printException
             #     printException(e)
             finally:
+                try:
+                    sink.close()
+                except BaseException:
+                    # already raised by the close above, or superseded by what ended the processing
+                    pass
+                vprint(f'Output: {sink}')
+                if sink.clipped:
+                    vprint(f'Output clipped {sink.clipped} sample(s)')
                 buffer.close()
                 buffer.join_thread()
                 vprint('Standard writer halted')
@@ -211,9 +279,12 @@ class DspProcessor(DataProcessor):
                      or issubclass(type(value), ndarray)
                      or issubclass(type(value), dlti)
                      or key in {'outputFilters'})}
+        d['centerFreq'] = self._centerFreq
         d['encoding'] = str(self.__fileInfo['bitsPerSample'])
         d['fs'] = self.__fs
         d['decimatedFs'] = self.__decimatedFs
+        d['decimationPlan'] = self._decimator.plan
+        d['macsPerSample'] = self._decimator.macsPerSample
         return dumps(d, indent=2)
 
     def __str__(self):
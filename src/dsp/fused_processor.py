@@ -0,0 +1,210 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from math import atan2
+
+from numba import njit
+from numpy import ndarray, dtype, complex128, float64, int64, zeros, exp, pi, floor, array, \
+    empty, abs, sqrt, mean, square
+
+from dsp.decimator import PolyphaseDecimator
+from dsp.demodulation import fastAtan2
+from dsp.dsp_processor import DspProcessor
+from misc.general_util import vprint
+
+_FM = 0
+_AM = 1
+_REAL = 2
+_IMAG = 3
+_FAST_FM = 4
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _fusedDemod(x: ndarray[any, dtype[complex128]],
+                taps: ndarray[any, dtype[float64]],
+                buf: ndarray[any, dtype[complex128]],
+                state: ndarray[any, dtype[int64]],
+                phase: ndarray[any, dtype[float64]],
+                step: complex,
+                prev: ndarray[any, dtype[complex128]],
+                factor: int,
+                mode: int,
+                res: ndarray[any, dtype[float64]]) -> int:
+    n = x.shape[0]
+    nTaps = taps.shape[0]
+    h = nTaps - 1
+    blockSize = buf.shape[0] - h
+    offset = state[0]
+    started = state[1]
+    osc = exp(2j * pi * phase[0])
+    p = prev[0]
+    m = 0
+
+    # the input is mixed a cache-sized block at a time into buf, which is prefixed with the filter's
+    # delay line, so each input sample is read from memory only once
+    for i0 in range(0, n, blockSize):
+        b = min(blockSize, n - i0)
+        for i in range(b):
+            buf[h + i] = x[i0 + i] * osc
+            osc *= step
+
+        for j in range(offset, b, factor):
+            window = buf[j:j + nTaps]
+            acc = 0j
+            for k in range(nTaps):
+                acc += taps[k] * window[k]
+
+            if _FM == mode or _FAST_FM == mode:
+                if not started:
+                    # start from the first sample, so the first output is zero, as for FmDiscriminator
+                    p = acc
+                    started = 1
+                v = p * acc.conjugate()
+                res[m] = atan2(v.imag, v.real) if _FM == mode else fastAtan2(v.imag, v.real)
+                p = acc
+            elif _AM == mode:
+                res[m] = acc.real * acc.real + acc.imag * acc.imag
+            elif _REAL == mode:
+                res[m] = acc.real
+            else:
+                res[m] = acc.imag
+            m += 1
+
+        offset = (offset - b) % factor
+        for k in range(h):
+            buf[k] = buf[b + k]
+
+    state[0] = offset
+    state[1] = started
+    prev[0] = p
+    return m
+
+
+class FusedEngine:
+    """
+    Single-pass equivalent of the shift -> decimate -> demodulate chain for one channel.
+    Each input sample is read once; only the filter's delay line, and the decimated output
+    are touched otherwise.
+    """
+    _BLOCK_SIZE = 4096
+
+    def __init__(self, fs: int, taps: ndarray[any, dtype[float64]], factor: int, mode: int):
+        self._fs = fs
+        self._taps = taps[::-1].copy()
+        self._factor = factor
+        self._mode = mode
+        self._buf = None
+        # the decimation phase, and whether a previous sample was seen
+        self._state = array([0, 0], dtype=int64)
+        self._phase = array([0.])
+        self._prev = array([0j])
+        self._cycles = 0.
+        self._step = 1 + 0j
+        self.freq = 0
+
+    @property
+    def fs(self) -> int:
+        return self._fs
+
+    @property
+    def factor(self) -> int:
+        return self._factor
+
+    @property
+    def freq(self) -> float:
+        return -self._cycles * self._fs
+
+    @freq.setter
+    def freq(self, freq: float) -> None:
+        self._cycles = -freq / self._fs
+        self._step = complex(exp(2j * pi * self._cycles))
+
+    def __call__(self, x: ndarray[any, dtype[complex128]], res: ndarray[any, dtype[float64]]) -> int:
+        if self._buf is None:
+            self._buf = zeros(self._taps.size - 1 + max(self._BLOCK_SIZE, self._taps.size << 2),
+                              dtype=x.dtype)
+        k = _fusedDemod(x, self._taps, self._buf, self._state, self._phase, self._step,
+                        self._prev, self._factor, self._mode, res)
+        self._phase += self._cycles * x.shape[0]
+        self._phase -= floor(self._phase)
+        return k
+
+
+class FusedDspProcessor(DspProcessor):
+    """
+    Single-channel processor that replaces the separate shift, decimate and demodulation passes
+    with a FusedEngine. If compare is set, the original chain is run alongside it, and the
+    deviation between the two is reported.
+    """
+
+    def __init__(self, fs: int, compare: bool = False, **kwargs):
+        super().__init__(fs, **kwargs)
+        self._compare = compare
+        self._mode = _FM
+        self._engine: FusedEngine | None = None
+        self._reference = None
+
+    @staticmethod
+    def _createDecimator(decimation: int) -> PolyphaseDecimator:
+        # the engine fuses a single filter, so the decimation is never split into stages
+        return PolyphaseDecimator(decimation)
+
+    def selectOutputFm(self):
+        super().selectOutputFm()
+        self._mode = _FAST_FM if self.fastAtan else _FM
+        self._engine = None
+
+    def selectOutputAm(self):
+        super().selectOutputAm()
+        self._mode = _AM
+        self._engine = None
+
+    def selectOutputReal(self):
+        super().selectOutputReal()
+        self._mode = _REAL
+        self._engine = None
+
+    def selectOutputImag(self):
+        super().selectOutputImag()
+        self._mode = _IMAG
+        self._engine = None
+
+    def _demodulate(self,
+                    x: ndarray[any, dtype[complex128]],
+                    y: ndarray[any, dtype[complex128]],
+                    z: ndarray[any, dtype[float64]]) -> int:
+        if (self._engine is None
+                or self._engine.factor != self._decimationFactor
+                or self._engine.fs != self.fs):
+            self._engine = FusedEngine(self.fs, self._decimator.taps, self._decimationFactor,
+                                       self._mode)
+        self._engine.freq = self.centerFreq
+        k = self._engine(x[0], z[0])
+
+        if self._compare:
+            if self._reference is None or self._reference.shape != z.shape:
+                self._reference = empty(z.shape, dtype=z.dtype)
+            j = super()._demodulate(x, y, self._reference)
+            diff = abs(self._reference[0, :j] - z[0, :k]) if j == k else None
+            if diff is None:
+                vprint(f'Fused engine produced {k} samples, whereas chain produced {j}')
+            else:
+                vprint(f'Fused engine deviation from chain: max: {diff.max()}, '
+                       f'rms: {sqrt(mean(square(diff)))}')
+        return k
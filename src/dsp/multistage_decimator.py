@@ -0,0 +1,333 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from math import floor, ceil, log2
+
+from numba import njit
+from numpy import ndarray, dtype, complex128, float64, int64, ones, convolve, flatnonzero, abs, \
+    sin, pi, linspace, append, empty, zeros
+from scipy.signal import firwin, firwin2
+
+from dsp.decimator import PolyphaseDecimator, _updateHistory
+
+_CIC_ORDER = 4
+# the CIC runs in wrapping 64-bit fixed point, in which its integrators are exact; inputs are
+# clipped to +/- 2 ** _CIC_RANGE_BITS, e.g. unnormalized 16-bit samples, and the register growth
+# of order * log2(factor) bits has to leave at least _CIC_MIN_FRACTION_BITS of fraction
+_CIC_RANGE_BITS = 16
+_CIC_MIN_FRACTION_BITS = 20
+_MAX_CIC_FACTOR = 1 << ((62 - _CIC_RANGE_BITS - _CIC_MIN_FRACTION_BITS) // _CIC_ORDER)
+_HALF_BAND_LENGTH = 3
+_MAX_HALF_BANDS = 2
+_MIN_FACTOR = 8
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _decimateSparse(x: ndarray[any, dtype[complex128]],
+                    taps: ndarray[any, dtype[float64]],
+                    indices: ndarray[any, dtype[int64]],
+                    history: ndarray[any, dtype[complex128]],
+                    offset: int,
+                    factor: int,
+                    res: ndarray[any, dtype[complex128]]) -> tuple[int, int]:
+    rows, n = x.shape
+    h = history.shape[1]
+    count = 0 if offset >= n else (n - offset + factor - 1) // factor
+
+    for r in range(rows):
+        for m in range(count):
+            start = offset + m * factor - h
+            acc = 0j
+            # only the non-zero taps are visited
+            for k in range(taps.shape[0]):
+                i = start + indices[k]
+                acc += taps[k] * (x[r, i] if i >= 0 else history[r, h + i])
+            res[r, m] = acc
+
+    _updateHistory(x, history)
+    return count, offset + count * factor - n
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _cic(x: ndarray[any, dtype[complex128]],
+         integrators: ndarray[any, dtype[int64]],
+         combs: ndarray[any, dtype[int64]],
+         offset: int,
+         factor: int,
+         scale: float,
+         limit: float,
+         gain: float,
+         res: ndarray[any, dtype[complex128]]) -> tuple[int, int]:
+    rows, n = x.shape
+    order = integrators.shape[2]
+    count = 0 if offset >= n else (n - offset + factor - 1) // factor
+
+    for r in range(rows):
+        m = 0
+        for i in range(n):
+            z = x[r, i]
+            for p in range(2):
+                v = z.real if 0 == p else z.imag
+                v = min(max(v, -limit), limit)
+                # integrators, i.e. additions only, which wrap harmlessly
+                acc = int64(floor(v * scale + .5))
+                for k in range(order):
+                    integrators[r, p, k] += acc
+                    acc = integrators[r, p, k]
+            if m < count and i == offset + m * factor:
+                # combs, at the output rate
+                re = integrators[r, 0, order - 1]
+                im = integrators[r, 1, order - 1]
+                for k in range(order):
+                    prev = combs[r, 0, k]
+                    combs[r, 0, k] = re
+                    re -= prev
+                    prev = combs[r, 1, k]
+                    combs[r, 1, k] = im
+                    im -= prev
+                res[r, m] = complex(re * gain, im * gain)
+                m += 1
+    return count, offset + count * factor - n
+
+
+def generateCicTaps(factor: int, order: int = _CIC_ORDER) -> ndarray[any, dtype[float64]]:
+    # impulse response of the CIC, i.e. the order-fold convolution of a length-factor boxcar
+    boxcar = ones(factor) / factor
+    taps = boxcar
+    for _ in range(order - 1):
+        taps = convolve(taps, boxcar)
+    return taps
+
+
+def generateHalfBandTaps(halfLength: int = _HALF_BAND_LENGTH) -> ndarray[any, dtype[float64]]:
+    taps = firwin(4 * halfLength + 3, .5, window='hamming')
+    # every other tap, but the center, is zero by design; make it exactly so
+    center = taps.size >> 1
+    centerTap = taps[center]
+    taps[center % 2::2] = 0
+    taps[center] = centerTap
+    return taps / taps.sum()
+
+
+def cicResponse(f: ndarray[any, dtype[float64]], factor: int, order: int = _CIC_ORDER) \
+        -> ndarray[any, dtype[float64]]:
+    """Magnitude response of a CIC at f, in cycles per sample of its input"""
+    res = ones(f.shape)
+    nonzero = f != 0
+    res[nonzero] = abs(sin(pi * factor * f[nonzero]) / (factor * sin(pi * f[nonzero]))) ** order
+    return res
+
+
+def generateCompensationTaps(factor: int,
+                             cicFactor: int,
+                             cicRatio: int,
+                             order: int = _CIC_ORDER,
+                             halfLength: int = 10) -> ndarray[any, dtype[float64]]:
+    """
+    Final stage low-pass with the same cutoff as generateDecimationTaps, whose passband is shaped
+    by the inverse of the CIC's droop. cicRatio is the ratio of the CIC's output rate to this
+    stage's input rate
+    """
+    cutoff = 1. / factor
+    freqs = linspace(0, cutoff, 64)
+    # freqs are in units of this stage's Nyquist frequency
+    gains = 1. / cicResponse(freqs / (2 * cicRatio * cicFactor), cicFactor, order)
+    freqs = append(freqs, (cutoff, 1.))
+    gains = append(gains, (0., 0.))
+    return firwin2(2 * halfLength * factor + 1, freqs, gains, window='hamming')
+
+
+class CicDecimator:
+    """
+    Recursive CIC decimator, i.e. order integrators at the input rate, and as many combs at the
+    output rate, with a differential delay of one; no multiplications but for the conversion into,
+    and out of fixed point, whatever the factor. Behaves as a PolyphaseDecimator with the taps of
+    generateCicTaps, to within the fixed point's resolution
+    """
+
+    def __init__(self, factor: int, order: int = _CIC_ORDER):
+        if not 1 < factor <= _MAX_CIC_FACTOR:
+            raise ValueError(f'CIC decimation factor must be within (1, {_MAX_CIC_FACTOR}]')
+        self._factor = factor
+        self._order = order
+        fraction = 62 - _CIC_RANGE_BITS - ceil(order * log2(factor))
+        self._scale = float(1 << fraction)
+        self._limit = float(1 << _CIC_RANGE_BITS)
+        self._gain = 1. / (self._scale * factor ** order)
+        self._integrators = None
+        self._combs = None
+        self._offset = 0
+
+    @property
+    def factor(self) -> int:
+        return self._factor
+
+    @property
+    def taps(self) -> ndarray[any, dtype[float64]]:
+        return generateCicTaps(self._factor, self._order)
+
+    @property
+    def macsPerSample(self) -> float:
+        """Multiplications per input sample, and row, i.e. only those of the conversions"""
+        return 1. + 1. / self._factor
+
+    @property
+    def plan(self) -> list[str]:
+        return [str(self)]
+
+    def outputSize(self, n: int) -> int:
+        return -(-n // self._factor)
+
+    def reset(self) -> None:
+        self._integrators = None
+        self._combs = None
+        self._offset = 0
+
+    def __call__(self,
+                 x: ndarray[any, dtype[complex128]],
+                 res: ndarray[any, dtype[complex128]]) -> int:
+        if self._integrators is None or self._integrators.shape[0] != x.shape[0]:
+            self._integrators = zeros((x.shape[0], 2, self._order), dtype=int64)
+            self._combs = zeros((x.shape[0], 2, self._order), dtype=int64)
+        count, self._offset = _cic(x, self._integrators, self._combs, self._offset, self._factor,
+                                   self._scale, self._limit, self._gain, res)
+        return count
+
+    def __str__(self):
+        return f'CIC(factor={self._factor}, order={self._order})'
+
+
+class HalfBandDecimator(PolyphaseDecimator):
+    def __init__(self, halfLength: int = _HALF_BAND_LENGTH):
+        super().__init__(2, generateHalfBandTaps(halfLength))
+        self._indices = flatnonzero(self._taps)
+        self._sparseTaps = self._taps[self._indices].copy()
+
+    def __call__(self,
+                 x: ndarray[any, dtype[complex128]],
+                 res: ndarray[any, dtype[complex128]]) -> int:
+        if self._history is None or self._history.shape[0] != x.shape[0]:
+            self._history = zeros((x.shape[0], self._taps.size - 1), dtype=x.dtype)
+        count, self._offset = _decimateSparse(x, self._sparseTaps, self._indices, self._history,
+                                              self._offset, self._factor, res)
+        return count
+
+    def __str__(self):
+        return f'HB(taps={self._taps.size})'
+
+
+class MultiStageDecimator:
+    """
+    Cascade of decimators that behaves as a single PolyphaseDecimator of the product of their
+    factors. Intermediate buffers are allocated on first use, and regrown only if a larger chunk
+    arrives.
+    """
+
+    def __init__(self, stages: list[PolyphaseDecimator]):
+        if not stages:
+            raise ValueError('At least one decimation stage is required')
+        self._stages = stages
+        self._buffers: list[ndarray | None] = [None] * (len(stages) - 1)
+        self._factor = 1
+        for stage in stages:
+            self._factor *= stage.factor
+
+    @property
+    def factor(self) -> int:
+        return self._factor
+
+    @property
+    def stages(self) -> list[PolyphaseDecimator]:
+        return self._stages
+
+    @property
+    def macsPerSample(self) -> float:
+        """Multiply-accumulates per input sample, and row"""
+        macs = 0.
+        rate = 1.
+        for stage in self._stages:
+            macs += stage.macsPerSample * rate
+            rate /= stage.factor
+        return macs
+
+    @property
+    def plan(self) -> list[str]:
+        return [str(stage) for stage in self._stages]
+
+    def outputSize(self, n: int) -> int:
+        for stage in self._stages:
+            n = stage.outputSize(n)
+        return n
+
+    def reset(self) -> None:
+        for stage in self._stages:
+            stage.reset()
+
+    def __call__(self,
+                 x: ndarray[any, dtype[complex128]],
+                 res: ndarray[any, dtype[complex128]]) -> int:
+        for i, stage in enumerate(self._stages[:-1]):
+            size = stage.outputSize(x.shape[1])
+            buffer = self._buffers[i]
+            if buffer is None or buffer.shape[0] != x.shape[0] or buffer.shape[1] < size:
+                buffer = self._buffers[i] = empty((x.shape[0], size), dtype=x.dtype)
+            x = buffer[:, :stage(x, buffer)]
+        return self._stages[-1](x, res)
+
+    def __str__(self):
+        return ' -> '.join(self.plan)
+
+
+def _smallestFactor(n: int) -> int:
+    f = 2
+    while f * f <= n:
+        if not n % f:
+            return f
+        f += 1
+    return n
+
+
+def planDecimation(factor: int) -> PolyphaseDecimator | MultiStageDecimator:
+    """
+    Factors the decimation into a CIC front end, up to two half-band filters, and a final FIR that
+    compensates for the CIC's droop, e.g. 50 into CIC(25), and FIR(2). The final stage decimates
+    by two, or for odd factors, by their smallest prime factor, and the CIC takes the rest, save
+    for the half-bands, and what exceeds _MAX_CIC_FACTOR. Factors less than eight, and primes are
+    left to the single-stage PolyphaseDecimator
+    """
+    finalFactor = 2 if not factor & 1 else _smallestFactor(factor)
+    if factor < _MIN_FACTOR or finalFactor == factor:
+        return PolyphaseDecimator(factor)
+
+    rest = factor // finalFactor
+    twos = (rest & -rest).bit_length() - 1
+    halfBands = min(twos, _MAX_HALF_BANDS)
+    cicFactor = rest >> halfBands
+    while cicFactor > _MAX_CIC_FACTOR:
+        f = _smallestFactor(cicFactor)
+        cicFactor //= f
+        finalFactor *= f
+
+    stages = []
+    if cicFactor > 1:
+        stages.append(CicDecimator(cicFactor))
+    stages.extend(HalfBandDecimator() for _ in range(halfBands))
+    taps = generateCompensationTaps(finalFactor, cicFactor, 1 << halfBands) if cicFactor > 1 else None
+    stages.append(PolyphaseDecimator(finalFactor, taps))
+    return MultiStageDecimator(stages)
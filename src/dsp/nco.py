@@ -0,0 +1,111 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from typing import Iterable
+
+from numba import njit
+from numpy import ndarray, dtype, complex128, float64, array, exp, pi, floor
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _mix(x: ndarray[any, dtype[complex128]],
+         phase: ndarray[any, dtype[float64]],
+         step: ndarray[any, dtype[complex128]],
+         res: ndarray[any, dtype[complex128]]) -> None:
+    rows = res.shape[0]
+    osc = exp(2j * pi * phase)
+    # each input sample is read exactly once (and before any write), so res may alias x
+    for i in range(x.shape[0]):
+        v = x[i]
+        for r in range(rows):
+            res[r, i] = v * osc[r]
+            osc[r] *= step[r]
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _mixRows(x: ndarray[any, dtype[complex128]],
+             phase: ndarray[any, dtype[float64]],
+             step: ndarray[any, dtype[complex128]],
+             res: ndarray[any, dtype[complex128]]) -> None:
+    for r in range(res.shape[0]):
+        osc = exp(2j * pi * phase[r])
+        s = step[r]
+        for i in range(x.shape[1]):
+            res[r, i] = x[r, i] * osc
+            osc *= s
+
+
+class Nco:
+    """
+    Numerically-controlled oscillator that mixes its input down by each of its frequencies.
+    The phase accumulator is carried across calls, so consecutive chunks are phase-continuous,
+    and retuning takes effect from the next sample without resetting the phase.
+    """
+
+    def __init__(self, fs: int, freqs: Iterable[float]):
+        self._fs = fs
+        self._freqs = None
+        self._cycles = None
+        self._step = None
+        self._phase = None
+        self.freqs = freqs
+
+    @property
+    def fs(self) -> int:
+        return self._fs
+
+    @fs.setter
+    def fs(self, fs: int) -> None:
+        self._fs = fs
+        self.freqs = self._freqs
+
+    @property
+    def freqs(self) -> ndarray[any, dtype[float64]]:
+        return self._freqs
+
+    @freqs.setter
+    def freqs(self, freqs: Iterable[float]) -> None:
+        freqs = array(freqs, dtype=float64).reshape(-1)
+        if self._phase is None or self._phase.size != freqs.size:
+            self._phase = array([0.] * freqs.size)
+        self._freqs = freqs
+        self._cycles = -freqs / self._fs
+        self._step = exp(2j * pi * self._cycles)
+
+    @property
+    def phase(self) -> ndarray[any, dtype[float64]]:
+        """Current phase of each oscillator in cycles, i.e. on the interval [0, 1)"""
+        return self._phase
+
+    def __len__(self) -> int:
+        return self._freqs.size
+
+    def __call__(self,
+                 x: ndarray[any, dtype[complex128]],
+                 res: ndarray[any, dtype[complex128]]) -> None:
+        """
+        Writes x mixed by each oscillator into the corresponding row of res. If x is
+        two-dimensional, each of its rows is mixed by the corresponding oscillator instead
+        """
+        if x.ndim > 1:
+            _mixRows(x, self._phase, self._step, res)
+        else:
+            _mix(x, self._phase, self._step, res)
+        self._phase += self._cycles * x.shape[-1]
+        self._phase -= floor(self._phase)
@@ -0,0 +1,115 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from math import gcd
+
+from numba import njit
+from numpy import ndarray, dtype, float64, int64, zeros, array
+from scipy.signal import firwin
+
+from dsp.decimator import _updateHistory
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _resample(x: ndarray[any, dtype[float64]],
+              phases: ndarray[any, dtype[float64]],
+              history: ndarray[any, dtype[float64]],
+              state: ndarray[any, dtype[int64]],
+              up: int,
+              down: int,
+              res: ndarray[any, dtype[float64]]) -> int:
+    rows, n = x.shape
+    h = history.shape[1]
+    nPhase = phases.shape[1]
+    t = state[0]
+    count = 0
+
+    # t is the next output's position on the upsampled grid, relative to the start of x
+    while t // up < n:
+        base = t // up
+        phase = phases[t % up]
+        for r in range(rows):
+            acc = 0.
+            for q in range(nPhase):
+                i = base - q
+                acc += phase[q] * (x[r, i] if i >= 0 else history[r, h + i])
+            res[r, count] = acc
+        count += 1
+        t += down
+
+    _updateHistory(x, history)
+    state[0] = t - n * up
+    return count
+
+
+class RationalResampler:
+    """
+    Streaming polyphase resampler from inputFs to outputFs, i.e. by the ratio up / down of the two
+    in lowest terms. Only the filter phases needed by each output are evaluated, and the delay
+    line, as well as the position on the upsampled grid, are carried across calls.
+    """
+
+    def __init__(self, inputFs: int, outputFs: int, halfLength: int = 10):
+        if inputFs < 1 or outputFs < 1:
+            raise ValueError('Sampling rates must be positive')
+        self._inputFs = inputFs
+        self._outputFs = outputFs
+        d = gcd(inputFs, outputFs)
+        self._up = outputFs // d
+        self._down = inputFs // d
+
+        factor = max(self._up, self._down)
+        taps = firwin(2 * halfLength * factor + 1, 1. / factor, window='hamming') * self._up
+        nPhase = -(-taps.size // self._up)
+        padded = zeros(nPhase * self._up)
+        padded[:taps.size] = taps
+        # phases[p, q] = taps[p + q * up]
+        self._phases = padded.reshape(nPhase, self._up).T.copy()
+        self._history = None
+        self._state = array([0], dtype=int64)
+
+    @property
+    def inputFs(self) -> int:
+        return self._inputFs
+
+    @property
+    def outputFs(self) -> int:
+        return self._outputFs
+
+    @property
+    def up(self) -> int:
+        return self._up
+
+    @property
+    def down(self) -> int:
+        return self._down
+
+    def outputSize(self, n: int) -> int:
+        """Upper bound on the number of samples produced from an input of length n"""
+        return -(-n * self._up // self._down)
+
+    def reset(self) -> None:
+        self._history = None
+        self._state[0] = 0
+
+    def __call__(self, x: ndarray[any, dtype[float64]], res: ndarray[any, dtype[float64]]) -> int:
+        """Resamples each row of x into res, and returns the number of samples written per row"""
+        if self._history is None or self._history.shape[0] != x.shape[0]:
+            self._history = zeros((x.shape[0], self._phases.shape[1] - 1), dtype=x.dtype)
+        return _resample(x, self._phases, self._history, self._state, self._up, self._down, res)
@@ -0,0 +1,78 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from numba import njit
+from numpy import ndarray, dtype, float64, zeros, ascontiguousarray
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _sosfilt(sos: ndarray[any, dtype[float64]],
+             zi: ndarray[any, dtype[float64]],
+             y: ndarray[any, dtype[float64]]) -> None:
+    rows, n = y.shape
+    sections = sos.shape[0]
+
+    for r in range(rows):
+        state = zi[r]
+        for i in range(n):
+            # transposed direct form II, i.e. the same structure, and state layout as scipy's sosfilt
+            x = y[r, i]
+            for s in range(sections):
+                out = sos[s, 0] * x + state[s, 0]
+                state[s, 0] = sos[s, 1] * x - sos[s, 4] * out + state[s, 1]
+                state[s, 1] = sos[s, 2] * x - sos[s, 5] * out
+                x = out
+            y[r, i] = x
+
+
+class SosFilter:
+    """
+    Streaming second-order sections filter. Each row of the input has its own filter state, which
+    is carried across calls, so consecutive chunks are filtered as though they were one continuous
+    signal.
+    """
+
+    def __init__(self, sos: ndarray[any, dtype[float64]]):
+        if sos is None:
+            raise TypeError('Filter must be an array of second-order sections')
+        sos = ascontiguousarray(sos, dtype=float64)
+        if sos.ndim != 2 or sos.shape[1] != 6:
+            raise ValueError(f'Second-order sections must be of shape (n, 6), not {sos.shape}')
+        # normalize, so that a0 is unity for each section
+        self._sos = sos / sos[:, 3:4]
+        self._zi = None
+
+    @property
+    def sos(self) -> ndarray[any, dtype[float64]]:
+        return self._sos
+
+    @property
+    def zi(self) -> ndarray[any, dtype[float64]]:
+        """Filter state of shape (rows, sections, 2)"""
+        return self._zi
+
+    def reset(self) -> None:
+        self._zi = None
+
+    def __call__(self, y: ndarray[any, dtype[float64]]) -> ndarray[any, dtype[float64]]:
+        """Filters each row of y in place, and returns it"""
+        if self._zi is None or self._zi.shape[0] != y.shape[0] or self._zi.dtype != y.dtype:
+            self._zi = zeros((y.shape[0], self._sos.shape[0], 2), dtype=y.dtype)
+        _sosfilt(self._sos, self._zi, y)
+        return y
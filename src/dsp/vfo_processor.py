@@ -17,98 +17,128 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from io import RawIOBase
-from multiprocessing import Value
-from queue import Queue
-from socketserver import ThreadingMixIn, TCPServer, BaseRequestHandler
-from threading import Thread, Event
+from multiprocessing import Value, Queue
+from typing import Iterable, IO
+from urllib.parse import urlsplit
 
-from numpy import pi, array, complex128, exp, arange, ones
+from numpy import array, ndarray, dtype, complex128, float64
 
+from dsp.channelizer import Channelizer
 from dsp.dsp_processor import DspProcessor
-from misc.general_util import eprint, findPort, tprint, vprint, shutdownSocket
-
-
-class ThreadedTCPServer(ThreadingMixIn, TCPServer):
-    pass
+from dsp.nco import Nco
+from misc.general_util import eprint, findPort, vprint
+from misc.io_args import OverrunPolicy
+from misc.outputs import openOutput, SCHEMES
+from misc.sample_writer import SampleWriter, parseEncoding
+from misc.vfo_server import VfoServer
 
 
 class VfoProcessor(DspProcessor):
-
-    def __init__(self, fs, vfoHost: str = 'localhost', vfos: str = None, **kwargs):
+    """
+    Multi-channel processor that serves each of the vfos to its own client. If channelSpacing is
+    set, the channels are extracted by a polyphase filter bank channelizer with that spacing instead
+    of being shifted, and decimated individually; vfos that do not fall on the channel grid are
+    assigned to the nearest channel, and the remainder is corrected after decimation. Every client
+    is sent to from a single thread, through a buffer of its own, whose overrun is handled per
+    vfoOverrun. Processing starts straight away; clients may connect, and subscribe to any of the
+    vfos at any time, cf. VfoServer, and those that no one is subscribed to are discarded. Framed
+    clients, cf. VfoDemux, are sent the index of each chunk's first output sample. Every vfo may
+    also be sent to vfoOutput, e.g. a udp multicast group, or a fifo per vfo, cf. openOutput.
+    """
+
+    def __init__(self, fs, vfoHost: str = 'localhost', vfos: str = None, channelSpacing: int = None,
+                 vfoOverrun: OverrunPolicy | str = OverrunPolicy.DROP,
+                 vfoBufferSize: int = 1 << 20,
+                 vfoOutput: str = None,
+                 **kwargs):
+        self._channelizer: Channelizer | None = None
         super().__init__(fs, **kwargs)
         if vfos is None or len(vfos) < 1:
             raise ValueError('simo mode cannot be used without the vfos option')
         self.vfosStr = vfos + ',0'
-        self.vfos = vfos.split(',')
-        self.vfos = [int(x) + self.centerFreq for x in self.vfos if x is not None]
-        self.vfos.append(self.centerFreq)
-        self.vfos = array(self.vfos)
+        self._offsets = [int(x) for x in vfos.split(',') if x is not None]
+        self._offsets.append(0)
+        self._offsets = array(self._offsets)
+        self.vfos = self._offsets + self.centerFreq
         self._nFreq = len(self.vfos)
-        self.__omega = -2j * pi * (self.vfos / self.fs)
         if ':' in vfoHost:
             self.host, self.port = vfoHost.split(':')
             self.port = int(self.port)
         else:
             self.host = vfoHost
             self.port = findPort(self.host)
-        self.__queue: Queue[int, ...] | None = None
-        self.__clients: dict[str, RawIOBase] | None = None
-        self.__event: Event | None = None
-
-    @property
-    def clients(self) -> dict[str, RawIOBase]:
-        return self.__clients
-
-    @property
-    def event(self) -> Event:
-        return self.__event
+        self.channels = None
+        if channelSpacing:
+            channels = round(fs / channelSpacing)
+            if channels < 1:
+                raise ValueError('Channel spacing cannot exceed the sampling rate')
+            self.channels = channels
+            self._channelizer = Channelizer(fs, self.decimation, channels, self.vfos)
+        self.vfoOverrun = OverrunPolicy(vfoOverrun)
+        self.vfoBufferSize = vfoBufferSize
+        if vfoOutput is not None and urlsplit(vfoOutput).scheme not in SCHEMES:
+            raise ValueError(f'Unsupported vfo output: {vfoOutput}')
+        self.vfoOutput = vfoOutput
+        self.__server: VfoServer | None = None
+        self.__writers: list[SampleWriter] | None = None
+        self.__outputs: list[IO] = []
+        self.__index = 0
 
     @property
-    def queue(self) -> Queue[int, ...]:
-        return self.__queue
-
-    def _generateShift(self, c: int) -> None:
-        self._shift = ones(shape=(self._nFreq, c), dtype=complex128)
-        for i, w in enumerate(self.__omega):
-            self._shift[i][:] = exp(w * arange(c))
-            self.queue.put(w)
-            tprint(f'Put {w}')
-        self.queue.join()
-        eprint('Connection(s) established')
+    def server(self) -> VfoServer:
+        return self.__server
+
+    def _shiftFrequencies(self) -> Iterable[int]:
+        self.vfos = self._offsets + self.centerFreq
+        if self._channelizer is not None:
+            self._channelizer.freqs = self.vfos
+            return self._channelizer.residuals
+        return self.vfos
+
+    def _generateShift(self) -> None:
+        if self._channelizer is not None:
+            self._shift = Nco(self.decimatedFs, self._shiftFrequencies())
+        else:
+            self._shift = Nco(self.fs, self._shiftFrequencies())
+
+    def _demodulate(self,
+                    x: ndarray[any, dtype[complex128]],
+                    y: ndarray[any, dtype[complex128]],
+                    z: ndarray[any, dtype[float64]]) -> int:
+        if self._channelizer is None:
+            return super()._demodulate(x, y, z)
+        if self._channelizer.factor != self.decimation:
+            self._channelizer = Channelizer(self.fs, self.decimation, self.channels, self.vfos)
+        k = self._channelizer(x[0], y)
+        self._shift(y[:, :k], y[:, :k])
+        self.demod(y[:, :k], z[:, :k])
+        return k
 
     def _transformData(self, x, y, z, _=None) -> None:
-        from struct import pack
-        self._processChunk(x, y, z)
-        for (request, data) in zip(self.__clients.values(), z):
-            request.write(pack('!' + str(data.size) + 'd', *data))
+        server = self.__server
+        outputs = self.__outputs
+        z = self._processChunk(x, y, z)
+        # only the vfos that something is listening to are encoded; the rest are discarded
+        chunks = [writer.encode(data) if outputs or server.subscribed(i) else None
+                  for i, (writer, data) in enumerate(zip(self.__writers, z))]
+        for output, chunk in zip(outputs, chunks):
+            output.write(chunk)
+        server.publish(chunks, self.__index)
+        self.__index += z.shape[1]
 
     def processData(self, isDead: Value, buffer: Queue, *args, **kwargs) -> None:
-        self.__queue = Queue()
-        self.__event = Event()
-        self.__clients = {}
-
-        class ThreadedTCPRequestHandler(BaseRequestHandler):
-            outer_self: VfoProcessor = self
-
-            def finish(self):
-                eprint(f'Client disconnected: {self.request.getsockname()}')
-                shutdownSocket(self.request)
-                self.request.close()
-
-            def handle(self):
-                eprint(f'Connection request from {self.request.getsockname()}')
-                with self.request.makefile('wb', buffering=False) as file:
-                    self.outer_self.clients[self.outer_self.queue.get()] = file
-                    self.outer_self.queue.task_done()
-                    self.outer_self.event.wait()
-
-        with ThreadedTCPServer((self.host, self.port), ThreadedTCPRequestHandler) as server:
-            st = Thread(target=server.serve_forever)
-
+        with VfoServer(self.host, self.port, self.vfos, self.vfoOverrun,
+                       self.vfoBufferSize) as server:
+            self.__server = server
+            # network byte order, unless otherwise specified
+            encoding = parseEncoding(self.outputEncoding, '>')
+            self.__writers = [SampleWriter(None, encoding, self.outputGain, self.dither)
+                              for _ in range(len(self.vfos))]
             try:
-                eprint(f'\nAccepting connections on {server.socket.getsockname()}\n')
-                st.start()
+                if self.vfoOutput is not None:
+                    for i, freq in enumerate(self.vfos):
+                        self.__outputs.append(openOutput(self.vfoOutput, encoding, i, str(freq)))
+                eprint(f'\nAccepting connections on {server.address}\n')
                 self._processData(isDead, buffer)
             except KeyboardInterrupt:
                 pass
@@ -116,11 +146,13 @@ class VfoProcessor(DspProcessor):
             #     from misc.general_util import printException
             #     printException(e)
             finally:
-                self.__event.set()
                 self._isDead = True
-                server.shutdown()
-                with self.__queue.all_tasks_done:
-                    self.__queue.all_tasks_done.notify_all()
-                st.join()
+                for output in self.__outputs:
+                    output.close()
+                for freq, writer in zip(self.vfos, self.__writers):
+                    if writer.clipped:
+                        vprint(f'Output for {freq} clipped {writer.clipped} sample(s)')
+                buffer.close()
+                buffer.join_thread()
                 vprint('Multi-VFO writer halted')
                 return
@@ -0,0 +1,122 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+
+from numpy import ndarray, empty, copyto
+
+from misc.sample_writer import SampleWriter
+
+
+class AsyncSink:
+    """
+    Hands the output to a SampleWriter running in its own thread, so that encoding, and writing a
+    chunk overlaps with processing the next one. Each chunk is copied into one of a small pool of
+    buffers, which are allocated once and reused; the producer only waits, i.e. stalls, when every
+    one of them is still queued to be written. An error raised by the writer is raised again by the
+    next call to write, or by close
+    """
+
+    def __init__(self, writer: SampleWriter, buffers: int = 2, name: str = 'Sink'):
+        if buffers < 1:
+            raise ValueError('Sink must have at least one buffer')
+        self._writer = writer
+        self._free: Queue[ndarray | None] = Queue()
+        self._pending: Queue[tuple[ndarray, ndarray, float] | None] = Queue()
+        for _ in range(buffers):
+            self._free.put(None)
+        self._error: BaseException | None = None
+        self._stalled = 0.
+        self._latency = 0.
+        self._maxLatency = 0.
+        self._chunks = 0
+        self._closed = False
+        self._thread = Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def writer(self) -> SampleWriter:
+        return self._writer
+
+    @property
+    def clipped(self) -> int:
+        return self._writer.clipped
+
+    @property
+    def stalled(self) -> float:
+        """Total time, in seconds, the producer waited for a free buffer"""
+        return self._stalled
+
+    @property
+    def latency(self) -> float:
+        """Mean time, in seconds, from a chunk being queued to it having been written"""
+        return self._latency / self._chunks if self._chunks else 0.
+
+    @property
+    def maxLatency(self) -> float:
+        return self._maxLatency
+
+    @property
+    def chunks(self) -> int:
+        return self._chunks
+
+    def _run(self) -> None:
+        while (item := self._pending.get()) is not None:
+            buffer, chunk, queued = item
+            if self._error is None:
+                try:
+                    self._writer.write(chunk)
+                except BaseException as e:
+                    # keep draining, so that the producer never waits on a buffer forever
+                    self._error = e
+            latency = perf_counter() - queued
+            self._latency += latency
+            self._maxLatency = max(self._maxLatency, latency)
+            self._chunks += 1
+            self._free.put(buffer)
+
+    def write(self, z: ndarray) -> None:
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError('Sink is closed')
+
+        start = perf_counter()
+        buffer = self._free.get()
+        self._stalled += perf_counter() - start
+        if buffer is None or buffer.size < z.size or buffer.dtype != z.dtype:
+            buffer = empty(z.size, dtype=z.dtype)
+        chunk = buffer[:z.size].reshape(z.shape)
+        copyto(chunk, z)
+        self._pending.put((buffer, chunk, perf_counter()))
+
+    def close(self) -> None:
+        """Waits for the queued chunks to be written, stops the thread, and raises any error of the writer"""
+        if not self._closed:
+            self._closed = True
+            self._pending.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __str__(self):
+        return (f'{self._chunks} chunk(s) written with {self.latency * 1e3:.3f} ms mean, '
+                f'{self._maxLatency * 1e3:.3f} ms max latency; stalled for {self._stalled:.3f} s')
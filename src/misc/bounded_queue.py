@@ -0,0 +1,94 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from multiprocessing import Queue
+from queue import Full, Empty
+
+from numpy import ndarray
+
+from misc.io_args import OverrunPolicy
+
+
+class BoundedQueue:
+    """
+    multiprocessing.Queue of at most maxsize chunks. Once full, a producer either waits for the
+    consumer, or discards the oldest chunk to make room, depending on the policy. Overflows, and
+    drops are counted on the producer's side
+    """
+
+    def __init__(self, maxsize: int, policy: OverrunPolicy | str = OverrunPolicy.BLOCK):
+        if maxsize < 1:
+            raise ValueError('Queue must hold at least one chunk')
+        self._queue = Queue(maxsize)
+        self._policy = OverrunPolicy(policy)
+        self._overflows = 0
+        self._dropped = 0
+        self._pending = False
+
+    @property
+    def policy(self) -> OverrunPolicy:
+        return self._policy
+
+    @property
+    def overflows(self) -> int:
+        """Number of chunks that found the queue full"""
+        return self._overflows
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def put(self, z: ndarray | bytes, timeout: float = None) -> bool:
+        """Returns False if the chunk could not be queued before timeout elapsed"""
+        try:
+            self._queue.put_nowait(z)
+            self._pending = False
+            return True
+        except Full:
+            # a chunk retried after a timeout is only counted as an overflow the first time
+            if not self._pending:
+                self._overflows += 1
+            self._pending = True
+
+        try:
+            if OverrunPolicy.DROP == self._policy:
+                self._queue.get(timeout=timeout)
+                self._dropped += 1
+                self._queue.put_nowait(z)
+            else:
+                self._queue.put(z, timeout=timeout)
+        except (Full, Empty):
+            return False
+        self._pending = False
+        return True
+
+    def get(self, block: bool = True, timeout: float = None) -> ndarray | bytes:
+        return self._queue.get(block, timeout)
+
+    def close(self) -> None:
+        self._queue.close()
+
+    def join_thread(self) -> None:
+        self._queue.join_thread()
+
+    def cancel_join_thread(self) -> None:
+        self._queue.cancel_join_thread()
+
+    def __str__(self):
+        return f'{self.__class__.__name__}({self._policy})'
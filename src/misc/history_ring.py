@@ -0,0 +1,108 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from mmap import mmap
+from threading import Lock
+
+
+class HistoryRing:
+    """
+    The most recent size bytes of a stream, e.g. of an rtl_tcp server's, kept so that they can be
+    read again. Positions are absolute, i.e. counted from the start of the stream, so that a reader
+    can tell whether what it wants is still held. Appending costs the same however large the ring
+    is; the oldest bytes are simply overwritten. With a path, the ring is a memory-mapped file of
+    that size, which the kernel may page out, rather than memory of the process
+    """
+
+    def __init__(self, size: int, path: str = None):
+        if size < 1:
+            raise ValueError('History must hold at least one byte')
+        self._path = path
+        self._file = None
+        self._buffer: bytearray | mmap = self._allocate(size)
+        self._size = size
+        self._end = 0
+        self._start = 0
+        self._lock = Lock()
+
+    def _allocate(self, size: int) -> bytearray | mmap:
+        if self._path is None:
+            return bytearray(size)
+        if self._file is None:
+            self._file = open(self._path, 'w+b')
+        self._file.truncate(size)
+        return mmap(self._file.fileno(), size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def start(self) -> int:
+        """Position of the oldest byte held"""
+        return self._start
+
+    @property
+    def end(self) -> int:
+        """Position after the newest byte, i.e. the number of bytes appended so far"""
+        return self._end
+
+    def append(self, data) -> None:
+        view = memoryview(data).cast('B')
+        if len(view) > self._size:
+            # only the tail would survive anyway
+            with self._lock:
+                self._end += len(view) - self._size
+            view = view[-self._size:]
+        n = len(view)
+        with self._lock:
+            i = self._end % self._size
+            head = min(n, self._size - i)
+            self._buffer[i:i + head] = view[:head]
+            self._buffer[:n - head] = view[head:]
+            self._end += n
+            self._start = max(self._start, self._end - self._size)
+
+    def read(self, start: int, stop: int) -> bytes:
+        """Copy of the bytes from start up to stop, which have to be held"""
+        with self._lock:
+            if not self._start <= start <= stop <= self._end:
+                raise ValueError(f'[{start}, {stop}) is not within [{self._start}, {self._end})')
+            i = start % self._size
+            n = stop - start
+            head = min(n, self._size - i)
+            return b''.join((self._buffer[i:i + head], self._buffer[:n - head]))
+
+    def resize(self, size: int) -> None:
+        """Discards the history, e.g. once it no longer matches the stream; positions carry on"""
+        if size < 1:
+            raise ValueError('History must hold at least one byte')
+        with self._lock:
+            if isinstance(self._buffer, mmap):
+                self._buffer.close()
+            self._buffer = self._allocate(size)
+            self._size = size
+            self._start = self._end
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap):
+            self._buffer.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
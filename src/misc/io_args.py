@@ -34,6 +34,33 @@ class DemodulationChoices(str, Enum):
         return self.value
 
 
+class EngineChoices(str, Enum):
+    CHAIN = "chain"
+    FUSED = "fused"
+    COMPARE = "compare"
+
+    def __str__(self):
+        return self.value
+
+
+class PrecisionChoices(str, Enum):
+    DOUBLE = "double"
+    SINGLE = "single"
+
+    def __str__(self):
+        return self.value
+
+
+class OverrunPolicy(str, Enum):
+    BLOCK = "block"
+    DROP = "drop"
+    # only for sockets, i.e. vfo clients
+    DISCONNECT = "disconnect"
+
+    def __str__(self):
+        return self.value
+
+
 def selectDemodulation(demodType: DemodulationChoices, processor) -> Callable:
     tprint(f'{demodType} requested')
     if 'fm' == demodType or 'nfm' == demodType:
@@ -66,18 +93,33 @@ def selectPlotType(plotType: str):
     raise ValueError(f'Invalid plot type {plotType}')
 
 
+def setVerbosity(verbose: int) -> None:
+    from misc.general_util import traceOn, verboseOn
+    if verbose > 1:
+        traceOn()
+    elif verbose > 0:
+        verboseOn()
+
+
+def _runVerbosely(verbose: int, target: Callable, *args, **kwargs) -> None:
+    # spawned processes don't inherit the parent's verbosity
+    setVerbosity(verbose)
+    target(*args, **kwargs)
+
+
 class IOArgs:
     from multiprocessing import Value
+    _RING_SLOTS = 16
+    # the writer may fall as far behind as the ring allows; plots only ever need the latest frame
+    _QUEUE_SIZES = {OverrunPolicy.BLOCK: _RING_SLOTS, OverrunPolicy.DROP: 1}
     strct = None
+    verbose = 0
 
     def __init__(self, verbose: int = 0, **kwargs):
-        from misc.general_util import traceOn, verboseOn
         from misc.file_util import checkWavHeader
         IOArgs.strct = kwargs
-        if verbose > 1:
-            traceOn()
-        elif verbose > 0:
-            verboseOn()
+        IOArgs.verbose = verbose
+        setVerbosity(verbose)
         kwargs['fileInfo'] = checkWavHeader(kwargs['inFile'], kwargs['fs'], kwargs['enc'])
         kwargs['fs'] = kwargs['fileInfo']['sampRate']
 
@@ -86,14 +128,24 @@ class IOArgs:
 
     @classmethod
     def _initializeProcess(cls, isDead: Value, processor, *args,
-                           name: str = 'Process', **kwargs) -> tuple[Queue, Process]:
+                           name: str = 'Process', buffer=None, **kwargs) -> tuple[Queue, Process]:
         if processor is None:
             raise ValueError('Processor must be provided')
-        buffer = Queue()
-        proc = Process(target=processor.processData, args=(isDead, buffer, *args), kwargs=kwargs)
+        if buffer is None:
+            buffer = cls._createBuffer(OverrunPolicy.BLOCK)
+        proc = Process(target=_runVerbosely,
+                       args=(cls.verbose, processor.processData, isDead, buffer, *args),
+                       kwargs=kwargs)
         proc.name = name + str(processor)
         return buffer, proc
 
+    @classmethod
+    def _createBuffer(cls, policy: OverrunPolicy, ring=None):
+        if ring is not None:
+            return ring.consumer(policy)
+        from misc.bounded_queue import BoundedQueue
+        return BoundedQueue(cls._QUEUE_SIZES[policy], policy)
+
     @classmethod
     def _initializeOutputHandlers(cls,
                                   isDead: Value = None,
@@ -101,14 +153,34 @@ class IOArgs:
                                   dm: DemodulationChoices | str = None,
                                   outFile: str = None,
                                   simo: bool = False,
+                                  engine: EngineChoices | str = EngineChoices.CHAIN,
                                   pl: str = None,
                                   processes: list[Process] = None,
                                   buffers: list[Queue] = None,
+                                  sharedBuffer: bool = False,
                                   **kwargs) -> None:
         import os
         from misc.general_util import eprint
 
-        if not simo:
+        plots = pl.split(',') if pl is not None and len(pl) > 0 else []
+        ring = None
+        if sharedBuffer:
+            from numpy import complex64, complex128
+            from misc.read_file import READ_SIZE
+            from misc.shared_ring_buffer import SharedRingBuffer
+            # the largest chunk the reader produces is that of the narrowest input type
+            itemSize = kwargs['fileInfo']['bitsPerSample'].itemsize if 'fileInfo' in kwargs else 1
+            ring = cls.strct['ring'] = SharedRingBuffer(
+                READ_SIZE // (itemSize << 1),
+                cls._RING_SLOTS,
+                len(plots) + 1,
+                complex64 if 'single' == kwargs.get('precision') else complex128)
+
+        if not simo and EngineChoices.CHAIN != engine:
+            from dsp.fused_processor import FusedDspProcessor
+            cls.strct['processor'] = FusedDspProcessor
+            kwargs['compare'] = EngineChoices.COMPARE == engine
+        elif not simo:
             from dsp.dsp_processor import DspProcessor
             cls.strct['processor'] = DspProcessor
         else:
@@ -117,17 +189,19 @@ class IOArgs:
         cls.strct['processor'] = cls.strct['processor'](fs, **kwargs)
         selectDemodulation(dm, cls.strct['processor'])()
 
-        if pl is not None and len(pl) > 0:
+        if len(plots):
             if 'posix' in os.name and 'DISPLAY' not in os.environ:
                 eprint('Warning: Plot(s) selected, but no display(s) detected')
             else:
-                for p in pl.split(','):
+                for p in plots:
                     psplot = selectPlotType(p)
                     kwargs['bandwidth'] = cls.strct['processor'].bandwidth
                     if psplot is not None:
                         buffer, proc = cls._initializeProcess(isDead,
                                                               psplot,
                                                               fs, name="Plotter-",
+                                                              buffer=cls._createBuffer(
+                                                                  OverrunPolicy.DROP, ring),
                                                               **kwargs)
                         processes.append(proc)
                         buffers.append(buffer)
@@ -136,6 +210,7 @@ class IOArgs:
                                               cls.strct['processor'],
                                               outFile,
                                               name="File writer-",
+                                              buffer=cls._createBuffer(OverrunPolicy.BLOCK, ring),
                                               **kwargs)
         processes.append(proc)
         buffers.append(buffer)
@@ -0,0 +1,348 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+from abc import ABC, abstractmethod
+from io import RawIOBase
+from ipaddress import ip_address
+from stat import S_ISFIFO, S_ISSOCK
+from socket import socket, gethostbyname, AF_INET, SOCK_DGRAM, IPPROTO_IP, IP_MULTICAST_TTL
+from struct import Struct
+from sys import stdout
+from typing import IO
+from urllib.parse import urlsplit, parse_qs
+
+from numpy import dtype
+
+from misc.general_util import findMtu, vprint
+from misc.vfo_server import frameFormat
+
+# format, channel, sequence number, and index of the first sample; the count follows from the size
+DATAGRAM_HEADER = Struct('!2sHIQ')
+UDP = 'udp'
+UNIX = 'unix'
+UNIX_PACKET = 'unixpacket'
+FIFO = 'fifo'
+SCHEMES = (UDP, UNIX, UNIX_PACKET, FIFO)
+_IP_HEADERS = 28
+_MAX_DATAGRAM = 65507
+_DEFAULT_MTU = 1500
+# scatter-gather avoids copying the header, and payload together where it is available
+_SENDMSG = hasattr(socket, 'sendmsg')
+_PACKET_SIZE = 1 << 16
+
+
+class UdpSink(RawIOBase):
+    """
+    Writes samples as UDP datagrams, each of at most one MTU, so that they are never fragmented,
+    and prefixed with DATAGRAM_HEADER; receivers detect loss by the gaps in the sequence numbers,
+    and sample indices. When the address is a multicast group, every listener receives the same
+    datagrams, so that the cost of sending does not depend on their number
+    """
+
+    def __init__(self, host: str, port: int, encoding: dtype, channel: int = 0, ttl: int = 1):
+        super().__init__()
+        address = gethostbyname(host)
+        self._sock = socket(AF_INET, SOCK_DGRAM)
+        if ip_address(address).is_multicast:
+            self._sock.setsockopt(IPPROTO_IP, IP_MULTICAST_TTL, ttl)
+        # connecting binds the local interface, whose mtu applies
+        self._sock.connect((address, port))
+        try:
+            mtu = findMtu(self._sock)
+        except ValueError:
+            mtu = _DEFAULT_MTU
+        self._itemSize = encoding.itemsize
+        payload = min(mtu - _IP_HEADERS, _MAX_DATAGRAM) - DATAGRAM_HEADER.size
+        self._payload = payload - payload % self._itemSize
+        self._format = frameFormat(encoding)
+        self._channel = channel
+        self._sequence = 0
+        self._index = 0
+        self._refused = 0
+
+    @property
+    def payload(self) -> int:
+        """Most bytes of samples per datagram"""
+        return self._payload
+
+    @property
+    def sequence(self) -> int:
+        return self._sequence
+
+    @property
+    def refused(self) -> int:
+        """Number of datagrams that an unicast receiver was not listening for"""
+        return self._refused
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        for i in range(0, len(view), self._payload):
+            payload = view[i:i + self._payload]
+            header = DATAGRAM_HEADER.pack(self._format, self._channel,
+                                          self._sequence & 0xFFFFFFFF, self._index)
+            try:
+                if _SENDMSG:
+                    self._sock.sendmsg((header, payload))
+                else:
+                    self._sock.send(header + payload.tobytes())
+            except ConnectionRefusedError:
+                # nobody is listening, yet; unlike tcp, this is not fatal
+                self._refused += 1
+            self._sequence += 1
+            self._index += len(payload) // self._itemSize
+        return len(view)
+
+    def close(self) -> None:
+        if not self.closed:
+            vprint(f'Sent {self._sequence} datagram(s) of at most {self._payload} byte(s) to '
+                   f'{self._sock.getpeername()}; {self._refused} refused')
+            self._sock.close()
+        super().close()
+
+
+class _LocalSink(RawIOBase, ABC):
+    """
+    Output to a single local reader through a path that is created, and removed again by the sink.
+    If wait, opening waits for the reader, and its leaving is an error, as it would be for a pipe;
+    otherwise, samples are discarded, and counted, whenever no reader is attached, and readers may
+    come and go. Nor is such a reader waited for: writing never blocks, and whatever it is not
+    ready for is dropped, and counted; except that a write it took in part is finished first, so
+    that the stream stays aligned
+    """
+
+    def __init__(self, path: str, wait: bool):
+        super().__init__()
+        self._path = path
+        self._wait = wait
+        self._discarded = 0
+        self._dropped = 0
+        self._created = False
+        # the rest of a write the reader only took in part
+        self._tail: memoryview | None = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    @abstractmethod
+    def attached(self) -> bool:
+        pass
+
+    @property
+    def discarded(self) -> int:
+        """Number of bytes written without a reader attached"""
+        return self._discarded
+
+    @property
+    def dropped(self) -> int:
+        """Number of bytes written while the reader was not ready for them"""
+        return self._dropped
+
+    def _removeStale(self, isType) -> None:
+        try:
+            if isType(os.stat(self._path).st_mode):
+                os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+    @abstractmethod
+    def _attach(self, block: bool) -> bool:
+        """Attaches a reader, if there is one, or waits for one if block; the writes block if wait"""
+        pass
+
+    @abstractmethod
+    def _detach(self) -> None:
+        pass
+
+    @abstractmethod
+    def _sendSome(self, view: memoryview) -> int:
+        """Writes as much of view as the reader takes at once, and returns its size"""
+        pass
+
+    def _send(self, view: memoryview) -> int:
+        sent = 0
+        try:
+            while sent < len(view):
+                sent += self._sendSome(view[sent:])
+        except BlockingIOError:
+            pass
+        return sent
+
+    def _sendNonBlocking(self, view: memoryview) -> None:
+        if self._tail is not None:
+            self._tail = self._tail[self._send(self._tail):]
+            if len(self._tail):
+                self._dropped += len(view)
+                return
+            self._tail = None
+        sent = self._send(view)
+        if not sent:
+            self._dropped += len(view)
+        elif sent < len(view):
+            # copied, since the caller reuses its buffer
+            self._tail = memoryview(view[sent:].tobytes())
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        if not (self.attached or self._attach(False)):
+            self._discarded += len(view)
+            return len(view)
+        try:
+            if self._wait:
+                self._send(view)
+            else:
+                self._sendNonBlocking(view)
+        except (BrokenPipeError, ConnectionResetError):
+            self._detach()
+            self._tail = None
+            if self._wait:
+                raise
+            self._discarded += len(view)
+        return len(view)
+
+    def _release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if not self.closed:
+            if self.attached:
+                self._detach()
+            self._release()
+            if self._created:
+                try:
+                    os.unlink(self._path)
+                except FileNotFoundError:
+                    pass
+            if self._discarded:
+                vprint(f'{self._discarded} byte(s) discarded without a reader on {self._path}')
+            if self._dropped:
+                vprint(f'{self._dropped} byte(s) dropped while the reader of {self._path} fell behind')
+        super().close()
+
+
+class UnixSink(_LocalSink):
+    """
+    Listens on a unix domain socket at path for a reader to connect; with packet, a seqpacket
+    socket, which keeps each write, i.e. chunk, of up to _PACKET_SIZE bytes whole
+    """
+
+    def __init__(self, path: str, encoding: dtype, packet: bool = False, wait: bool = True):
+        from socket import AF_UNIX, SOCK_STREAM, SOCK_SEQPACKET
+        super().__init__(path, wait)
+        self._packet = _PACKET_SIZE - _PACKET_SIZE % encoding.itemsize if packet else 0
+        self._conn: socket | None = None
+        self._removeStale(S_ISSOCK)
+        self._sock = socket(AF_UNIX, SOCK_SEQPACKET if packet else SOCK_STREAM)
+        self._sock.bind(path)
+        self._created = True
+        self._sock.listen(1)
+        if wait:
+            self._attach(True)
+
+    @property
+    def attached(self) -> bool:
+        return self._conn is not None
+
+    def _attach(self, block: bool) -> bool:
+        self._sock.setblocking(block)
+        try:
+            self._conn, _ = self._sock.accept()
+        except BlockingIOError:
+            return False
+        self._conn.setblocking(self._wait)
+        return True
+
+    def _detach(self) -> None:
+        self._conn.close()
+        self._conn = None
+
+    def _sendSome(self, view: memoryview) -> int:
+        return self._conn.send(view[:self._packet] if self._packet else view)
+
+    def _release(self) -> None:
+        self._sock.close()
+
+
+class FifoSink(_LocalSink):
+    """Writes to a named pipe at path, which is created unless it already exists"""
+
+    def __init__(self, path: str, wait: bool = True):
+        super().__init__(path, wait)
+        self._fd: int | None = None
+        if not os.path.exists(path):
+            os.mkfifo(path)
+            self._created = True
+        elif not S_ISFIFO(os.stat(path).st_mode):
+            raise ValueError(f'{path} exists, and is not a fifo')
+        if wait:
+            self._attach(True)
+
+    @property
+    def attached(self) -> bool:
+        return self._fd is not None
+
+    def _attach(self, block: bool) -> bool:
+        try:
+            self._fd = os.open(self._path, os.O_WRONLY | (0 if block else os.O_NONBLOCK))
+        except OSError:
+            # ENXIO, i.e. no reader, yet
+            return False
+        os.set_blocking(self._fd, self._wait)
+        return True
+
+    def _detach(self) -> None:
+        os.close(self._fd)
+        self._fd = None
+
+    def _sendSome(self, view: memoryview) -> int:
+        return os.write(self._fd, view)
+
+
+def openOutput(f: str | None, encoding: dtype, channel: int = 0, suffix: str = None) -> IO:
+    """
+    Opens the output of a channel's samples in encoding, i.e. stdout if None, a datagram sink for
+    urls like udp://<host>:<port>[?ttl=<hops>], which sends each channel to its own port, starting
+    from port, a unix domain stream, or seqpacket socket, or a fifo for unix://<path>,
+    unixpacket://<path>, or fifo://<path>, and a file otherwise. Channels are told apart by
+    appending -<suffix> to local paths, whose readers may then come and go, rather than being
+    waited for
+    """
+    if f is None:
+        return open(stdout.fileno(), 'wb', closefd=False)
+    url = urlsplit(f)
+    if UDP == url.scheme:
+        ttl = int(parse_qs(url.query).get('ttl', (1,))[0])
+        return UdpSink(url.hostname, url.port + channel, encoding, channel, ttl)
+    if url.scheme in (UNIX, UNIX_PACKET, FIFO):
+        path = f[len(url.scheme) + 3:]
+        wait = suffix is None
+        if not wait:
+            path = f'{path}-{suffix}'
+        if FIFO == url.scheme:
+            return FifoSink(path, wait)
+        return UnixSink(path, encoding, UNIX_PACKET == url.scheme, wait)
+    return open(f, 'wb')
@@ -17,15 +17,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+from functools import cache
 from io import BufferedReader
 from multiprocessing import Value, Process, Queue
 from sys import stdin
 from typing import Iterable
 
-from numba import guvectorize, complex128 as nbComplex128
-from numpy import frombuffer, ndarray, complex128, dtype, empty, uint8, complex128, array
+from numba import guvectorize, complex128 as nbComplex128, complex64 as nbComplex64
+from numpy import frombuffer, ndarray, complex128, dtype, empty, uint8, complex64, array, arange, \
+    uint16
 
-from misc.general_util import vprint, eprint, tprint, applyIgnoreException
+from misc.general_util import vprint, eprint, tprint
+
+READ_SIZE = 131072
 
 
 def readFile(bitsPerSample: dtype = None,
@@ -35,12 +39,14 @@ def readFile(bitsPerSample: dtype = None,
              processes: Iterable[Process] = None,
              isDead: Value = None,
              inFile: str = None,
-             readSize: int = 131072,
+             readSize: int = READ_SIZE,
              swapEndianness: bool = False,
              correctIq: bool = False,
              normalize: bool = False,
              isSocket: bool = False,
              impedance: int = 50,
+             precision: str = 'double',
+             ring=None,
              **_) -> None:
     if fs is None:
         raise ValueError('fs is not specified')
@@ -50,7 +56,8 @@ def readFile(bitsPerSample: dtype = None,
 
     dataType = dtype([('re', bitsPerSample), ('im', bitsPerSample)])
     buffer = empty(readSize, dtype=uint8)
-    offset = array([complex128(0j)])
+    complexType = complex64 if 'single' == precision else complex128
+    offset = array([0j], dtype=complexType)
 
     def _correctIq(*_) -> None:
         pass
@@ -64,7 +71,8 @@ def readFile(bitsPerSample: dtype = None,
             tprint('Falling back to local IQCorrection')
             inductance: float = impedance / fs
 
-            @guvectorize([(nbComplex128[:], nbComplex128[:])], '(n)->()',
+            @guvectorize([(nbComplex128[:], nbComplex128[:]),
+                          (nbComplex64[:], nbComplex64[:])], '(n)->()',
                          nopython=True,
                          cache=True,
                          boundscheck=False,
@@ -79,13 +87,18 @@ def readFile(bitsPerSample: dtype = None,
     def _normalize(*_) -> None:
         pass
 
-    if normalize:
+    # 8, and 16-bit samples have few enough values to be converted, and normalized by lookup instead
+    lut = generateLut(bitsPerSample, complexType, normalize)
+    if lut is not None:
+        tprint(f'Converting input by lookup table{" with normalization" if normalize else ""}')
+    elif normalize:
         ret = generateDomain(bitsPerSample.char)
         if ret is not None:
             tprint('Exact input being normalized to interval [-0.8, 0.8]')
             xmin, xMaxMinDiff = ret
 
-            @guvectorize([(nbComplex128[:], nbComplex128[:])], '(n)->(n)',
+            @guvectorize([(nbComplex128[:], nbComplex128[:]),
+                          (nbComplex64[:], nbComplex64[:])], '(n)->(n)',
                          nopython=True,
                          cache=True,
                          boundscheck=False,
@@ -97,32 +110,60 @@ def readFile(bitsPerSample: dtype = None,
     procs = list(processes)
     clients = list(buffers)
 
-    def feedBuffers(y: ndarray) -> None:
-        z = y['re'] + 1j * y['im']
-        _normalize(z, z)
-        _correctIq(z, offset)
-        for proc, client in zip(procs, clients):
+    def convert(data: ndarray) -> ndarray:
+        # a new array each time, since the queues pickle their contents asynchronously
+        if lut is None:
+            y = frombuffer(data, dataType)
+            z = empty(y.size, dtype=complexType)
+            z.real = y['re']
+            z.imag = y['im']
+        elif 1 == bitsPerSample.itemsize:
+            z = lut.take(frombuffer(data, uint16))
+        else:
+            y = frombuffer(data, uint16)
+            z = empty(y.size >> 1, dtype=complexType)
+            z.real = lut[0].take(y[0::2])
+            z.imag = lut[1].take(y[1::2])
+        return z
+
+    def remove(proc: Process, client) -> None:
+        client.close()
+        clients.remove(client)
+        procs.remove(proc)
+
+    def removeEnded() -> None:
+        for proc, client in tuple(zip(procs, clients)):
             if proc.exitcode is not None:
                 tprint(f'Process : {proc.name} ended; removing {client} from queue')
-                client.close()
-                clients.remove(client)
-                procs.remove(proc)
-            else:
-                try:
-                    client.put_nowait(z)
-                except ValueError:
-                    tprint(f'Client : {client} closed; removing {proc.name} from queue')
-                    client.close()
-                    clients.remove(client)
-                    procs.remove(proc)
+                remove(proc, client)
+
+    def put(proc: Process, client, z: ndarray | bytes) -> None:
+        # retried, so that a consumer which has ended stops holding the reader back
+        try:
+            while not (client.put(z, 0.1) or isDead.value or proc.exitcode is not None):
+                pass
+        except ValueError:
+            tprint(f'Client : {client} closed; removing {proc.name} from queue')
+            remove(proc, client)
+
+    def feedBuffers(z: ndarray) -> None:
+        _normalize(z, z)
+        _correctIq(z, offset)
+        removeEnded()
+        if ring is not None:
+            # written once for every consumer
+            while not (ring.put(z, 0.1) or isDead.value):
+                removeEnded()
+        else:
+            for proc, client in tuple(zip(procs, clients)):
+                put(proc, client, z)
 
     def readData(reader: BufferedReader) -> None:
 
         while not isDead.value:
             if not reader.readinto(buffer):
                 break
-            y = frombuffer(buffer, dataType)
-            feedBuffers(y)
+            feedBuffers(convert(buffer))
 
     def readFd() -> None:
         isFile = inFile is not None
@@ -166,14 +207,49 @@ def readFile(bitsPerSample: dtype = None,
     else:
         readFd()
 
-    for buffer in buffers:
-        applyIgnoreException(buffer.put_nowait, b'')
-        buffer.close()
+    if ring is not None:
+        ring.close()
+    else:
+        removeEnded()
+        for proc, client in tuple(zip(procs, clients)):
+            put(proc, client, b'')
+            client.close()
+
+    for proc, client in zip(processes, buffers):
+        vprint(f'{proc.name}: {client.policy} buffer overflowed {client.overflows} time(s); '
+               f'{client.dropped} chunk(s) dropped')
 
     vprint('File reader halted')
     return
 
 
+@cache
+def generateLut(bitsPerSample: dtype, complexType: type, normalize: bool = False) \
+        -> ndarray | tuple[ndarray, ndarray] | None:
+    """
+    Returns a table of the complex sample for every 8-bit pair, indexed by the pair's bytes read as
+    a native uint16, or the real, and imaginary tables of every 16-bit component, indexed likewise;
+    normalized as for --normalize-input, if requested. None for other types
+    """
+    if bitsPerSample.char in 'bB':
+        pairs = arange(1 << 16, dtype=uint16).view(uint8).view(dtype([('re', bitsPerSample),
+                                                                     ('im', bitsPerSample)]))
+        re, im = pairs['re'], pairs['im']
+    elif bitsPerSample.char in 'hH':
+        re = im = arange(1 << 16, dtype=uint16).view(bitsPerSample)
+    else:
+        return None
+
+    lut = empty(re.size, dtype=complexType)
+    lut.real = re
+    lut.imag = im
+    domain = generateDomain(bitsPerSample.char) if normalize else None
+    if domain is not None:
+        xmin, xMaxMinDiff = domain
+        lut[:] = 1.6 * (lut - xmin) * xMaxMinDiff - 0.8
+    return lut if 1 == bitsPerSample.itemsize else (lut.real.copy(), lut.imag.copy())
+
+
 def generateDomain(dataType: str) -> tuple[int, float] | None:
     if 'B' == dataType:
         xmin, xmax = 0, 255
@@ -0,0 +1,147 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from io import IOBase
+
+from numba import njit
+from numpy import ndarray, dtype, float64, empty, copyto, multiply, floor, random
+
+from misc.file_util import DataType
+
+_BYTE_ORDERS = '<>=!|'
+
+
+def parseEncoding(encoding: str | None, byteorder: str = '=') -> dtype:
+    """
+    Output type of one of the DataType codes, optionally prefixed by a struct-style byte order,
+    e.g. '<h'. Unprefixed codes take byteorder; None is doubles
+    """
+    if encoding is None:
+        return dtype(float64).newbyteorder(byteorder)
+    if len(encoding) > 1 and encoding[0] in _BYTE_ORDERS:
+        byteorder, encoding = encoding[0], encoding[1:]
+    try:
+        ret = DataType[encoding].value
+    except KeyError:
+        raise ValueError(f'Unsupported output encoding: {encoding}')
+    return ret.newbyteorder('>' if '!' == byteorder else byteorder)
+
+
+@njit(cache=True, boundscheck=False, fastmath=True, nogil=True)
+def _quantize(x: ndarray[any, dtype[float64]],
+              scale: float,
+              offset: float,
+              lo: float,
+              hi: float,
+              dither: bool,
+              res: ndarray) -> int:
+    clipped = 0
+    for i in range(x.shape[0]):
+        v = x[i] * scale + offset
+        if dither:
+            # triangular pdf spanning +/- 1 lsb
+            v += random.random() - random.random()
+        v = floor(v + 0.5)
+        if v < lo:
+            v = lo
+            clipped += 1
+        elif v > hi:
+            v = hi
+            clipped += 1
+        res[i] = v
+    return clipped
+
+
+class SampleWriter:
+    """
+    Writes arrays of samples, in row-major order, to a binary file or socket in the given encoding,
+    straight from their buffers. Arrays that already are contiguous samples of that encoding are
+    written without a copy; anything else is converted into a buffer that is allocated once, and only
+    regrown for a larger chunk. Integer encodings map [-1, 1), after the gain, to their full scale,
+    i.e. offset-binary for the unsigned ones, and count the samples clipped; they may also be dithered
+    """
+
+    def __init__(self,
+                 file: IOBase | None,
+                 encoding: dtype | str = float64,
+                 gain: float = 1.,
+                 dither: bool = False):
+        self._file = file
+        self._dtype = dtype(encoding)
+        self._gain = gain
+        self._dither = dither
+        self._clipped = 0
+        self._buffer = None
+        self._integer = self._dtype.kind in 'iu'
+        if self._integer:
+            half = float(1 << (8 * self._dtype.itemsize - 1))
+            self._scale = half * gain
+            self._offset = half if 'u' == self._dtype.kind else 0.
+            self._lo = self._offset - half
+            self._hi = self._offset + half - 1
+            # numba only writes native integers; anything else is swapped in place afterward
+            self._bufferType = self._dtype.newbyteorder('=')
+        else:
+            self._bufferType = self._dtype
+
+    @property
+    def dtype(self) -> dtype:
+        return self._dtype
+
+    @property
+    def clipped(self) -> int:
+        return self._clipped
+
+    def _allocate(self, z: ndarray) -> ndarray:
+        if self._buffer is None or self._buffer.size < z.size:
+            self._buffer = empty(z.size, dtype=self._bufferType)
+        return self._buffer[:z.size].reshape(z.shape)
+
+    def _convert(self, z: ndarray) -> ndarray:
+        res = self._allocate(z)
+        if self._integer:
+            self._clipped += _quantize(z.reshape(-1), self._scale, self._offset, self._lo, self._hi,
+                                       self._dither, res.reshape(-1))
+            if not self._dtype.isnative:
+                res.byteswap(True)
+        elif 1. != self._gain:
+            multiply(z, self._gain, out=res, casting='unsafe')
+        else:
+            copyto(res, z, casting='unsafe')
+        return res
+
+    def encode(self, z: ndarray) -> ndarray:
+        """
+        Samples in the output encoding; either z itself, or the conversion buffer, which is
+        overwritten by the next call
+        """
+        if self._integer or 1. != self._gain or z.dtype != self._dtype or not z.flags.c_contiguous:
+            return self._convert(z)
+        return z
+
+    def write(self, z: ndarray) -> None:
+        view = memoryview(self.encode(z)).cast('B')
+        # raw, i.e. unbuffered, files and sockets may accept only part of the buffer
+        n = self._file.write(view)
+        while n is not None and n < len(view):
+            view = view[n:]
+            n = self._file.write(view)
+
+    def flush(self) -> None:
+        self._file.flush()
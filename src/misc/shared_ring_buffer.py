@@ -0,0 +1,268 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from multiprocessing import Condition
+from multiprocessing.shared_memory import SharedMemory
+
+from numpy import ndarray, dtype, int64, frombuffer
+
+from misc.io_args import OverrunPolicy
+
+# control block layout: [write count, closed], followed by the per-consumer state
+_WRITE = 0
+_CLOSED = 1
+_HEADER = 2
+# per-consumer: [attached, policy, cursor, held, dropped, overflows]
+_ATTACHED = 0
+_POLICY = 1
+_CURSOR = 2
+_HELD = 3
+_DROPPED = 4
+_OVERFLOWS = 5
+_CONSUMER_FIELDS = 6
+_ALIGNMENT = 64
+
+
+class SharedRingBuffer:
+    """
+    Single-producer, multi-consumer ring of fixed-size slots in shared memory. Each chunk is written
+    once, and read in place by every consumer, each of which has its own cursor. A consumer whose
+    policy is block holds the writer back until it has read the oldest slot; one whose policy is
+    drop has its oldest unread chunks skipped instead, and only ever reads the latest one. The slot
+    a consumer is reading is never overwritten under either policy.
+    """
+
+    def __init__(self, slotLength: int, slots: int, consumers: int, sampleType: dtype):
+        if slotLength < 1 or slots < 2 or consumers < 1:
+            raise ValueError('Ring buffer must have a positive slot length, at least two slots, '
+                             'and at least one consumer')
+        self._slotLength = slotLength
+        self._slots = slots
+        self._consumers = consumers
+        self._sampleType = dtype(sampleType)
+        self._controlSize = _HEADER + _CONSUMER_FIELDS * consumers + slots
+        self._dataOffset = -(-self._controlSize * 8 // _ALIGNMENT) * _ALIGNMENT
+        size = self._dataOffset + slots * slotLength * self._sampleType.itemsize
+        self._shm = SharedMemory(create=True, size=size)
+        self._owner = True
+        self._pending = -1
+        self._condition = Condition()
+        self._attach()
+        self._control[:] = 0
+        self._held[:] = -1
+
+    def _attach(self) -> None:
+        buf = self._shm.buf
+        self._control = frombuffer(buf, int64, self._controlSize)
+        consumers = self._control[_HEADER:_HEADER + _CONSUMER_FIELDS * self._consumers]
+        self._state = consumers.reshape(_CONSUMER_FIELDS, self._consumers)
+        self._held = self._state[_HELD]
+        self._lengths = self._control[_HEADER + _CONSUMER_FIELDS * self._consumers:]
+        self._data = frombuffer(buf, self._sampleType, self._slots * self._slotLength,
+                                self._dataOffset).reshape(self._slots, self._slotLength)
+
+    def __getstate__(self) -> dict:
+        # everything but the views, which are rebuilt over the attached segment
+        return {'name': self._shm.name,
+                'slotLength': self._slotLength,
+                'slots': self._slots,
+                'consumers': self._consumers,
+                'sampleType': self._sampleType,
+                'condition': self._condition}
+
+    def __setstate__(self, state: dict) -> None:
+        self._slotLength = state['slotLength']
+        self._slots = state['slots']
+        self._consumers = state['consumers']
+        self._sampleType = state['sampleType']
+        self._condition = state['condition']
+        self._controlSize = _HEADER + _CONSUMER_FIELDS * self._consumers + self._slots
+        self._dataOffset = -(-self._controlSize * 8 // _ALIGNMENT) * _ALIGNMENT
+        self._shm = SharedMemory(name=state['name'])
+        self._owner = False
+        self._pending = -1
+        self._attach()
+
+    @property
+    def slots(self) -> int:
+        return self._slots
+
+    @property
+    def slotLength(self) -> int:
+        return self._slotLength
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._control[_CLOSED])
+
+    def consumer(self, policy: OverrunPolicy | str = OverrunPolicy.BLOCK) -> 'RingBufferConsumer':
+        """Attaches the next free consumer, and returns its handle"""
+        with self._condition:
+            for i in range(self._consumers):
+                if not self._state[_ATTACHED, i]:
+                    self._state[:, i] = (1, OverrunPolicy.DROP == policy, self._control[_WRITE],
+                                         -1, 0, 0)
+                    return RingBufferConsumer(self, i)
+        raise ValueError(f'All {self._consumers} consumers are already attached')
+
+    def policy(self, i: int) -> OverrunPolicy:
+        return OverrunPolicy.DROP if self._state[_POLICY, i] else OverrunPolicy.BLOCK
+
+    def dropped(self, i: int) -> int:
+        return int(self._state[_DROPPED, i])
+
+    def overflows(self, i: int) -> int:
+        """Number of chunks written while the consumer was a full buffer behind"""
+        return int(self._state[_OVERFLOWS, i])
+
+    def detach(self, i: int) -> None:
+        """Stops the consumer from holding back the writer, e.g. because it has exited"""
+        with self._condition:
+            self._state[_ATTACHED, i] = 0
+            self._held[i] = -1
+            self._condition.notify_all()
+
+    def _reserve(self, w: int, count: bool = False) -> bool:
+        # whether slot w may be written; skips the unread chunks of drop consumers, if need be
+        oldest = w - self._slots + 1
+        ret = True
+        for i in range(self._consumers):
+            if not self._state[_ATTACHED, i]:
+                continue
+            cursor = self._state[_CURSOR, i]
+            if cursor < oldest and self._state[_POLICY, i]:
+                self._state[_OVERFLOWS, i] += 1
+                self._state[_DROPPED, i] += oldest - cursor
+                self._state[_CURSOR, i] = cursor = oldest
+            held = self._held[i]
+            if 0 <= held < oldest or cursor < oldest:
+                ret = False
+                if count:
+                    self._state[_OVERFLOWS, i] += 1
+        return ret
+
+    def put(self, z: ndarray, timeout: float = None) -> bool:
+        """
+        Copies z into the next slot, and publishes it to the consumers. Returns False if a consumer
+        still held the slot when timeout elapsed
+        """
+        if z.size > self._slotLength:
+            raise ValueError(f'Chunk of {z.size} samples exceeds slot length {self._slotLength}')
+        with self._condition:
+            if self._control[_CLOSED]:
+                raise ValueError('Ring buffer is closed')
+            w = self._control[_WRITE]
+            # a chunk retried after a timeout is only counted as an overflow the first time
+            count = w != self._pending
+            self._pending = w
+            if not (self._reserve(w, count)
+                    or self._condition.wait_for(lambda: self._reserve(w), timeout)):
+                return False
+
+        # the slot is no longer visible to any consumer, so it can be written outside the lock
+        slot = w % self._slots
+        self._data[slot, :z.size] = z
+        self._lengths[slot] = z.size
+        with self._condition:
+            self._control[_WRITE] = w + 1
+            self._condition.notify_all()
+        return True
+
+    def get(self, i: int, timeout: float = None) -> ndarray | bytes | None:
+        """
+        Returns a view of consumer i's next chunk, which remains valid until its next call; b'' once
+        the buffer is closed, and drained, or None if timeout elapsed first
+        """
+        with self._condition:
+            self._held[i] = -1
+            self._condition.notify_all()
+            if not self._condition.wait_for(
+                    lambda: self._state[_CURSOR, i] < self._control[_WRITE] or self._control[_CLOSED],
+                    timeout):
+                return None
+            cursor = self._state[_CURSOR, i]
+            latest = self._control[_WRITE] - 1
+            if cursor > latest:
+                return b''
+            if cursor < latest and self._state[_POLICY, i]:
+                self._state[_DROPPED, i] += latest - cursor
+                cursor = latest
+            self._held[i] = cursor
+            self._state[_CURSOR, i] = cursor + 1
+        slot = cursor % self._slots
+        return self._data[slot, :self._lengths[slot]]
+
+    def close(self) -> None:
+        """Signals the end of the stream; consumers receive b'' once they have read the remainder"""
+        with self._condition:
+            self._control[_CLOSED] = 1
+            self._condition.notify_all()
+
+    def release(self) -> None:
+        """Releases this process' mapping; the owner also removes the segment"""
+        self._control = self._state = self._held = self._lengths = self._data = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # views handed out by get are still alive; the mapping goes with them
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingBufferConsumer:
+    """Consumer handle with the subset of the multiprocessing.Queue interface the processors use"""
+
+    def __init__(self, ring: SharedRingBuffer, i: int):
+        self._ring = ring
+        self._i = i
+
+    @property
+    def policy(self) -> OverrunPolicy:
+        return self._ring.policy(self._i)
+
+    @property
+    def dropped(self) -> int:
+        return self._ring.dropped(self._i)
+
+    @property
+    def overflows(self) -> int:
+        return self._ring.overflows(self._i)
+
+    def get(self, block: bool = True, timeout: float = None) -> ndarray | bytes:
+        ret = self._ring.get(self._i, timeout if block else 0)
+        if ret is None:
+            from queue import Empty
+            raise Empty
+        return ret
+
+    def close(self) -> None:
+        self._ring.detach(self._i)
+
+    def join_thread(self) -> None:
+        pass
+
+    def cancel_join_thread(self) -> None:
+        pass
+
+    def __str__(self):
+        return f'{self.__class__.__name__}({self._i})'
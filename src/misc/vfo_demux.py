@@ -0,0 +1,113 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from socket import create_connection
+from typing import Iterable, Iterator, NamedTuple
+
+from numpy import ndarray, dtype, empty
+
+from misc.vfo_server import FRAME_HEADER, FRAMED
+
+
+class Frame(NamedTuple):
+    channel: int
+    frequency: int
+    index: int
+    samples: ndarray
+
+
+class VfoDemux:
+    """
+    Client of the framed protocol of VfoServer, which receives any number of vfos over a single
+    connection, and demultiplexes them into frames, i.e. chunks of one channel each, e.g.
+
+        with VfoDemux('localhost', 1234, (155685000, 155700000)) as demux:
+            for frame in demux:
+                outputs[frame.frequency].write(frame.samples)
+
+    Samples are received straight into the arrays returned, in the encoding they were sent in. Gaps
+    in a channel's sample indices, i.e. chunks dropped by the server, are counted in lost
+    """
+
+    def __init__(self, host: str, port: int, vfos: Iterable[int] = None, timeout: float = None):
+        self._sock = create_connection((host, port), timeout)
+        request = '*' if vfos is None else ','.join(str(int(vfo)) for vfo in vfos)
+        self._sock.sendall(f'{FRAMED} {request}\n'.encode('ascii'))
+        self._header = bytearray(FRAME_HEADER.size)
+        self._types: dict[bytes, dtype] = {}
+        self._next: dict[int, int] = {}
+        self._lost: dict[int, int] = {}
+        self._frequencies = self._readChannels()
+
+    @property
+    def frequencies(self) -> list[int]:
+        """Frequencies of every channel on the server, by channel number"""
+        return self._frequencies
+
+    @property
+    def lost(self) -> dict[int, int]:
+        """Number of samples skipped so far, by frequency"""
+        return {self._frequencies[channel]: n for channel, n in self._lost.items()}
+
+    def _readChannels(self) -> list[int]:
+        line = bytearray()
+        while not line.endswith(b'\n'):
+            data = self._sock.recv(1)
+            if not data:
+                raise ConnectionError('Request was refused')
+            line += data
+        return [int(float(freq)) for freq in line.decode('ascii').strip().split(',')]
+
+    def _readInto(self, buffer: memoryview) -> bool:
+        while len(buffer):
+            n = self._sock.recv_into(buffer)
+            if not n:
+                return False
+            buffer = buffer[n:]
+        return True
+
+    def read(self) -> Frame | None:
+        """Next frame of any of the channels, or None once the server closes the connection"""
+        if not self._readInto(memoryview(self._header)):
+            return None
+        fmt, channel, count, index = FRAME_HEADER.unpack(self._header)
+        if fmt not in self._types:
+            self._types[fmt] = dtype(fmt.decode('ascii'))
+        samples = empty(count, dtype=self._types[fmt])
+        if not self._readInto(memoryview(samples).cast('B')):
+            return None
+
+        expected = self._next.get(channel, index)
+        if index > expected:
+            self._lost[channel] = self._lost.get(channel, 0) + index - expected
+        self._next[channel] = index + count
+        return Frame(channel, self._frequencies[channel], index, samples)
+
+    def __iter__(self) -> Iterator[Frame]:
+        while (frame := self.read()) is not None:
+            yield frame
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
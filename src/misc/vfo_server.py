@@ -0,0 +1,491 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from collections import deque
+from itertools import islice
+from selectors import DefaultSelector, EVENT_READ, EVENT_WRITE
+from socket import (socket, socketpair, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR,
+                    SO_SNDBUF)
+from struct import Struct
+from sys import byteorder
+from threading import Thread, Condition
+from time import perf_counter
+from typing import Sequence
+
+from numpy import ndarray, dtype, stack
+
+from misc.general_util import eprint, vprint, tprint, shutdownSocket
+from misc.io_args import OverrunPolicy
+
+# scatter-gather sends several chunks per call where it is available
+_SENDMSG = hasattr(socket, 'sendmsg')
+
+# format, i.e. byte order and DataType code, channel, sample count, index of the first sample
+FRAME_HEADER = Struct('!2sHIQ')
+FRAMED = 'framed'
+
+
+def frameFormat(encoding: dtype) -> bytes:
+    order = encoding.byteorder
+    if '=' == order:
+        order = '<' if 'little' == byteorder else '>'
+    return (order + encoding.char).encode('ascii')
+
+
+class VfoClient:
+    """A connection, and its bounded buffer of chunks that are still to be sent"""
+
+    def __init__(self, sock: socket, address: tuple):
+        self.sock = sock
+        self.address = address
+        self.channels: list[int] = []
+        self.request = bytearray()
+        self.connected = perf_counter()
+        self.framed = False
+        # whatever a client sent after its request, and has yet to be handled
+        self.received = bytearray()
+        self.pending: deque[tuple[memoryview, float]] = deque()
+        self.offset = 0
+        self.buffered = 0
+        # chunks at the head of pending that are being sent
+        self.inflight = 0
+        self.events = EVENT_READ
+        self.readable = True
+        self.evicted = False
+        self.closed = False
+        # statistics
+        self.sent = 0
+        self.chunks = 0
+        self.overflows = 0
+        self.dropped = 0
+        self.peak = 0
+        self.lag = 0.
+        self.maxLag = 0.
+
+    @property
+    def pinned(self) -> int:
+        """Chunks at the head of pending that must not be dropped, lest the stream lose its alignment"""
+        return max(self.inflight, 1 if self.offset else 0)
+
+    def __str__(self):
+        meanLag = self.lag / self.chunks if self.chunks else 0.
+        return (f'Client {self.address}: {self.sent} byte(s) sent; {self.overflows} overflow(s), '
+                f'{self.dropped} chunk(s) dropped; lag {meanLag * 1e3:.3f} ms mean, '
+                f'{self.maxLag * 1e3:.3f} ms max; peak of {self.peak} byte(s) buffered')
+
+
+class VfoServer:
+    """
+    Serves each of the channels to the clients subscribed to it from a single thread, which
+    multiplexes every connection with a selector. Clients may connect, and leave at any time; on
+    connecting, a client sends a line that lists the channels it subscribes to by frequency, e.g.
+    b'155685000,155700000\\n', or b'*\\n' for all of them, or just b'\\n' for the first channel
+    without a client, which is also what a client that has sent nothing within a second is served.
+    A client subscribed to several channels receives them interleaved sample by sample, in the
+    order requested, unless the request is prefixed by 'framed', e.g. b'framed *\\n'. Framed
+    clients are first sent a line with the frequencies of every channel, which are numbered in that
+    order, and then each chunk of a channel as a frame, i.e. FRAME_HEADER followed by the samples;
+    so that any number of channels can be demultiplexed from a single connection, cf.
+    misc.vfo_demux. Each client has a buffer of at most maxBuffered bytes, or of a single chunk
+    larger than that, which is only ever queued alone; once it would overflow,
+    the producer either waits for it to drain (block), discards the client's oldest unsent chunks
+    (drop), or disconnects the client (disconnect), so that a stalled client cannot hold back the
+    others unless asked to. Buffered chunks are sent in batches
+    """
+    _POLL_INTERVAL = 0.5
+    _DRAIN_TIMEOUT = 2.
+    _MAX_REQUEST = 4096
+    # seconds a client may stay silent before it is given the first free channel; None waits forever
+    _HANDSHAKE_TIMEOUT = 1.
+    # chunks handed to the kernel per call, where scatter-gather is available
+    _BATCH = 64
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 channels: Sequence,
+                 policy: OverrunPolicy | str = OverrunPolicy.DROP,
+                 maxBuffered: int = 1 << 20,
+                 sendBufferSize: int = None):
+        if maxBuffered < 1:
+            raise ValueError('Client buffers must be able to hold at least one byte')
+        self._channels = list(channels)
+        self._policy = OverrunPolicy(policy)
+        self._maxBuffered = maxBuffered
+        self._sendBufferSize = sendBufferSize
+        self._subscribers: list[list[VfoClient]] = [[] for _ in self._channels]
+        self._clients: dict[socket, VfoClient] = {}
+        self._condition = Condition()
+        self._closing = False
+        self._closed = False
+        self._selector = DefaultSelector()
+        self._sock = socket(AF_INET, SOCK_STREAM)
+        self._sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen()
+        self._sock.setblocking(False)
+        self._wakeReader, self._wakeWriter = socketpair()
+        self._wakeReader.setblocking(False)
+        self._wakeWriter.setblocking(False)
+        self._selector.register(self._sock, EVENT_READ)
+        self._selector.register(self._wakeReader, EVENT_READ)
+        self._thread = Thread(target=self._serve, name='VfoServer', daemon=True)
+
+    @property
+    def address(self) -> tuple:
+        return self._sock.getsockname()
+
+    @property
+    def channels(self) -> list:
+        return self._channels
+
+    @property
+    def policy(self) -> OverrunPolicy:
+        return self._policy
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _wake(self) -> None:
+        try:
+            self._wakeWriter.send(b'\0')
+        except BlockingIOError:
+            # already pending
+            pass
+
+    def subscribed(self, channel: int) -> bool:
+        return bool(self._subscribers[channel])
+
+    def _subscribe(self, client: VfoClient, channels: Sequence[int]) -> None:
+        for channel in channels:
+            if channel not in client.channels:
+                client.channels.append(channel)
+                self._subscribers[channel].append(client)
+
+    def _unsubscribe(self, client: VfoClient) -> None:
+        for channel in client.channels:
+            self._subscribers[channel].remove(client)
+        client.channels = []
+
+    def _accept(self) -> VfoClient | None:
+        try:
+            sock, address = self._sock.accept()
+        except BlockingIOError:
+            return None
+        eprint(f'Connection request from {address}')
+        sock.setblocking(False)
+        if self._sendBufferSize:
+            sock.setsockopt(SOL_SOCKET, SO_SNDBUF, self._sendBufferSize)
+        client = VfoClient(sock, address)
+        with self._condition:
+            self._clients[sock] = client
+        self._selector.register(sock, EVENT_READ, client)
+        return client
+
+    @staticmethod
+    def _splitFramed(request: str) -> tuple[str, bool]:
+        request = request.strip()
+        framed = request.startswith(FRAMED)
+        if framed:
+            request = request[len(FRAMED):].strip()
+        return request, framed
+
+    def _parseRequest(self, request: str) -> tuple[list[int], bool]:
+        request, framed = self._splitFramed(request)
+        return self._parseChannels(request), framed
+
+    def _parseChannels(self, request: str) -> list[int]:
+        if '*' == request:
+            return list(range(len(self._channels)))
+        if not request:
+            free = [i for i, subscribers in enumerate(self._subscribers) if not subscribers]
+            if not free:
+                raise ValueError('every vfo already has a client')
+            return free[:1]
+        ret = []
+        for freq in request.split(','):
+            try:
+                ret.append(self._channels.index(int(float(freq))))
+            except ValueError:
+                raise ValueError(f'no vfo at {freq.strip()}')
+        return ret
+
+    def _handshake(self, client: VfoClient, data: bytes) -> None:
+        client.request += data
+        if b'\n' not in client.request:
+            if len(client.request) > self._MAX_REQUEST:
+                eprint(f'Request from {client.address} is too long; closing connection')
+                client.evicted = True
+            return
+        request = client.request[:client.request.index(b'\n')]
+        client.request = None
+        try:
+            channels, client.framed = self._parseRequest(request.decode('ascii', errors='replace'))
+        except ValueError as e:
+            eprint(f'Invalid request from {client.address}: {e}; closing connection')
+            client.evicted = True
+            return
+        with self._condition:
+            if client.framed:
+                # never subject to the overrun policy, lest this thread wait on itself
+                # channels that are gone, but whose numbers are still taken, are left blank
+                line = (','.join('' if channel is None else str(channel) for channel in self._channels)
+                        + '\n').encode('ascii')
+                client.pending.append((memoryview(line), perf_counter()))
+                client.buffered += len(line)
+            self._subscribe(client, channels)
+        eprint(f'Serving {[self._channels[i] for i in channels]} to {client.address}')
+
+    def _expireHandshakes(self) -> float:
+        """Serves the first free channel to clients silent for too long; returns when to check again"""
+        if self._HANDSHAKE_TIMEOUT is None:
+            return self._POLL_INTERVAL
+        ret = self._POLL_INTERVAL
+        now = perf_counter()
+        for client in tuple(self._clients.values()):
+            if client.request is None or client.request or client.closed or client.evicted:
+                continue
+            remaining = client.connected + self._HANDSHAKE_TIMEOUT - now
+            if remaining > 0:
+                ret = min(ret, remaining)
+            else:
+                vprint(f'No request from {client.address}; defaulting to the first free vfo')
+                self._handshake(client, b'\n')
+        return ret
+
+    def _disconnect(self, client: VfoClient) -> None:
+        with self._condition:
+            if client.closed:
+                return
+            client.closed = True
+            self._unsubscribe(client)
+            self._clients.pop(client.sock, None)
+            client.pending.clear()
+            client.buffered = 0
+            self._condition.notify_all()
+        if client.events:
+            self._selector.unregister(client.sock)
+        shutdownSocket(client.sock)
+        client.sock.close()
+        eprint(f'Client disconnected: {client.address}')
+        vprint(client)
+
+    def _read(self, client: VfoClient) -> None:
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._disconnect(client)
+            return
+        if not data:
+            # only the client's half of the connection is closed; sending tells whether it is gone
+            client.readable = False
+            if client.request is not None:
+                self._handshake(client, b'\n')
+        elif client.request is not None:
+            self._handshake(client, data)
+        else:
+            self._received(client, data)
+
+    def _received(self, client: VfoClient, data: bytes) -> None:
+        """Anything a client sends after its request, which is ignored unless overridden"""
+        pass
+
+    def _flush(self, client: VfoClient) -> None:
+        # the batch is taken, and accounted for under the condition, but sent outside it, so that
+        # the producer is never held up by a send
+        while True:
+            with self._condition:
+                if client.closed or not client.pending:
+                    break
+                if _SENDMSG:
+                    views = [data for data, _ in islice(client.pending, self._BATCH)]
+                else:
+                    views = [client.pending[0][0]]
+                views[0] = views[0][client.offset:]
+                client.inflight = len(views)
+            try:
+                n = client.sock.sendmsg(views) if _SENDMSG else client.sock.send(views[0])
+            except BlockingIOError:
+                n = 0
+            except OSError:
+                n = 0
+                client.evicted = True
+            with self._condition:
+                client.inflight = 0
+                if not client.closed:
+                    client.sent += n
+                    client.offset += n
+                    now = perf_counter()
+                    while client.pending and client.offset >= len(client.pending[0][0]):
+                        data, queued = client.pending.popleft()
+                        client.buffered -= len(data)
+                        client.offset -= len(data)
+                        lag = now - queued
+                        client.lag += lag
+                        client.maxLag = max(client.maxLag, lag)
+                        client.chunks += 1
+                self._condition.notify_all()
+            if client.evicted or n < sum(len(view) for view in views):
+                break
+
+    def _updateInterest(self) -> None:
+        for client in tuple(self._clients.values()):
+            if client.evicted:
+                self._disconnect(client)
+                continue
+            events = (EVENT_READ if client.readable else 0) | (EVENT_WRITE if client.pending else 0)
+            if events != client.events:
+                if not client.events:
+                    self._selector.register(client.sock, events, client)
+                elif not events:
+                    self._selector.unregister(client.sock)
+                else:
+                    self._selector.modify(client.sock, events, client)
+                client.events = events
+
+    def _drained(self) -> bool:
+        return not any(client.pending for client in self._clients.values())
+
+    def _serve(self) -> None:
+        deadline = None
+        while True:
+            with self._condition:
+                if self._closing:
+                    if deadline is None:
+                        deadline = perf_counter() + self._DRAIN_TIMEOUT
+                    if self._drained() or perf_counter() > deadline:
+                        break
+            for key, mask in self._selector.select(self._expireHandshakes()):
+                if key.fileobj is self._sock:
+                    if not self._closing:
+                        self._accept()
+                elif key.fileobj is self._wakeReader:
+                    try:
+                        while self._wakeReader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif not key.data.closed:
+                    if mask & EVENT_READ:
+                        self._read(key.data)
+                    if mask & EVENT_WRITE and not key.data.closed:
+                        self._flush(key.data)
+            self._updateInterest()
+
+        for client in tuple(self._clients.values()):
+            self._disconnect(client)
+
+    def _enqueue(self, client: VfoClient, data: memoryview, queued: float) -> None:
+        # called with the condition held
+        size = len(data)
+        # a chunk larger than the whole buffer is still taken once the buffer is empty, lest it never be
+        if client.buffered and client.buffered + size > self._maxBuffered:
+            client.overflows += 1
+            if OverrunPolicy.DISCONNECT == self._policy:
+                tprint(f'{client.address} overflowed; disconnecting')
+                self._unsubscribe(client)
+                client.evicted = True
+                return
+            if OverrunPolicy.DROP == self._policy:
+                # neither a partially sent chunk, nor one being sent may be dropped
+                keep = client.pinned
+                while len(client.pending) > keep and client.buffered + size > self._maxBuffered:
+                    old, _ = client.pending[keep]
+                    del client.pending[keep]
+                    client.buffered -= len(old)
+                    client.dropped += 1
+            else:
+                self._condition.wait_for(lambda: client.closed or self._closing or not client.buffered
+                                         or client.buffered + size <= self._maxBuffered)
+                if client.closed:
+                    return
+        client.pending.append((data, queued))
+        client.buffered += size
+        client.peak = max(client.peak, client.buffered)
+
+    @staticmethod
+    def _frame(channel: int, chunk: ndarray, index: int) -> memoryview:
+        header = FRAME_HEADER.pack(frameFormat(chunk.dtype), channel, len(chunk), index)
+        return memoryview(header + chunk.tobytes())
+
+    def publish(self, chunks: Sequence[ndarray | None], index: int | Sequence[int] = 0) -> None:
+        """
+        Queues the chunk of each channel, already encoded, to its subscribers. Channels without any
+        may be None, or left out at the end; index is that of the chunks' first sample, or of each
+        channel's, if their rates differ
+        """
+        with self._condition:
+            queued = perf_counter()
+            # the chunks are copied, since the caller reuses them; once per channel for the
+            # clients of just that one, and for the framed ones
+            single = {}
+            frames = {}
+            for client in tuple(self._clients.values()):
+                if not client.channels or any(c >= len(chunks) or chunks[c] is None
+                                              for c in client.channels):
+                    continue
+                if client.framed:
+                    # frames are queued individually, so that dropping one never splits another
+                    for channel in client.channels:
+                        if channel not in frames:
+                            frames[channel] = self._frame(
+                                channel, chunks[channel],
+                                index if isinstance(index, int) else index[channel])
+                        self._enqueue(client, frames[channel], queued)
+                        if client.evicted:
+                            break
+                    continue
+                if 1 == len(client.channels):
+                    channel = client.channels[0]
+                    if channel not in single:
+                        single[channel] = memoryview(chunks[channel].tobytes())
+                    data = single[channel]
+                else:
+                    data = memoryview(stack([chunks[c] for c in client.channels], axis=1).tobytes())
+                self._enqueue(client, data, queued)
+        self._wake()
+
+    def close(self) -> None:
+        """Sends what is still buffered, within a timeout, and then disconnects every client"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._wake()
+        if self._thread.is_alive():
+            self._thread.join()
+        else:
+            for client in tuple(self._clients.values()):
+                self._disconnect(client)
+        self._selector.close()
+        self._sock.close()
+        self._wakeReader.close()
+        self._wakeWriter.close()
+
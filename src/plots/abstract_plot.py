@@ -148,7 +148,7 @@ class AbstractPlot(DataProcessor, ABC):
             # set buffer initially
             self._y = array([self.buffer.get()])
             self._t = arange(self._y.size)
-            self._shift = array([exp(self._omega * self._t)])
+            self._shift = array([exp(self._omega * self._t)], dtype=self._y.dtype)
 
         # check for EOF
         if self._y is None or not len(self._y):
@@ -18,14 +18,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+from contextlib import nullcontext
 from multiprocessing import Value
 from typing import Annotated
 
 from typer import run as typerRun, Argument, Option
 
 from misc.general_util import vprint, printException, traceOn, verboseOn
+from misc.io_args import OverrunPolicy
 from sdr.control_rtl_tcp import ControlRtlTcp
 from sdr.controller import UnrecognizedInputError
+from sdr.narrowband_server import NarrowbandServer
 from sdr.output_server import OutputServer
 from sdr.rtl_tcp_commands import RtlTcpCommands
 from sdr.socket_receiver import SocketReceiver
@@ -33,8 +36,28 @@ from sdr.socket_receiver import SocketReceiver
 
 def main(host: Annotated[str, Argument(help='Address of remote rtl_tcp server')],
          port: Annotated[int, Argument(help='Port of remote rtl_tcp server')],
+         fs: Annotated[int, Option('--fs', '-r', help='''
+            Sampling rate the remote rtl_tcp server is set to, which sizes the buffers to about 10 ms of the stream,
+            as does SET_SAMPLE_RATE''')] = None,
          server_host: Annotated[
              str, Option(help='Port of local distribution server')] = 'localhost',
+         overrun: Annotated[OverrunPolicy, Option(case_sensitive=False,
+                                                  help='''
+            What happens once a client falls a full buffer behind. block holds back the upstream stream, and with it
+            every client until it catches up; drop discards its oldest unsent data; disconnect closes its
+            connection''')] = OverrunPolicy.DROP,
+         buffer_size: Annotated[int, Option('--buffer-size',
+                                            metavar='BYTES',
+                                            help='Size of each client\'s send buffer')] = 1 << 22,
+         history: Annotated[float, Option(metavar='SECONDS', help='''
+            Keep this much of the stream, so that a client can ask to be sent it from up to that long ago, by sending
+            the relay's own REWIND command, 0xF0, with the time in ms. [Requires: --fs]''')] = None,
+         history_file: Annotated[str, Option(help='''
+            Keep the history in a memory-mapped file at this path, rather than in memory''')] = None,
+         narrowband: Annotated[bool, Option(help='''
+            Also serve narrowband streams on a port of their own; clients request them with a line of
+            <offset> <decimation> [<bandwidth>], in Hz, and receive the shifted, and decimated stream as big-endian
+            32-bit floats, i.e. -ef -X''')] = False,
          verbose:
          Annotated[int, Option("--verbose", "-v",
                                count=True,
@@ -48,8 +71,11 @@ def main(host: Annotated[str, Argument(help='Address of remote rtl_tcp server')]
     elif verbose > 0:
         verboseOn()
 
-    with SocketReceiver(isDead=isDead, host=host, port=port) as receiver:
-        with OutputServer(receiver, server_host) as server:
+    with SocketReceiver(isDead=isDead, host=host, port=port, fs=fs, history=history,
+                        historyFile=history_file) as receiver:
+        with (OutputServer(receiver, server_host, overrun, buffer_size) as server,
+              (NarrowbandServer(receiver, server_host, overrun, buffer_size)
+               if narrowband else nullcontext()) as narrowbandServer):
             cmdr = ControlRtlTcp(receiver, receiver.reset)
 
             try:
@@ -57,7 +83,10 @@ def main(host: Annotated[str, Argument(help='Address of remote rtl_tcp server')]
                     try:
                         print('Available commands are:\n')
                         [print(f'{e.value}\t{e.name}') for e in RtlTcpCommands]
-                        print(f'\nAccepting connections on port {server.socket.getsockname()}\n')
+                        print(f'\nAccepting connections on port {server.socket.getsockname()}')
+                        if narrowbandServer is not None:
+                            print(f'Accepting narrowband connections on port {narrowbandServer.address}')
+                        print()
                         inp = input(
                             'Provide a space-delimited, command-value pair (e.g. SET_GAIN 1):\n')
                         if ('q' == inp or 'Q' == inp or 'quit' in inp.lower()
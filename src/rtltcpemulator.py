@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+from time import sleep
+from typing import Annotated
+
+from typer import run as typerRun, Argument, Option
+
+from misc.general_util import traceOn, verboseOn
+from sdr.rtl_tcp_emulator import RtlTcpEmulator
+
+
+def main(inFile: Annotated[str, Argument(help='IQ recording to serve, i.e. a two-channel wav, or interleaved raw file')],
+         host: Annotated[str, Option(help='Address to listen on')] = 'localhost',
+         port: Annotated[int, Option('--port', '-p', help='Port to listen on')] = 1234,
+         fs: Annotated[int, Option('--fs', '-r', help='Sampling rate of a raw file')] = None,
+         enc: Annotated[str, Option('--encoding', '-e', help='''
+            Binary encoding of a raw file, e.g. B, as rtl_sdr writes''')] = None,
+         speed: Annotated[float, Option('--speed', '-s', help='''
+            Multiple of the sampling rate to serve at; inf serves as fast as the client reads''')] = 1.,
+         loop: Annotated[bool, Option(help='''
+            Start the recording over once it ends, rather than closing the connection''')] = False,
+         verbose:
+         Annotated[int, Option("--verbose", "-v",
+                               count=True,
+                               help='Toggle verbose output. Repetition increases verbosity (e.g. -vv, or -v -v)')] = 0,
+         ) -> None:
+    if verbose > 1:
+        traceOn()
+    elif verbose > 0:
+        verboseOn()
+
+    with RtlTcpEmulator(inFile, host, port, fs, enc, speed, loop) as emulator:
+        print(f'Serving {inFile} at {emulator.fs} Hz on {emulator.address}')
+        try:
+            while True:
+                sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    typerRun(main)
@@ -61,6 +61,6 @@ class ControlRtlTcp(Controller):
 
                 if RtlTcpCommands.SET_SAMPLE_RATE == command:
                     sock.sendall(pack('!BI', RtlTcpCommands.SET_TUNER_BANDWIDTH.value, param))
-                    self.resetBuffers()
+                    self.resetBuffers(param)
             except StructError as e:
                 raise UnrecognizedInputError(f'{command}: {param}', e)
@@ -0,0 +1,202 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from numpy import ndarray, dtype, complex64, empty, frombuffer, uint16, uint8
+
+from dsp.dsp_processor import generateEllipFilter, DspProcessor
+from dsp.multistage_decimator import planDecimation
+from dsp.nco import Nco
+from dsp.sos_filter import SosFilter
+from misc.general_util import findPort
+from misc.io_args import OverrunPolicy
+from misc.read_file import generateLut
+from misc.vfo_server import VfoServer
+from sdr.output_server import log
+from sdr.socket_receiver import SocketReceiver
+
+# interleaved, big-endian 32-bit floats, i.e. -ef -X over tcp
+_OUTPUT_TYPE = dtype('>c8')
+
+
+class NarrowbandChannel:
+    """Shifts the stream by offset, decimates it, and optionally narrows it to bandwidth"""
+
+    def __init__(self, fs: int, offset: int, decimation: int, bandwidth: int = None):
+        if decimation < 2:
+            raise ValueError('decimation must be at least 2')
+        if not abs(offset) < fs / 2:
+            raise ValueError(f'offset must be within +/- {fs / 2:.0f} Hz')
+        decimatedFs = fs // decimation
+        if bandwidth is not None and not 0 < bandwidth < decimatedFs:
+            raise ValueError(f'bandwidth must be within (0, {decimatedFs}) Hz')
+        self.fs = fs
+        self.offset = offset
+        self.decimation = decimation
+        self.bandwidth = bandwidth
+        self._shift = Nco(fs, (offset,))
+        self._decimator = planDecimation(decimation)
+        self._filter = None if bandwidth is None else SosFilter(generateEllipFilter(
+            decimatedFs, DspProcessor._FILTER_DEGREE, bandwidth / 2, 'lowpass'))
+        self._mixed = None
+        self._decimated = None
+        self.index = 0
+
+    @property
+    def spec(self) -> tuple[int, int, int | None]:
+        return self.offset, self.decimation, self.bandwidth
+
+    def __call__(self, x: ndarray) -> ndarray:
+        if self._mixed is None or self._mixed.shape[1] < x.size:
+            self._mixed = empty((1, x.size), dtype=x.dtype)
+            self._decimated = empty((1, self._decimator.outputSize(x.size)), dtype=x.dtype)
+        mixed = self._mixed[:, :x.size]
+        self._shift(x, mixed)
+        y = self._decimated[:, :self._decimator(mixed, self._decimated)]
+        if self._filter is not None:
+            self._filter(y)
+        self.index += y.shape[1]
+        return y[0].astype(_OUTPUT_TYPE)
+
+
+class NarrowbandServer(VfoServer):
+    """
+    Serves narrowband streams of the receiver's, each shifted, and decimated once for every client
+    that requested it. On connecting, a client sends a line of <offset> <decimation> [<bandwidth>],
+    in Hz, optionally prefixed by 'framed', cf. VfoServer; several streams are separated by commas.
+    Streams are sent as interleaved, big-endian 32-bit floats at the sampling rate divided by the
+    decimation, and only computed while they have clients; a stream is freed once its last client
+    leaves, and its number may be given to the next new one
+    """
+    # there is no default stream to give a silent client
+    _HANDSHAKE_TIMEOUT = None
+
+    def __init__(self,
+                 receiver: SocketReceiver,
+                 server_host: str,
+                 policy: OverrunPolicy | str = OverrunPolicy.DROP,
+                 maxBuffered: int = 1 << 22):
+        super().__init__(server_host, findPort(server_host), (), policy, maxBuffered)
+        self.receiver = receiver
+        self._streams: list[NarrowbandChannel | None] = []
+        self._lut = (generateLut(dtype(uint8), complex64) - (127.5 + 127.5j)) / 128
+        # a read may end between a sample's I, and Q
+        self._odd = None
+
+    @property
+    def socket(self):
+        return self._sock
+
+    def _parseStreams(self, request: str) -> list[NarrowbandChannel]:
+        fs = self.receiver.fs
+        if not fs:
+            raise ValueError('sampling rate is unknown; set it with --fs, or SET_SAMPLE_RATE')
+        ret = []
+        for spec in request.split(','):
+            try:
+                spec = tuple(int(float(x)) for x in spec.split())
+            except ValueError:
+                raise ValueError(f'invalid stream: {spec.strip()}')
+            if len(spec) not in (2, 3):
+                raise ValueError('streams are <offset> <decimation> [<bandwidth>]')
+            ret.append(NarrowbandChannel(fs, *spec))
+        return ret
+
+    def _addStream(self, stream: NarrowbandChannel) -> int:
+        # called with the condition held, as are the rest of the streams' changes
+        for i, other in enumerate(self._streams):
+            if other is not None and other.spec == stream.spec:
+                return i
+        try:
+            i = self._streams.index(None)
+            self._streams[i] = stream
+            self._channels[i] = stream.offset
+        except ValueError:
+            i = len(self._streams)
+            self._streams.append(stream)
+            self._channels.append(stream.offset)
+            self._subscribers.append([])
+        log(f'Narrowband stream {i}: offset {stream.offset} Hz, decimation {stream.decimation}, '
+            f'bandwidth {stream.bandwidth} Hz')
+        return i
+
+    def _removeStream(self, i: int) -> None:
+        log(f'Narrowband stream {i} has no clients left; freeing it')
+        self._streams[i] = None
+        self._channels[i] = None
+        while self._streams and self._streams[-1] is None:
+            self._streams.pop()
+            self._channels.pop()
+            self._subscribers.pop()
+
+    def _parseRequest(self, request: str) -> tuple[list[int], bool]:
+        request, framed = self._splitFramed(request)
+        streams = self._parseStreams(request)
+        if not framed and len({stream.decimation for stream in streams}) > 1:
+            # interleaving them takes chunks of equal length
+            raise ValueError('streams of different decimations have to be framed')
+        # nothing is created unless the whole request is valid
+        return [self._addStream(stream) for stream in streams], framed
+
+    def _unsubscribe(self, client) -> None:
+        channels = client.channels
+        super()._unsubscribe(client)
+        for i in channels:
+            if i < len(self._streams) and self._streams[i] is not None and not self._subscribers[i]:
+                self._removeStream(i)
+
+    def _handshake(self, client, data: bytes) -> None:
+        with self._condition:
+            super()._handshake(client, data)
+
+    def write(self, data) -> int:
+        if self._closed:
+            # the receiver drops this client
+            raise ValueError('Server is closed')
+        size = len(data)
+        if self._odd is not None:
+            data = self._odd + data
+            self._odd = None
+        if len(data) % 2:
+            self._odd = bytes(data[-1:])
+            data = data[:-1]
+        with self._condition:
+            fs = self.receiver.fs
+            streams = []
+            for i, stream in enumerate(self._streams):
+                if stream is None or not self.subscribed(i):
+                    stream = None
+                elif stream.fs != fs:
+                    # the sampling rate changed, so the stream starts over
+                    stream = self._streams[i] = NarrowbandChannel(fs, *stream.spec)
+                streams.append(stream)
+        if any(stream is not None for stream in streams):
+            # the stream is only converted at all if anyone is listening
+            x = self._lut.take(frombuffer(data, dtype=uint16))
+            indices = [0 if stream is None else stream.index for stream in streams]
+            chunks = [None if stream is None else stream(x) for stream in streams]
+            with self._condition:
+                # a stream freed meanwhile, or whose number was given to another, has no clients of its own
+                self.publish([chunk if i < len(self._streams) and self._streams[i] is streams[i] else None
+                              for i, chunk in enumerate(chunks)], indices)
+        return size
+
+    def __enter__(self):
+        super().__enter__()
+        self.receiver.addClient(self)
+        return self
@@ -17,46 +17,154 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
-from socketserver import BaseRequestHandler, ThreadingMixIn, TCPServer
+from struct import Struct
+from time import perf_counter
 
-from misc.general_util import shutdownSocket, eprint, findPort
+from numpy import frombuffer, uint8
+
+from misc.general_util import eprint, findPort
+from misc.io_args import OverrunPolicy
 from misc.keyboard_interruptable_thread import KeyboardInterruptableThread
+from misc.vfo_server import VfoServer, VfoClient
 from sdr.socket_receiver import SocketReceiver
 
+# a command of the relay's own, rather than of rtl_tcp's, which rewinds the client that sends it by
+# its parameter, in ms
+REWIND = 0xF0
+COMMAND = Struct('!BI')
+
 
 def log(*args, **kwargs) -> None:
     eprint(*args, **kwargs)
 
 
-class OutputServer(ThreadingMixIn, TCPServer):
-    def __init__(self, receiver: SocketReceiver, server_host: str, *args, **kwargs):
-        class ThreadedTCPRequestHandler(BaseRequestHandler):
-            def finish(self):
-                log(f'Client disconnected: {self.request.getsockname()}')
-                shutdownSocket(self.request)
-                self.request.close()
-
-            def handle(self):
-                log(f'Connection request from {self.request.getsockname()}')
-                with self.request.makefile('wb', buffering=False) as file:
-                    receiver.addClient(file).wait()
-                return
+class OutputServer(VfoServer):
+    """
+    Relays the receiver's stream to every client that connects. All of them are served from the
+    single thread of a VfoServer with one channel, to which they are subscribed on connecting, i.e.
+    without a handshake; anything they send is ignored. Each chunk is copied once, and queued to
+    every client's buffer, so that reading upstream never waits on a client, unless policy is
+    block; a client that falls more than maxBuffered bytes behind is handled per policy instead.
+    Given the receiver keeps a history, a client may send REWIND, e.g. right after connecting, to
+    be sent the stream from up to that long ago instead; the history is replayed as fast as the
+    client reads it, and the client is switched back to the live stream once it has caught up.
+    Clients' other commands are ignored
+    """
+    _REPLAY_CHUNK = 1 << 16
+    _REPLAY_SIZE = 1 << 20
 
-        super().__init__((server_host, findPort(server_host)), ThreadedTCPRequestHandler, *args,
-                         **kwargs)
-        self.block_on_close = False
+    def __init__(self,
+                 receiver: SocketReceiver,
+                 server_host: str,
+                 policy: OverrunPolicy | str = OverrunPolicy.DROP,
+                 maxBuffered: int = 1 << 22):
+        super().__init__(server_host, findPort(server_host), (f'{receiver.host}:{receiver.port}',),
+                         policy, maxBuffered, receiver.socketBufferSize)
         self.receiver = receiver
         self.pt = KeyboardInterruptableThread(self.shutdown, target=receiver.receive)
-        self.st = KeyboardInterruptableThread(self.shutdown, target=self.serve_forever)
+        # position in the receiver's history up to which the stream was published
+        self._published = 0
+        # position in the history up to which each client being replayed to was sent it
+        self._replays: dict[VfoClient, int] = {}
+
+    @property
+    def socket(self):
+        return self._sock
+
+    def _accept(self) -> VfoClient | None:
+        client = super()._accept()
+        if client is not None:
+            client.request = None
+            with self._condition:
+                self._subscribe(client, (0,))
+            log(f'Serving {client.address}')
+        return client
+
+    def _received(self, client: VfoClient, data: bytes) -> None:
+        client.received += data
+        while len(client.received) >= COMMAND.size:
+            command, param = COMMAND.unpack_from(client.received)
+            del client.received[:COMMAND.size]
+            if REWIND == command:
+                self._rewind(client, param)
+
+    def _rewind(self, client: VfoClient, ms: int) -> None:
+        history = self.receiver.history
+        if history is None:
+            log(f'{client.address} asked to rewind, but no history is kept')
+            return
+        with self._condition:
+            if client.closed:
+                return
+            start = max(self._published - ms * self.receiver.fs // 1000 * 2, history.start)
+            start = min(start + start % 2, self._published)
+            # the live chunks still queued are in the history, too; but one partly sent has to be
+            # finished, lest the stream lose its alignment
+            keep = client.pinned
+            while len(client.pending) > keep:
+                data, _ = client.pending.pop()
+                client.buffered -= len(data)
+            self._unsubscribe(client)
+            self._replays[client] = start
+            self._replay(client)
+        log(f'Replaying {ms} ms to {client.address}')
+
+    def _replay(self, client: VfoClient) -> None:
+        # called with the condition held
+        history = self.receiver.history
+        position = self._replays[client]
+        stop = self._published
+        queued = perf_counter()
+        while position < stop and client.buffered < self._REPLAY_SIZE:
+            if position < history.start:
+                # overwritten before it could be sent; whole samples are skipped
+                client.overflows += 1
+                position = history.start + history.start % 2
+                continue
+            try:
+                data = history.read(position, min(position + self._REPLAY_CHUNK, stop))
+            except ValueError:
+                # discarded since; i.e. the sampling rate changed
+                continue
+            client.pending.append((memoryview(data), queued))
+            client.buffered += len(data)
+            position += len(data)
+        if position < stop:
+            self._replays[client] = position
+        else:
+            # caught up, i.e. whatever is published next is the client's next chunk
+            del self._replays[client]
+            self._subscribe(client, (0,))
+
+    def _flush(self, client: VfoClient) -> None:
+        super()._flush(client)
+        with self._condition:
+            if client in self._replays and not (client.pending or client.evicted or client.closed):
+                self._replay(client)
+
+    def _disconnect(self, client: VfoClient) -> None:
+        with self._condition:
+            self._replays.pop(client, None)
+        super()._disconnect(client)
+
+    def write(self, data) -> int:
+        with self._condition:
+            self.publish((frombuffer(data, dtype=uint8),))
+            if self.receiver.history is not None:
+                # the receiver appends to it before handing the chunk to its clients
+                self._published = self.receiver.history.end
+        return len(data)
+
+    def shutdown(self) -> None:
+        self.close()
 
     def __enter__(self):
         super().__enter__()
+        self.receiver.addClient(self)
         self.pt.start()
-        self.st.start()
         return self
 
     def __exit__(self, *args, **kwargs):
         self.receiver.disconnect()
         self.pt.join(5)
-        self.st.join(5)
         super().__exit__(*args, **kwargs)
@@ -0,0 +1,213 @@
+#
+# This file is part of the sdrterm distribution
+# (https://github.com/peads/sdrterm).
+# with code originally part of the demodulator distribution
+# (https://github.com/peads/demodulator).
+# Copyright (c) 2023-2024 Patrick Eads.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+from struct import Struct
+from threading import Thread
+from time import perf_counter, sleep
+
+from numpy import ndarray, dtype, empty, uint8, clip, rint, float64
+
+from misc.file_util import checkWavHeader
+from misc.general_util import eprint, vprint, shutdownSocket
+from misc.read_file import generateDomain
+from sdr.rtl_tcp_commands import RtlTcpCommands
+
+# magic, tuner type, and number of gains, as rtl_tcp sends them on connecting
+DONGLE_HEADER = Struct('!4sII')
+# a command, and its parameter
+COMMAND = Struct('!BI')
+RTL0 = b'RTL0'
+# rtl_tcp's numbering of the R820T, and its number of gains
+_TUNER_TYPE = 5
+_GAIN_COUNT = 29
+
+
+def toUint8(x: ndarray) -> ndarray:
+    """Interleaved samples of any DataType as rtl_tcp's offset 8-bit ones; floats are in [-1, 1]"""
+    if 'B' == x.dtype.char:
+        return x
+    domain = generateDomain(x.dtype.char)
+    if domain is None:
+        y = 127.5 + 127.5 * x
+    else:
+        xmin, xMaxMinDiff = domain
+        y = (x.astype(float64) - xmin) * (255 * xMaxMinDiff)
+    return clip(rint(y), 0, 255).astype(uint8)
+
+
+class RtlTcpEmulator:
+    """
+    Serves an IQ recording, i.e. a two-channel wav, or interleaved raw file, as an rtl_tcp server
+    would serve a dongle's stream: the DONGLE_HEADER, and then offset 8-bit samples, paced to the
+    sampling rate times speed. Commands are logged, and SET_SAMPLE_RATE changes the pacing, not the
+    samples. As with rtl_tcp, one client is served at a time, each from the start of the recording,
+    which either ends their connection, or is looped
+    """
+    _PERIOD = 0.01
+    _MIN_CHUNK = 256
+    _MAX_CHUNK = 1 << 18
+
+    def __init__(self,
+                 inFile: str,
+                 host: str = 'localhost',
+                 port: int = 0,
+                 fs: int = None,
+                 enc: str = None,
+                 speed: float = 1.,
+                 loop: bool = False):
+        if not speed > 0:
+            raise ValueError('speed must be positive')
+        fileInfo = checkWavHeader(inFile, fs, enc)
+        if fileInfo['numChannels'] not in (0, 2):
+            raise ValueError('IQ recordings have two channels')
+        self._inFile = inFile
+        self._dataType: dtype = fileInfo['bitsPerSample']
+        # past the data chunk's size, which follows its id in a wav
+        self._dataOffset = fileInfo['dataOffset'] + (4 if fileInfo['numChannels'] else 0)
+        self._fs = fileInfo['sampRate']
+        self._speed = speed
+        self._loop = loop
+        self._repace = False
+        self._closed = False
+        self._conn: socket | None = None
+        self._commands: dict[RtlTcpCommands, int] = {}
+        self._sock = socket(AF_INET, SOCK_STREAM)
+        self._sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(1)
+        self._sock.settimeout(self._PERIOD * 10)
+        self._thread = Thread(target=self._serve, name='RtlTcpEmulator', daemon=True)
+
+    @property
+    def address(self) -> tuple:
+        return self._sock.getsockname()
+
+    @property
+    def fs(self) -> int:
+        return self._fs
+
+    @property
+    def commands(self) -> dict[RtlTcpCommands, int]:
+        """Last parameter received of each command"""
+        return self._commands
+
+    def _readCommands(self, conn: socket) -> None:
+        data = bytearray()
+        while not self._closed:
+            try:
+                chunk = conn.recv(COMMAND.size - len(data))
+            except OSError:
+                break
+            if not chunk:
+                break
+            data += chunk
+            if len(data) < COMMAND.size:
+                continue
+            value, param = COMMAND.unpack(data)
+            data.clear()
+            try:
+                command = RtlTcpCommands(value)
+            except ValueError:
+                eprint(f'Unrecognized command: {value}: {param}')
+                continue
+            eprint(f'{command}: {param}')
+            self._commands[command] = param
+            if RtlTcpCommands.SET_SAMPLE_RATE == command and param:
+                self._fs = param
+                self._repace = True
+
+    def _chunkSize(self) -> int:
+        size = self._fs * self._speed * self._PERIOD
+        return int(min(max(self._MIN_CHUNK, size), self._MAX_CHUNK))
+
+    def _stream(self, conn: socket) -> int:
+        # pacing follows a deadline from the start, so that errors of sleep do not accumulate
+        sent = total = 0
+        start = perf_counter()
+        buffer = empty(0, dtype=self._dataType)
+        with open(self._inFile, 'rb') as file:
+            file.seek(self._dataOffset)
+            while not self._closed:
+                if self._repace:
+                    self._repace = False
+                    sent = 0
+                    start = perf_counter()
+                size = 2 * self._chunkSize()
+                if buffer.size != size:
+                    buffer = empty(size, dtype=self._dataType)
+                n = file.readinto(memoryview(buffer).cast('B')) // self._dataType.itemsize
+                n -= n % 2
+                if not n:
+                    if not self._loop:
+                        break
+                    file.seek(self._dataOffset)
+                    continue
+                conn.sendall(toUint8(buffer[:n]))
+                sent += n // 2
+                total += n // 2
+                delay = start + sent / (self._fs * self._speed) - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+        return total
+
+    def _serve(self) -> None:
+        while not self._closed:
+            try:
+                conn, address = self._sock.accept()
+            except TimeoutError:
+                continue
+            except OSError:
+                break
+            eprint(f'Serving {self._inFile} at {self._fs} Hz, {self._speed}x, to {address}')
+            conn.settimeout(None)
+            self._conn = conn
+            # started before anything is sent, so that it can always be joined
+            commands = Thread(target=self._readCommands, args=(conn,), daemon=True)
+            commands.start()
+            with conn:
+                try:
+                    conn.sendall(DONGLE_HEADER.pack(RTL0, _TUNER_TYPE, _GAIN_COUNT))
+                    vprint(f'Sent {self._stream(conn)} sample(s) to {address}')
+                except ConnectionError:
+                    pass
+                finally:
+                    self._conn = None
+                    shutdownSocket(conn)
+            commands.join(1)
+            eprint(f'Client disconnected: {address}')
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed = True
+        if (conn := self._conn) is not None:
+            # lest a client that stopped reading hold up the server
+            shutdownSocket(conn)
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sock.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -20,32 +20,59 @@ from array import array
 from io import RawIOBase
 from multiprocessing import Value
 from os import name as osName
-from socket import socket, AF_INET, SOCK_STREAM, SO_KEEPALIVE, SO_REUSEADDR, SOL_SOCKET, gaierror
+from socket import (socket, AF_INET, SOCK_STREAM, SO_KEEPALIVE, SO_REUSEADDR, SO_RCVBUF, SOL_SOCKET,
+                    gaierror)
 from threading import Lock, Event
 from typing import Iterable
 
 from numpy import log2
 
 from misc.general_util import shutdownSocket, eprint, findMtu
+from misc.history_ring import HistoryRing
 from sdr.receiver import Receiver
 
 
 class SocketReceiver(Receiver):
+    """
+    Reads the stream of an rtl_tcp server, and hands each chunk to every client. Given the sampling
+    rate, chunks are sized to about _READ_PERIOD of the stream, so that the number of reads, and
+    writes per second does not grow with the rate; the socket's receive buffer holds
+    _SOCKET_BUFFER_READS of them. Given a duration of history, also the sampling rate, the most
+    recent seconds of the stream are kept, in historyFile if given, so that they can be replayed
+    """
     _BUF_SIZE = 8192
+    _MAX_BUF_SIZE = 1 << 20
     _MAX_RETRIES = 5
+    _READ_PERIOD = 0.01
+    # interleaved, 8-bit I, and Q
+    _BYTES_PER_SAMPLE = 2
+    _SOCKET_BUFFER_READS = 32
 
-    def __init__(self, isDead: Value, host: str = None, port: int = None):
+    def __init__(self,
+                 isDead: Value,
+                 host: str = None,
+                 port: int = None,
+                 fs: int = None,
+                 history: float = None,
+                 historyFile: str = None):
+        if history is not None and not (history > 0 and fs):
+            raise ValueError('History takes a positive duration, and the sampling rate')
         self._clients: dict[RawIOBase, Event] = {}
         self.host = host
         self.port = port
+        self.fs = fs
+        self._history = history
+        self.history = None if history is None else HistoryRing(self._historySize(fs), historyFile)
         self.__cond = Lock()
         super().__init__()
         self.isDead = isDead
-        self.__buffer: array = array('B', self._BUF_SIZE * b'\0')
+        self.__buffer: array = array('B', (self._bufferSize(fs) if fs else self._BUF_SIZE) * b'\0')
 
     def __exit__(self, *ex):
         self.disconnect()
         self._removeClients()
+        if self.history is not None:
+            self.history.close()
         self.__cond = None
         self._receiver = None
 
@@ -54,14 +81,40 @@ class SocketReceiver(Receiver):
             shutdownSocket(self._receiver)
             self._receiver.close()
 
-    def reset(self) -> None:
-        size = self._BUF_SIZE
-        mtu = findMtu(self._receiver)
-        if mtu > len(self.__buffer):
-            size = 1 << int(log2(mtu))
+    @classmethod
+    def _bufferSize(cls, fs: int) -> int:
+        size = int(fs * cls._BYTES_PER_SAMPLE * cls._READ_PERIOD)
+        # whole multiples of the minimum, which keep the samples' alignment
+        return min(max(cls._BUF_SIZE, size + -size % cls._BUF_SIZE), cls._MAX_BUF_SIZE)
+
+    def _historySize(self, fs: int) -> int:
+        # whole samples
+        return int(self._history * fs) * self._BYTES_PER_SAMPLE
+
+    @property
+    def bufferSize(self) -> int:
+        return len(self.__buffer)
+
+    @property
+    def socketBufferSize(self) -> int:
+        return self._SOCKET_BUFFER_READS * len(self.__buffer)
+
+    def reset(self, fs: int = None) -> None:
+        if fs is not None:
+            if self.history is not None and fs != self.fs:
+                # samples of another rate would be replayed as though they were of this one
+                self.history.resize(self._historySize(fs))
+            self.fs = fs
+        if self.fs:
+            size = self._bufferSize(self.fs)
+        else:
+            size = max(self._BUF_SIZE, 1 << int(log2(findMtu(self._receiver))))
+        if size != len(self.__buffer):
             eprint(f'Re-sizing buffer from {len(self.__buffer)} to {size}')
-        with self.__cond:
-            self.__buffer: array = array('B', size * b'\0')
+            with self.__cond:
+                self.__buffer: array = array('B', size * b'\0')
+        if self._receiver is not None and self._receiver.fileno() >= 0:
+            self._receiver.setsockopt(SOL_SOCKET, SO_RCVBUF, self.socketBufferSize)
 
     def _connect(self):
         self._receiver.setsockopt(SOL_SOCKET, SO_KEEPALIVE, 1)
@@ -71,23 +124,28 @@ class SocketReceiver(Receiver):
             from socket import SO_REUSEPORT
             self._receiver.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
         self._receiver.settimeout(5)
+        # the receive buffer has to be set before connecting for the window to scale to it
+        self._receiver.setsockopt(SOL_SOCKET, SO_RCVBUF, self.socketBufferSize)
         self._receiver.connect((self.host, self.port))
-        self.reset()
+        if not self.fs:
+            self.reset()
 
-    def __receive(self, clients: Iterable[RawIOBase]) -> None:
+    def __receive(self, clients: Iterable[RawIOBase], data: memoryview) -> None:
         for client in clients:
             try:
-                client.write(self.__buffer)
+                client.write(data)
             except (ConnectionError, EOFError, ValueError):
                 self._removeClient(client)
 
     def _receive(self, file) -> int:
         while not self.isDead.value:
             with self.__cond:
-                if not file.readinto(self.__buffer):
+                if not (n := file.readinto(self.__buffer)):
                     break
+                if self.history is not None:
+                    self.history.append(memoryview(self.__buffer)[:n])
                 clients = list(self._clients.keys())
-            self.__receive(clients)
+            self.__receive(clients, memoryview(self.__buffer)[:n])
         return self._MAX_RETRIES
 
     def receive(self) -> None:
@@ -26,7 +26,7 @@ from click import BadParameter
 from typer import run as typerRun, Option
 
 from misc.file_util import DataType
-from misc.io_args import DemodulationChoices
+from misc.io_args import DemodulationChoices, EngineChoices, PrecisionChoices, OverrunPolicy
 
 
 def parseStrDataType(value: str) -> str:
@@ -36,6 +36,15 @@ def parseStrDataType(value: str) -> str:
         raise BadParameter(str(ex))
 
 
+def parseOutputEncoding(value: str) -> str:
+    from misc.sample_writer import parseEncoding
+    try:
+        parseEncoding(value)
+        return value
+    except Exception as ex:
+        raise BadParameter(str(ex))
+
+
 def parseIntString(value: str | int) -> int:
     if value is None:
         raise BadParameter('Value cannot be None')
@@ -65,7 +74,8 @@ def main(fs: Annotated[int, Option('--fs', '-r',
                                        help='Input device')] = None,
          outFile: Annotated[str, Option('--output', '-o',
                                         show_default='stdout',
-                                        help='Output device')] = None,
+                                        help='''
+            Output device, or udp://<host>:<port>[?ttl=<hops>], or (unix|unixpacket|fifo)://<path>''')] = None,
          plot: Annotated[
              str, Option('--plot', help='1D-Comma-separated value of plot type(s)')] = None,
          demod: Annotated[DemodulationChoices, Option('--demodulation', '-m',
@@ -87,11 +97,29 @@ def main(fs: Annotated[int, Option('--fs', '-r',
                                          metavar='NUMBER',
                                          parser=parseIntString,
                                          help='Output cutoff frequency in k/M/Hz')] = 12500,
+         output_rate: Annotated[int, Option('--output-rate',
+                                            metavar='NUMBER',
+                                            parser=parseIntString,
+                                            show_default='None => decimated sampling frequency',
+                                            help='Resample the output to the given rate in k/M/Samples per sec')] = None,
+         output_encoding: Annotated[str, Option('--output-encoding', '-E',
+                                                metavar='[<|>]' + '[' + '|'.join(DataType.dict().keys()) + ']',
+                                                parser=parseOutputEncoding,
+                                                show_default='d => doubles',
+                                                help='''
+            Binary encoding of the output, optionally prefixed by its byte order; system-default otherwise, or
+            network-default with --simo. Integer encodings map [-1, 1) to their full scale, and clip.''')] = None,
+         output_gain: Annotated[float, Option(help='Gain applied to the output before it is encoded')] = 1.,
+         dither: Annotated[bool, Option(
+             help='Add triangular dither of one least significant bit to integer output encodings')] = False,
          correct_iq: Annotated[bool, Option(help='Toggle iq correction')] = False,
+         fast_atan: Annotated[bool, Option(
+             help='Use a polynomial approximation of the arctangent for FM demodulation')] = False,
          simo: Annotated[bool, Option(help='''
             Enable using sockets to output data processed from multiple channels specified by the vfos option.
             N.B. unlike normal mode, which uses the system-default endianness for output, the sockets output
-            network-default, big-endian doubles. [Implies: --vfos <csv>]''')] = False,
+            network-default, big-endian samples; doubles, unless --output-encoding says otherwise, and big-endian
+            unless it is prefixed by a byte order. [Implies: --vfos <csv>]''')] = False,
          verbose: Annotated[int, Option("--verbose", "-v",
                                         count=True,
                                         help='Toggle verbose output. Repetition increases verbosity (e.g. -vv, or -v -v)')] = 0,
@@ -101,10 +129,46 @@ def main(fs: Annotated[int, Option('--fs', '-r',
          vfo_host: Annotated[
              str, Option(
                  help='Address on which to listen for vfo client connections')] = 'localhost',
+         vfo_overrun: Annotated[OverrunPolicy, Option(case_sensitive=False,
+                                                      help='''
+            What happens once a vfo client falls a full buffer behind. block holds back every vfo until it catches up;
+            drop discards its oldest unsent output; disconnect closes its connection.
+            [Requires: --simo]''')] = OverrunPolicy.DROP,
+         vfo_buffer_size: Annotated[int, Option('--vfo-buffer-size',
+                                                metavar='NUMBER',
+                                                parser=parseIntString,
+                                                show_default='1M',
+                                                help='''
+            Size of each vfo client's send buffer in k/M/bytes. [Requires: --simo]''')] = '1M',
+         vfo_output: Annotated[str, Option('--vfo-output',
+                                           metavar='udp://<host>:<port>[?ttl=<hops>] | (unix|unixpacket|fifo)://<path>',
+                                           help='''
+            Also send each vfo as datagrams to its own port, counting up from port, e.g. of a multicast group, or to its
+            own unix domain socket, or fifo at <path>-<frequency>. [Requires: --simo]''')] = None,
+         channel_spacing: Annotated[int, Option('--channel-spacing',
+                                                metavar='NUMBER',
+                                                parser=parseIntString,
+                                                show_default='None => shift, and decimate each vfo separately',
+                                                help='''
+            Extract the vfos with a polyphase filter bank channelizer of the given channel spacing in k/M/Hz.
+            Vfos not on the channel grid are corrected after decimation. [Requires: --simo]''')] = None,
          swap_input_endianness: Annotated[bool, Option('--swap-input-endianness', '-X',
                                                        help='Swap input endianness',
                                                        show_default='False => system-default, or as defined in RIFF header')] = False,
-         normalize_input: Annotated[bool, Option(help='Normalize input data.')] = False, ):
+         normalize_input: Annotated[bool, Option(help='Normalize input data.')] = False,
+         engine: Annotated[EngineChoices, Option(case_sensitive=False,
+                                                 help='''
+            Processing engine for the single-channel path. fused performs the shift, decimation and demodulation
+            in a single pass over the input; compare runs the fused engine alongside the chain, and reports
+            their deviation in verbose output. [Ignored by: --simo]''')] = EngineChoices.CHAIN,
+         precision: Annotated[PrecisionChoices, Option(case_sensitive=False,
+                                                       help='''
+            Floating-point precision of the processing. single processes complex64/float32 samples, halving the
+            memory, and queue traffic; the output remains doubles.''')] = PrecisionChoices.DOUBLE,
+         shared_buffer: Annotated[bool, Option(help='''
+            Fan the input out to the writer, and plots through a ring buffer in shared memory, which each of them
+            reads in place, instead of a bounded queue apiece, which remains the default. Either way, the writer holds
+            the reader back rather than lose data, whereas the plots drop all but the latest chunk.''')] = False, ):
     from misc.io_args import IOArgs
     from misc.read_file import readFile
     from multiprocessing import Process, Queue
@@ -128,13 +192,25 @@ def main(fs: Annotated[int, Option('--fs', '-r',
                         pl=plot,
                         isDead=isDead,
                         omegaOut=omegaOut,
+                        outputRate=output_rate,
+                        outputEncoding=output_encoding,
+                        outputGain=output_gain,
+                        dither=dither,
                         enc=enc,
                         correctIq=correct_iq,
+                        fastAtan=fast_atan,
                         simo=simo,
                         verbose=verbose,
                         smooth=smooth_output,
                         vfoHost=vfo_host,
-                        normalize=normalize_input)
+                        channelSpacing=channel_spacing,
+                        vfoOverrun=vfo_overrun,
+                        vfoBufferSize=vfo_buffer_size,
+                        vfoOutput=vfo_output,
+                        normalize=normalize_input,
+                        engine=engine,
+                        precision=precision,
+                        sharedBuffer=shared_buffer)
 
         for proc in processes:
             proc.start()
@@ -166,6 +242,8 @@ def main(fs: Annotated[int, Option('--fs', '-r',
                 proc.join()
                 vprint(f'{proc.name} returned: {proc.exitcode}')
             proc.close()
+        if IOArgs.strct is not None and IOArgs.strct.get('ring') is not None:
+            IOArgs.strct['ring'].release()
         vprint('Main halted')
 
 
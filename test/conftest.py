@@ -0,0 +1,30 @@
+from time import sleep
+
+import pytest
+
+
+@pytest.fixture
+def receive():
+    """Reads size bytes from a socket, or fewer if the connection ends first"""
+
+    def receive(sock, size):
+        data = bytearray()
+        while len(data) < size and (chunk := sock.recv(size - len(data))):
+            data += chunk
+        return bytes(data)
+
+    return receive
+
+
+@pytest.fixture
+def waitFor():
+    """Polls predicate until it holds, or timeout seconds have passed; returns whether it held"""
+
+    def waitFor(predicate, timeout=5.):
+        for _ in range(int(timeout / 0.01)):
+            if predicate():
+                return True
+            sleep(0.01)
+        return predicate()
+
+    return waitFor
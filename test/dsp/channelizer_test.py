@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from dsp.channelizer import Channelizer
+from dsp.decimator import PolyphaseDecimator
+from dsp.nco import Nco
+
+EPSILON = 1e-12
+DEFAULT_FS = 48000
+DEFAULT_FACTOR = 8
+DEFAULT_CHANNELS = 8
+DEFAULT_SIZE = 5000
+CHUNK_SIZES = (100, 3, 797, 2000, 1, 513)
+FREQS = (0, 6000, -12000, 7000)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(1234)
+    return rng.standard_normal(DEFAULT_SIZE) + 1j * rng.standard_normal(DEFAULT_SIZE)
+
+
+def test_bins():
+    channelizer = Channelizer(DEFAULT_FS, DEFAULT_FACTOR, DEFAULT_CHANNELS, FREQS)
+    assert channelizer.spacing == DEFAULT_FS / DEFAULT_CHANNELS
+    assert np.array_equal(channelizer.bins, (0, 1, 6, 1))
+    assert np.array_equal(channelizer.residuals, (0, 0, 0, 1000))
+
+    channelizer.freqs = (-7000,)
+    assert np.array_equal(channelizer.bins, (7,))
+    assert np.array_equal(channelizer.residuals, (-1000,))
+
+    with pytest.raises(ValueError) as e:
+        Channelizer(DEFAULT_FS, DEFAULT_FACTOR, 0, FREQS)
+    print(f'\n{e.type.__name__}: {e.value}')
+
+
+def test_streaming(signal):
+    channelizer = Channelizer(DEFAULT_FS, DEFAULT_FACTOR, DEFAULT_CHANNELS, FREQS)
+    nco = Nco(DEFAULT_FS, np.array(FREQS) - channelizer.residuals)
+    decimator = PolyphaseDecimator(DEFAULT_FACTOR)
+
+    x = np.empty((len(FREQS), DEFAULT_SIZE), dtype=signal.dtype)
+    nco(signal, x)
+    expected = np.empty((len(FREQS), decimator.outputSize(DEFAULT_SIZE)), dtype=signal.dtype)
+    k = decimator(x, expected)
+    expected = expected[:, :k]
+
+    result = []
+    i = 0
+    while i < signal.size:
+        for size in CHUNK_SIZES:
+            chunk = signal[i:i + size]
+            i += chunk.size
+            res = np.empty((len(FREQS), channelizer.outputSize(chunk.size)), dtype=chunk.dtype)
+            k = channelizer(chunk, res)
+            assert k <= res.shape[1]
+            result.append(res[:, :k])
+
+    result = np.concatenate(result, axis=1)
+    assert result.shape == expected.shape
+    assert np.max(np.abs(result - expected)) < EPSILON
+
+
+def test_residual():
+    t = np.arange(DEFAULT_SIZE) / DEFAULT_FS
+    freq = FREQS[-1]
+    channelizer = Channelizer(DEFAULT_FS, DEFAULT_FACTOR, DEFAULT_CHANNELS, (freq,))
+    nco = Nco(DEFAULT_FS // DEFAULT_FACTOR, channelizer.residuals)
+
+    res = np.empty((1, channelizer.outputSize(DEFAULT_SIZE)), dtype=np.complex128)
+    k = channelizer(np.exp(2j * np.pi * freq * t), res)
+    nco(res[:, :k], res[:, :k])
+
+    # past the filter's transient, the tone is mixed down to a constant
+    settled = res[0, 40:k]
+    assert np.max(np.abs(settled - settled.mean())) < 1e-3
+    assert np.abs(np.abs(settled.mean()) - 1) < 1e-2
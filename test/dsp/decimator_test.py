@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from scipy.signal import lfilter, firwin
+
+from dsp.decimator import PolyphaseDecimator, generateDecimationTaps
+
+EPSILON = 1e-12
+DEFAULT_FACTOR = 5
+DEFAULT_SIZE = 1000
+CHUNK_SIZES = (128, 3, 257, 64, 1, 500)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(1234)
+    return rng.standard_normal((2, DEFAULT_SIZE)) + 1j * rng.standard_normal((2, DEFAULT_SIZE))
+
+
+def test_taps():
+    assert np.array_equal(generateDecimationTaps(DEFAULT_FACTOR),
+                          firwin(20 * DEFAULT_FACTOR + 1, 1. / DEFAULT_FACTOR, window='hamming'))
+
+    with pytest.raises(ValueError) as e:
+        PolyphaseDecimator(0)
+    print(f'\n{e.type.__name__}: {e.value}')
+
+
+def test_streaming(signal):
+    decimator = PolyphaseDecimator(DEFAULT_FACTOR)
+    expected = lfilter(decimator.taps, 1, signal)[:, ::DEFAULT_FACTOR]
+
+    result = []
+    i = 0
+    while i < signal.shape[1]:
+        for size in CHUNK_SIZES:
+            chunk = signal[:, i:i + size]
+            i += chunk.shape[1]
+            res = np.empty((chunk.shape[0], decimator.outputSize(chunk.shape[1])), dtype=chunk.dtype)
+            k = decimator(chunk, res)
+            assert k <= res.shape[1]
+            result.append(res[:, :k])
+
+    result = np.concatenate(result, axis=1)
+    assert result.shape == expected.shape
+    assert np.max(np.abs(result - expected)) < EPSILON
+
+    decimator.reset()
+    res = np.empty((signal.shape[0], decimator.outputSize(signal.shape[1])), dtype=signal.dtype)
+    k = decimator(signal, res)
+    assert np.max(np.abs(res[:, :k] - expected)) < EPSILON
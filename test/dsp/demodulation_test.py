@@ -2,7 +2,6 @@ import math
 
 import numpy as np
 import pytest
-from scipy.signal import resample
 
 import dsp.demodulation as dsp
 
@@ -19,15 +18,37 @@ def data():
 def test_fm(data):
     inp, outp = data
     dsp.fmDemod(np.array(inp), outp)
-    testOutp = [0] * (inp.shape[1] >> 1)
-    for i in range(0, inp.shape[1], 2):
-        temp = inp[0][i] * inp[0][i + 1].conjugate()
-        testOutp[i >> 1] = math.atan2(temp.imag, temp.real)
-    testOutp = resample(testOutp, inp.shape[1])
+    testOutp = [0.]
+    for i in range(1, inp.shape[1]):
+        temp = inp[0][i - 1] * inp[0][i].conjugate()
+        testOutp.append(math.atan2(temp.imag, temp.real))
     for x, y in zip(outp[0], testOutp):
         assert math.fabs(x - y) < EPSILON
 
 
+def test_fm_discriminator():
+    rng = np.random.default_rng(1234)
+    inp = rng.standard_normal((2, 1000)) + 1j * rng.standard_normal((2, 1000))
+    expected = np.empty(inp.shape, dtype=np.float64)
+    dsp.FmDiscriminator()(inp, expected)
+    assert np.max(np.abs(expected[:, 0])) < EPSILON
+
+    discriminator = dsp.FmDiscriminator()
+    fastDiscriminator = dsp.FmDiscriminator(fast=True)
+    outp = np.empty(inp.shape, dtype=np.float64)
+    fastOutp = np.empty(inp.shape, dtype=np.float64)
+    for i in range(0, inp.shape[1], 333):
+        discriminator(inp[:, i:i + 333], outp[:, i:i + 333])
+        fastDiscriminator(inp[:, i:i + 333], fastOutp[:, i:i + 333])
+    assert np.max(np.abs(outp - expected)) < EPSILON
+    assert np.max(np.abs(fastOutp - expected)) < 1e-5
+
+
+def test_fast_atan2():
+    for y, x in ((0, 0), (0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (3, -4), (-4, 3)):
+        assert math.fabs(dsp.fastAtan2(y, x) - math.atan2(y, x)) < 1e-5
+
+
 def test_am(data):
     inp, outp = data
     dsp.amDemod(np.array(inp), outp)
@@ -48,3 +69,22 @@ def test_real(data):
     dsp.realOutput(np.array(inp), outp)
     for x, z in zip(outp[0], inp[0]):
         assert x == z.real
+
+
+def test_single_precision(data):
+    inp, _ = data
+    inp = inp.astype(np.complex64)
+    for demod in (dsp.amDemod, dsp.realOutput, dsp.imagOutput, dsp.FmDiscriminator()):
+        outp = np.empty(inp.shape, dtype=np.float32)
+        expected = np.empty(inp.shape, dtype=np.float64)
+        demod(inp, outp)
+        if isinstance(demod, dsp.FmDiscriminator):
+            demod.reset()
+        demod(inp.astype(np.complex128), expected)
+        assert np.max(np.abs(outp - expected)) < 1e-4 * np.max(np.abs(expected))
+
+    shift = np.exp(-2j * np.pi * np.arange(inp.shape[1]) / 4).astype(np.complex64).reshape(1, -1)
+    outp = np.empty(inp.shape, dtype=np.complex64)
+    dsp.shiftFreq(inp[0], shift, outp)
+    assert outp.dtype == np.complex64
+    assert np.max(np.abs(outp - inp * shift)) < 1e-5
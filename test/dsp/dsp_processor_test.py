@@ -11,6 +11,7 @@ DEFAULT_FS = 48000
 DEFAULT_CENTER = -1000
 DEFAULT_SHIFT_SIZE = 8
 DEFAULT_DECIMATION_FACTOR = 3
+EPSILON = 1e-12
 
 
 @pytest.fixture
@@ -23,7 +24,7 @@ def test_init(processor):
     assert processor.decimation == 2
     assert processor.decimatedFs == DEFAULT_FS >> 1
     processor.selectOutputFm()
-    assert processor.demod == dem.fmDemod
+    assert isinstance(processor.demod, dem.FmDiscriminator)
     processor.selectOutputAm()
     assert processor.demod == dem.amDemod
 
@@ -47,15 +48,21 @@ def test_init(processor):
     assert processor.decimation == DEFAULT_DECIMATION_FACTOR
     assert processor.decimatedFs == DEFAULT_FS / DEFAULT_DECIMATION_FACTOR
 
-    processor._generateShift(DEFAULT_SHIFT_SIZE)
+    processor._generateShift()
     assert processor._shift is None
 
     processor.centerFreq = DEFAULT_CENTER
     assert processor.centerFreq == DEFAULT_CENTER
-    processor._generateShift(DEFAULT_SHIFT_SIZE)
-    assert processor._shift.size == DEFAULT_SHIFT_SIZE
-    for k in range(8):
-        assert processor._shift[0][k] == np.pow(math.e, -2j * math.pi * (DEFAULT_CENTER / DEFAULT_FS) * k)
+    processor._generateShift()
+    assert len(processor._shift) == 1
+    assert processor._shift.freqs[0] == DEFAULT_CENTER
+    shifted = np.empty((1, DEFAULT_SHIFT_SIZE), dtype=np.complex128)
+    processor._shift(np.ones(DEFAULT_SHIFT_SIZE, dtype=np.complex128), shifted)
+    for k in range(DEFAULT_SHIFT_SIZE):
+        assert abs(shifted[0][k] - np.pow(math.e, -2j * math.pi * (DEFAULT_CENTER / DEFAULT_FS) * k)) < EPSILON
+
+    processor.centerFreq = -DEFAULT_CENTER
+    assert processor._shift.freqs[0] == -DEFAULT_CENTER
 
     with pytest.raises(FileNotFoundError) as e:
         processor.processData(None, None, '')
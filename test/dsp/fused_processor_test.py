@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from dsp.decimator import PolyphaseDecimator
+from dsp.fused_processor import FusedEngine, FusedDspProcessor
+from dsp.nco import Nco
+
+EPSILON = 1e-9
+DEFAULT_FS = 48000
+DEFAULT_CENTER = -1000
+DEFAULT_FACTOR = 4
+DEFAULT_SIZE = 4000
+CHUNK_SIZES = (1000, 3, 997, 500, 1500)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(4321)
+    return rng.standard_normal(DEFAULT_SIZE) + 1j * rng.standard_normal(DEFAULT_SIZE)
+
+
+@pytest.fixture
+def reference(signal):
+    x = np.empty((1, signal.size), dtype=signal.dtype)
+    Nco(DEFAULT_FS, (DEFAULT_CENTER,))(signal, x)
+    decimator = PolyphaseDecimator(DEFAULT_FACTOR)
+    y = np.empty((1, decimator.outputSize(signal.size)), dtype=signal.dtype)
+    k = decimator(x, y)
+    return decimator.taps, y[0, :k]
+
+
+def run(engine, signal):
+    result = []
+    i = 0
+    for c in CHUNK_SIZES:
+        res = np.empty(-(-c // DEFAULT_FACTOR), dtype=np.float64)
+        k = engine(signal[i:i + c], res)
+        result.append(res[:k])
+        i += c
+    return np.concatenate(result)
+
+
+def test_fused_engine(signal, reference):
+    taps, y = reference
+    # the discriminator starts from the first sample, as FmDiscriminator does
+    expected = (np.angle(np.concatenate((y[:1], y[:-1])) * np.conj(y)),
+                np.abs(y) ** 2,
+                y.real,
+                y.imag)
+
+    for mode, e in enumerate(expected):
+        engine = FusedEngine(DEFAULT_FS, taps, DEFAULT_FACTOR, mode)
+        engine.freq = DEFAULT_CENTER
+        assert engine.freq == DEFAULT_CENTER
+        result = run(engine, signal)
+        assert result.shape == e.shape
+        assert np.max(np.abs(result - e)) < EPSILON
+
+
+def test_fused_engine_first_sample(signal, reference):
+    taps, _ = reference
+    # whatever the quadrant of the first sample, the discriminator starts from it, rather than from
+    # zero, whose product with it may be a signed zero, i.e. an angle of pi
+    for rotation in (1, 1j, -1, -1j):
+        engine = FusedEngine(DEFAULT_FS, taps, DEFAULT_FACTOR, 0)
+        engine.freq = DEFAULT_CENTER
+        assert abs(run(engine, rotation * signal)[0]) < EPSILON
+
+
+@pytest.mark.parametrize('output', ('Am', 'Fm'))
+def test_fused_processor(signal, output):
+    processor = FusedDspProcessor(DEFAULT_FS, compare=True, dec=DEFAULT_FACTOR, center=DEFAULT_CENTER,
+                                  omegaOut=5000)
+    getattr(processor, f'selectOutput{output}')()
+    processor._generateShift()
+    x = np.array([signal])
+    y = np.empty((1, DEFAULT_SIZE // DEFAULT_FACTOR), dtype=signal.dtype)
+    z = np.empty((1, DEFAULT_SIZE // DEFAULT_FACTOR), dtype=np.float64)
+    k = processor._demodulate(x, y, z)
+    assert k == DEFAULT_SIZE // DEFAULT_FACTOR
+    assert np.max(np.abs(processor._reference[0] - z[0])) < EPSILON
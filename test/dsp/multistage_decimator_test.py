@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from dsp.decimator import PolyphaseDecimator
+from dsp.multistage_decimator import planDecimation, HalfBandDecimator, MultiStageDecimator, \
+    generateHalfBandTaps, CicDecimator, generateCicTaps
+
+EPSILON = 1e-12
+DEFAULT_FS = 2048000
+DEFAULT_FACTOR = 64
+DEFAULT_SIZE = 20000
+CHUNK_SIZES = (1280, 3, 2570, 64, 1, 5000)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(1234)
+    return rng.standard_normal((2, DEFAULT_SIZE)) + 1j * rng.standard_normal((2, DEFAULT_SIZE))
+
+
+def test_plan():
+    for factor in (2, 5, 13):
+        decimator = planDecimation(factor)
+        assert type(decimator) is PolyphaseDecimator
+        assert decimator.factor == factor
+
+    for factor, plan in ((8, [2, 2, 2]), (64, [8, 2, 2, 2]), (96, [12, 2, 2, 2]), (50, [25, 2]),
+                         (75, [25, 3]), (4096, [64, 2, 2, 16])):
+        decimator = planDecimation(factor)
+        assert isinstance(decimator, MultiStageDecimator)
+        assert decimator.factor == factor
+        assert [stage.factor for stage in decimator.stages] == plan
+        assert len(decimator.plan) == len(plan)
+        assert decimator.macsPerSample < PolyphaseDecimator(factor).macsPerSample
+
+    with pytest.raises(ValueError) as e:
+        MultiStageDecimator([])
+    print(f'\n{e.type.__name__}: {e.value}')
+
+
+def test_half_band(signal):
+    taps = generateHalfBandTaps()
+    assert np.count_nonzero(taps) == (taps.size + 1) // 2 + 1
+    assert abs(taps.sum() - 1) < EPSILON
+
+    expected = np.empty((signal.shape[0], DEFAULT_SIZE >> 1), dtype=signal.dtype)
+    PolyphaseDecimator(2, taps)(signal, expected)
+    res = np.empty(expected.shape, dtype=signal.dtype)
+    HalfBandDecimator()(signal, res)
+    assert np.max(np.abs(res - expected)) < EPSILON
+
+
+def test_cic(signal):
+    with pytest.raises(ValueError):
+        CicDecimator(1)
+    with pytest.raises(ValueError):
+        CicDecimator(128)
+
+    # the recursive form is the boxcar filter, to within its fixed point
+    for factor in (2, 5, 25, 64):
+        expected = np.empty((signal.shape[0], DEFAULT_SIZE // factor + 1), dtype=signal.dtype)
+        k = PolyphaseDecimator(factor, generateCicTaps(factor))(signal, expected)
+        res = np.empty(expected.shape, dtype=signal.dtype)
+        assert k == CicDecimator(factor)(signal, res)
+        assert np.max(np.abs(res[:, :k] - expected[:, :k])) < 1e-6
+
+
+@pytest.mark.parametrize('factor', (DEFAULT_FACTOR, 50))
+def test_streaming(signal, factor):
+    decimator = planDecimation(factor)
+    expected = np.empty((signal.shape[0], decimator.outputSize(DEFAULT_SIZE)), dtype=signal.dtype)
+    k = decimator(signal, expected)
+    expected = expected[:, :k]
+    decimator.reset()
+
+    result = []
+    i = 0
+    while i < signal.shape[1]:
+        for size in CHUNK_SIZES:
+            chunk = signal[:, i:i + size]
+            i += chunk.shape[1]
+            res = np.empty((chunk.shape[0], decimator.outputSize(chunk.shape[1])), dtype=chunk.dtype)
+            k = decimator(chunk, res)
+            assert k <= res.shape[1]
+            result.append(res[:, :k])
+
+    result = np.concatenate(result, axis=1)
+    assert result.shape == expected.shape
+    assert np.max(np.abs(result - expected)) < EPSILON
+
+
+@pytest.mark.parametrize('factor', (DEFAULT_FACTOR, 50, 75))
+def test_response(factor):
+    decimator = planDecimation(factor)
+    outputFs = DEFAULT_FS / factor
+    t = np.arange(DEFAULT_SIZE << 3) / DEFAULT_FS
+
+    def gain(f):
+        decimator.reset()
+        res = np.empty((1, decimator.outputSize(t.size)), dtype=np.complex128)
+        k = decimator(np.exp(2j * np.pi * f * t).reshape(1, -1), res)
+        return np.abs(res[0, k >> 1:k]).mean()
+
+    # flat passband, and aliases attenuated
+    for f in (0, .2 * outputFs, .4 * outputFs):
+        assert abs(gain(f) - 1) < .05
+    for f in (.6 * outputFs, outputFs, 8.1 * outputFs):
+        assert gain(f) < 1e-2
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from dsp.nco import Nco
+
+EPSILON = 1e-9
+DEFAULT_FS = 48000
+DEFAULT_FREQS = (-1000, 1234.5, 0)
+CHUNK_SIZES = (100, 7, 333, 1, 559)
+
+
+@pytest.fixture
+def nco():
+    return Nco(DEFAULT_FS, DEFAULT_FREQS)
+
+
+def test_phase_continuity(nco):
+    size = sum(CHUNK_SIZES)
+    x = np.ones(size, dtype=np.complex128)
+    expected = np.exp(-2j * np.pi * np.outer(DEFAULT_FREQS, np.arange(size)) / DEFAULT_FS)
+
+    i = 0
+    for c in CHUNK_SIZES:
+        res = np.empty((len(nco), c), dtype=np.complex128)
+        nco(x[i:i + c], res)
+        assert np.max(np.abs(res - expected[:, i:i + c])) < EPSILON
+        i += c
+    assert np.all(nco.phase >= 0)
+    assert np.all(nco.phase < 1)
+
+
+def test_in_place(nco):
+    x = np.ones((len(nco), 16), dtype=np.complex128)
+    x[0, :] = np.arange(16)
+    expected = x[0] * np.exp(-2j * np.pi * np.outer(DEFAULT_FREQS, np.arange(16)) / DEFAULT_FS)
+    nco(x[0], x)
+    assert np.max(np.abs(x - expected)) < EPSILON
+
+
+def test_retune(nco):
+    x = np.ones(10, dtype=np.complex128)
+    res = np.empty((len(nco), 10), dtype=np.complex128)
+    nco(x, res)
+    last = res[:, -1] * np.exp(-2j * np.pi * np.array(DEFAULT_FREQS) / DEFAULT_FS)
+
+    nco.freqs = [2 * f for f in DEFAULT_FREQS]
+    nco(x, res)
+    assert np.max(np.abs(res[:, 0] - last)) < EPSILON
+
+    nco.fs = DEFAULT_FS << 1
+    assert np.array_equal(nco.freqs, [2 * f for f in DEFAULT_FREQS])
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from scipy.signal import upfirdn
+
+from dsp.resampler import RationalResampler
+
+EPSILON = 1e-12
+DEFAULT_INPUT_FS = 19200
+DEFAULT_OUTPUT_FS = 48000
+DEFAULT_SIZE = 5000
+CHUNK_SIZES = (128, 3, 257, 64, 1, 500)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(1234)
+    return rng.standard_normal((2, DEFAULT_SIZE))
+
+
+def test_init():
+    resampler = RationalResampler(DEFAULT_INPUT_FS, DEFAULT_OUTPUT_FS)
+    assert (resampler.up, resampler.down) == (5, 2)
+    resampler = RationalResampler(24000, 48000)
+    assert (resampler.up, resampler.down) == (2, 1)
+
+    with pytest.raises(ValueError) as e:
+        RationalResampler(0, DEFAULT_OUTPUT_FS)
+    print(f'\n{e.type.__name__}: {e.value}')
+
+
+def test_streaming(signal):
+    resampler = RationalResampler(DEFAULT_INPUT_FS, DEFAULT_OUTPUT_FS)
+    taps = resampler._phases.T.reshape(-1)
+    expected = upfirdn(taps, signal, resampler.up, resampler.down)
+
+    result = []
+    i = 0
+    while i < signal.shape[1]:
+        for size in CHUNK_SIZES:
+            chunk = signal[:, i:i + size]
+            i += chunk.shape[1]
+            res = np.empty((chunk.shape[0], resampler.outputSize(chunk.shape[1])))
+            k = resampler(chunk, res)
+            assert k <= res.shape[1]
+            result.append(res[:, :k])
+
+    result = np.concatenate(result, axis=1)
+    assert result.shape[1] == DEFAULT_SIZE * resampler.up // resampler.down
+    assert np.max(np.abs(result - expected[:, :result.shape[1]])) < EPSILON
+
+
+def test_tone():
+    t = np.arange(DEFAULT_INPUT_FS) / DEFAULT_INPUT_FS
+    resampler = RationalResampler(DEFAULT_INPUT_FS, DEFAULT_OUTPUT_FS)
+    res = np.empty((1, resampler.outputSize(t.size)))
+    k = resampler(np.sin(2 * np.pi * 1000 * t).reshape(1, -1), res)
+    assert k == DEFAULT_OUTPUT_FS
+
+    # past the filter's transient, the tone is reproduced at the new rate
+    delay = 10 * max(resampler.up, resampler.down) / resampler.up
+    u = (np.arange(k) / resampler.up * resampler.down - delay) / DEFAULT_INPUT_FS
+    assert np.max(np.abs(res[0, 1000:k] - np.sin(2 * np.pi * 1000 * u[1000:]))) < 1e-2
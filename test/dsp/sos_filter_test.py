@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.signal import sosfilt
+
+from dsp.dsp_processor import generateEllipFilter
+from dsp.sos_filter import SosFilter
+
+EPSILON = 1e-12
+DEFAULT_FS = 24000
+DEFAULT_SIZE = 1000
+CHUNK_SIZES = (128, 3, 257, 64, 1, 500)
+
+
+@pytest.fixture
+def sos():
+    return generateEllipFilter(DEFAULT_FS, 3, 5000, 'lowpass')
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(1234)
+    return rng.standard_normal((2, DEFAULT_SIZE))
+
+
+def test_streaming(sos, signal):
+    sosFilter = SosFilter(sos)
+    expected = sosfilt(sos, signal)
+
+    y = signal.copy()
+    i = 0
+    while i < y.shape[1]:
+        for size in CHUNK_SIZES:
+            chunk = y[:, i:i + size]
+            i += chunk.shape[1]
+            assert sosFilter(chunk) is chunk
+
+    assert sosFilter.zi.shape == (signal.shape[0], sos.shape[0], 2)
+    assert np.max(np.abs(y - expected)) < EPSILON
+
+    sosFilter.reset()
+    y = signal.copy()
+    sosFilter(y)
+    assert np.max(np.abs(y - expected)) < EPSILON
+
+
+def test_init():
+    with pytest.raises(TypeError) as e:
+        SosFilter(None)
+    print(f'\n{e.type.__name__}: {e.value}')
+
+    with pytest.raises(ValueError) as e:
+        SosFilter(np.ones(6))
+    print(f'\n{e.type.__name__}: {e.value}')
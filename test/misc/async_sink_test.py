@@ -0,0 +1,59 @@
+from io import BytesIO, RawIOBase
+from threading import Event, Timer
+
+import numpy as np
+import pytest
+
+from misc.async_sink import AsyncSink
+from misc.sample_writer import SampleWriter
+
+
+class _BlockedWriter(RawIOBase):
+    def __init__(self):
+        self.event = Event()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.event.wait()
+        raise BrokenPipeError
+
+
+def test_async_sink():
+    with pytest.raises(ValueError):
+        AsyncSink(SampleWriter(BytesIO()), 0)
+
+    file = BytesIO()
+    sink = AsyncSink(SampleWriter(file))
+    z = np.zeros((2, 16))
+    expected = []
+    # each chunk is copied, so the caller may reuse its array straight away
+    for i in range(8):
+        z[:] = i
+        sink.write(z[:, :8 + i])
+        expected.append(z[:, :8 + i].copy())
+    sink.close()
+    sink.close()
+    assert sink.chunks == 8
+    assert sink.maxLatency >= sink.latency > 0
+    assert file.getvalue() == b''.join(e.tobytes() for e in expected)
+    with pytest.raises(ValueError):
+        sink.write(z)
+
+
+def test_async_sink_error():
+    file = _BlockedWriter()
+    sink = AsyncSink(SampleWriter(file), 2)
+    z = np.zeros(4)
+    sink.write(z)
+    sink.write(z)
+    # the first buffer is being written, and the second is queued, so the third waits
+    Timer(.05, file.event.set).start()
+    sink.write(z)
+    assert sink.stalled >= .04
+    with pytest.raises(BrokenPipeError):
+        sink.close()
+    with pytest.raises(BrokenPipeError):
+        sink.write(z)
+    assert sink.chunks == 3
@@ -0,0 +1,39 @@
+from queue import Empty
+
+import numpy as np
+import pytest
+
+from misc.bounded_queue import BoundedQueue
+from misc.io_args import OverrunPolicy
+
+
+def test_bounded_queue():
+    with pytest.raises(ValueError):
+        BoundedQueue(0)
+
+    buffer = BoundedQueue(2)
+    assert OverrunPolicy.BLOCK == buffer.policy
+    for i in range(2):
+        assert buffer.put(np.full(4, i))
+    # a blocked chunk is only counted once, however many times it is retried
+    assert not buffer.put(np.full(4, 2), 0.01)
+    assert not buffer.put(np.full(4, 2), 0.01)
+    assert buffer.overflows == 1
+    assert buffer.dropped == 0
+    assert np.all(buffer.get() == 0)
+    assert buffer.put(np.full(4, 2), 1)
+    assert np.all(buffer.get() == 1)
+    assert np.all(buffer.get() == 2)
+    buffer.close()
+
+
+def test_bounded_queue_drop():
+    buffer = BoundedQueue(1, OverrunPolicy.DROP)
+    for i in range(4):
+        assert buffer.put(np.full(4, i), 1)
+    assert buffer.overflows == 3
+    assert buffer.dropped == 3
+    assert np.all(buffer.get() == 3)
+    with pytest.raises(Empty):
+        buffer.get(timeout=0.01)
+    buffer.close()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from misc.history_ring import HistoryRing
+
+
+def test_history_ring():
+    with pytest.raises(ValueError):
+        HistoryRing(0)
+
+    data = np.random.default_rng(0).integers(0, 256, 1000, dtype=np.uint8).tobytes()
+    ring = HistoryRing(256)
+    for i in range(0, len(data), 100):
+        ring.append(data[i:i + 100])
+    assert 1000 == ring.end
+    assert 744 == ring.start
+    # across the wrap
+    assert data[744:] == ring.read(744, 1000)
+    assert data[800:900] == ring.read(800, 900)
+    with pytest.raises(ValueError):
+        ring.read(700, 800)
+    with pytest.raises(ValueError):
+        ring.read(900, 1001)
+
+    # more than it holds at once
+    ring.append(data)
+    assert data[-256:] == ring.read(ring.start, ring.end)
+    assert 2000 == ring.end
+
+    ring.resize(128)
+    assert ring.start == ring.end == 2000
+    ring.append(data[:64])
+    assert data[:64] == ring.read(2000, 2064)
+    ring.close()
+
+
+def test_history_ring_file(tmp_path):
+    data = np.random.default_rng(1).integers(0, 256, 1000, dtype=np.uint8).tobytes()
+    ring = HistoryRing(300, str(tmp_path / 'history'))
+    for i in range(0, len(data), 128):
+        ring.append(data[i:i + 128])
+    assert data[700:] == ring.read(700, 1000)
+    ring.resize(100)
+    ring.append(data[:50])
+    assert data[:50] == ring.read(1000, 1050)
+    ring.close()
+    assert 100 == (tmp_path / 'history').stat().st_size
@@ -0,0 +1,139 @@
+import os
+from socket import socket, AF_INET, AF_UNIX, SOCK_DGRAM, SOCK_STREAM, SOCK_SEQPACKET
+from threading import Thread
+from time import sleep
+
+import numpy as np
+import pytest
+
+from misc.outputs import (openOutput, UdpSink, FifoSink, UnixSink, DATAGRAM_HEADER, UNIX,
+                          UNIX_PACKET)
+
+
+def test_udp_sink():
+    with socket(AF_INET, SOCK_DGRAM) as receiver:
+        receiver.bind(('localhost', 0))
+        receiver.settimeout(5)
+        port = receiver.getsockname()[1]
+        encoding = np.dtype('>f8')
+        z = np.arange(20000, dtype=encoding)
+
+        with openOutput(f'udp://localhost:{port - 1}', encoding, 1) as sink:
+            assert isinstance(sink, UdpSink)
+            assert sink.payload % encoding.itemsize == 0
+            assert sink.write(z) == z.nbytes
+            sent = sink.sequence
+
+        received = []
+        for _ in range(sent):
+            received.append(receiver.recv(1 << 16))
+        assert sent == len(received) > 1
+        index = 0
+        for i, datagram in enumerate(received):
+            fmt, channel, sequence, first = DATAGRAM_HEADER.unpack_from(datagram)
+            samples = np.frombuffer(datagram[DATAGRAM_HEADER.size:], dtype=fmt.decode())
+            assert (b'>d', 1, i, index) == (fmt, channel, sequence, first)
+            assert np.all(samples == z[index:index + samples.size])
+            index += samples.size
+        assert index == z.size
+
+
+def test_udp_sink_refused():
+    with socket(AF_INET, SOCK_DGRAM) as unused:
+        unused.bind(('localhost', 0))
+        port = unused.getsockname()[1]
+    # nobody listening is not an error
+    with UdpSink('localhost', port, np.dtype('<h')) as sink:
+        for _ in range(4):
+            sink.write(np.zeros(16, dtype='<h'))
+        assert 4 == sink.sequence
+
+
+def test_open_output(tmp_path):
+    with openOutput(str(tmp_path / 'out.bin'), np.dtype(np.float64)) as file:
+        file.write(b'\0' * 8)
+    assert 8 == (tmp_path / 'out.bin').stat().st_size
+
+
+def test_fifo_sink(tmp_path):
+    path = tmp_path / 'fifo'
+    with openOutput(f'fifo://{path}', np.dtype(np.float64), 0, 'vfo') as sink:
+        assert isinstance(sink, FifoSink)
+        # nobody is reading, yet
+        assert not sink.attached
+        assert 8 == sink.write(b'\0' * 8)
+        assert 8 == sink.discarded
+
+        fd = os.open(sink.path, os.O_RDONLY | os.O_NONBLOCK)
+        sink.write(b'\1' * 8)
+        assert sink.attached
+        assert os.read(fd, 16) == b'\1' * 8
+        os.close(fd)
+        # the reader leaving is not an error, unless it was waited for
+        sink.write(b'\2' * 8)
+        assert not sink.attached
+        assert 16 == sink.discarded
+        assert os.path.exists(sink.path)
+    assert not os.path.exists(sink.path)
+
+
+def test_fifo_sink_slow_reader(tmp_path):
+    path = tmp_path / 'fifo'
+    chunk = 1 << 12
+    with openOutput(f'fifo://{path}', np.dtype(np.float64), 0, 'vfo') as sink:
+        fd = os.open(sink.path, os.O_RDONLY | os.O_NONBLOCK)
+        # far more than the pipe holds, yet a reader that is not reading holds nothing up
+        for i in range(64):
+            sink.write(bytes([i]) * chunk)
+        assert sink.dropped > 0
+        data = bytearray()
+
+        def drain():
+            try:
+                while block := os.read(fd, 1 << 16):
+                    data.extend(block)
+            except BlockingIOError:
+                pass
+
+        drain()
+        # a chunk the pipe took in part is finished before the next
+        sink.write(b'\xff' * chunk)
+        drain()
+        os.close(fd)
+    assert 0 == len(data) % chunk
+    assert 65 * chunk == len(data) + sink.dropped
+    assert all(1 == len(set(data[i:i + chunk])) for i in range(0, len(data), chunk))
+
+
+@pytest.mark.parametrize('scheme', (UNIX, UNIX_PACKET))
+def test_unix_sink(tmp_path, scheme):
+    path = str(tmp_path / 'sock')
+    encoding = np.dtype('>f8')
+    z = np.arange(1 << 14, dtype=encoding)
+    received = []
+
+    def read():
+        with socket(AF_UNIX, SOCK_SEQPACKET if UNIX_PACKET == scheme else SOCK_STREAM) as sock:
+            for _ in range(100):
+                try:
+                    sock.connect(path)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    sleep(0.01)
+            while data := sock.recv(1 << 17):
+                received.append(data)
+
+    reader = Thread(target=read)
+    reader.start()
+    # opened without a suffix, the sink waits for its reader
+    with openOutput(f'{scheme}://{path}', encoding) as sink:
+        assert isinstance(sink, UnixSink)
+        assert sink.attached
+        sink.write(z)
+    reader.join(5)
+    assert not os.path.exists(path)
+    assert b''.join(received) == z.tobytes()
+    if UNIX_PACKET == scheme:
+        # message boundaries are kept
+        assert all(len(data) == len(received[0]) for data in received)
+        assert len(received) == 2
@@ -1,8 +1,9 @@
 from string import ascii_letters
 
+import numpy as np
 import pytest
 
-from misc.read_file import readFile, generateDomain
+from misc.read_file import readFile, generateDomain, generateLut
 
 def test_read_file():
     with pytest.raises(ValueError) as e:
@@ -20,4 +21,29 @@ def test_generate_domain():
 
     for c in tuple(filter(lambda i: i not in chars, {*ascii_letters})):
         domain = generateDomain(c)
-        assert domain is None
\ No newline at end of file
+        assert domain is None
+
+
+def test_generate_lut():
+    data = np.random.default_rng(1234).integers(0, 256, 4096, dtype=np.uint8)
+    for c in ('B', 'b', '<h', '>h', '<H', '>H'):
+        bitsPerSample = np.dtype(c)
+        y = np.frombuffer(data, np.dtype([('re', bitsPerSample), ('im', bitsPerSample)]))
+        for complexType in (np.complex64, np.complex128):
+            for normalize in (False, True):
+                expected = (y['re'] + 1j * y['im']).astype(complexType)
+                if normalize:
+                    xmin, diff = generateDomain(bitsPerSample.char)
+                    expected = 1.6 * (expected - xmin) * diff - 0.8
+
+                lut = generateLut(bitsPerSample, complexType, normalize)
+                assert lut is generateLut(bitsPerSample, complexType, normalize)
+                indices = np.frombuffer(data, np.uint16)
+                if 1 == bitsPerSample.itemsize:
+                    z = lut.take(indices)
+                else:
+                    z = lut[0].take(indices[0::2]) + 1j * lut[1].take(indices[1::2])
+                assert np.max(np.abs(z - expected)) < 1e-6 * np.max(np.abs(expected))
+
+    for c in ('i', 'f', 'd'):
+        assert generateLut(np.dtype(c), np.complex128) is None
@@ -0,0 +1,77 @@
+from io import BytesIO, RawIOBase
+from struct import pack
+
+import numpy as np
+import pytest
+
+from misc.sample_writer import SampleWriter, parseEncoding
+
+
+class _ShortWriter(RawIOBase):
+    # accepts at most a few bytes at a time, as a socket may
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        b = bytes(b[:13])
+        self.data += b
+        return len(b)
+
+
+def test_sample_writer():
+    z = np.random.default_rng(1234).standard_normal((2, 64))
+    file = BytesIO()
+    writer = SampleWriter(file)
+    writer.write(z)
+    # a strided view, and single precision are converted
+    writer.write(z[:, ::2])
+    writer.write(z.astype(np.float32))
+    assert file.getvalue() == pack('@' + 128 * 'd', *z.flat) \
+           + pack('@' + 64 * 'd', *z[:, ::2].flat) \
+           + pack('@' + 128 * 'd', *z.astype(np.float32).flat)
+
+    file = _ShortWriter()
+    writer = SampleWriter(file, parseEncoding(None, '>'))
+    assert writer.dtype == np.dtype('>f8')
+    for row in z:
+        writer.write(row)
+    assert bytes(file.data) == b''.join(pack('!' + str(row.size) + 'd', *row) for row in z)
+
+
+def test_parse_encoding():
+    assert parseEncoding(None) == np.dtype('=f8')
+    assert parseEncoding('h') == np.dtype('=h')
+    assert parseEncoding('h', '>') == np.dtype('>h')
+    assert parseEncoding('<I', '>') == np.dtype('<u4')
+    assert parseEncoding('!f') == np.dtype('>f4')
+    assert parseEncoding('B', '>') == np.dtype('B')
+    for encoding in ('q', '<', '>hh', ''):
+        with pytest.raises(ValueError):
+            parseEncoding(encoding)
+
+
+def test_integer_encodings():
+    z = np.linspace(-1.25, 1.25, 1001)
+    for encoding in ('b', 'B', 'h', '>h', 'H', 'i', '>I'):
+        dt = parseEncoding(encoding)
+        half = 2. ** (8 * dt.itemsize - 1)
+        offset = half if 'u' == dt.kind else 0
+        for dither in (False, True):
+            file = BytesIO()
+            writer = SampleWriter(file, dt, 0.5, dither)
+            writer.write(z)
+            writer.write(2 * z)
+            y = np.frombuffer(file.getvalue(), dt).astype(np.float64)
+            # [-1, 1) maps onto the full scale; dither may push samples near its edges either way
+            margin = 1.5 / half if dither else 0
+            assert (np.count_nonzero((z < -1 - margin) | (z >= 1 + margin))
+                    <= writer.clipped
+                    <= np.count_nonzero((z < -1 + margin) | (z >= 1 - margin)))
+            expected = np.concatenate((.5 * z, z)) * half + offset
+            error = np.abs(y - np.clip(expected, offset - half, offset + half - 1))
+            # rounding is within half an lsb, and dither adds at most one more, which some samples show
+            assert np.max(error) <= (1.5 if dither else .5)
+            assert dither == (np.max(error) > .5)
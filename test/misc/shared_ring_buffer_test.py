@@ -0,0 +1,110 @@
+from multiprocessing import Process, Value
+from queue import Empty
+
+import numpy as np
+import pytest
+
+from misc.io_args import OverrunPolicy
+from misc.shared_ring_buffer import SharedRingBuffer
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer(8, 4, 2, np.complex128)
+    yield ring
+    ring.release()
+
+
+def _consume(consumer, res):
+    total = 0j
+    while len(z := consumer.get()):
+        total += z.sum()
+    res.value = total.real
+    consumer.close()
+
+
+def test_shared_ring_buffer(ring):
+    with pytest.raises(ValueError):
+        SharedRingBuffer(8, 1, 1, np.complex128)
+
+    a = ring.consumer()
+    b = ring.consumer(OverrunPolicy.BLOCK)
+    with pytest.raises(ValueError):
+        ring.consumer()
+
+    for i in range(3):
+        assert ring.put(np.full(8 - i, i, dtype=np.complex128))
+    with pytest.raises(ValueError):
+        ring.put(np.zeros(9))
+
+    for i in range(3):
+        za = a.get()
+        zb = b.get()
+        assert za.size == zb.size == 8 - i
+        assert np.all(za == i) and np.all(zb == i)
+
+    with pytest.raises(Empty):
+        a.get(timeout=0.01)
+    with pytest.raises(Empty):
+        a.get(False)
+
+    ring.close()
+    assert ring.closed
+    assert a.get() == b''
+    with pytest.raises(ValueError):
+        ring.put(np.zeros(1))
+
+
+def test_overrun_policies(ring):
+    block = ring.consumer(OverrunPolicy.BLOCK)
+    drop = ring.consumer(OverrunPolicy.DROP)
+
+    for i in range(ring.slots):
+        assert ring.put(np.full(8, i, dtype=np.complex128))
+    # the blocking consumer has read nothing, so the oldest slot cannot be overwritten, whereas the
+    # dropping consumer's oldest chunk is skipped
+    assert not ring.put(np.zeros(8), 0.01)
+    assert not ring.put(np.zeros(8), 0.01)
+    assert block.overflows == 1
+    assert drop.dropped == 1
+
+    # the dropping consumer only reads the latest chunk
+    assert np.all(drop.get() == 3)
+    assert drop.dropped == 3
+    for i in range(2):
+        assert np.all(block.get() == i)
+    assert ring.put(np.full(8, 4, dtype=np.complex128))
+
+    # the slot being read is never overwritten, whatever the policy
+    for i in range(2, 5):
+        assert np.all(block.get() == i)
+    for i in range(5, 7):
+        assert ring.put(np.full(8, i, dtype=np.complex128))
+        assert np.all(block.get() == i)
+    assert not ring.put(np.zeros(8), 0.01)
+
+    block.close()
+    assert np.all(drop.get() == 6)
+    assert drop.dropped == 5
+    assert ring.put(np.full(8, 7, dtype=np.complex128))
+    ring.close()
+    assert np.all(drop.get() == 7)
+    assert drop.get() == b''
+    assert block.overflows == 1
+
+
+def test_shared_ring_buffer_process(ring):
+    res = Value('d', 0)
+    proc = Process(target=_consume, args=(ring.consumer(OverrunPolicy.BLOCK), res))
+    proc.start()
+
+    expected = 0
+    for i in range(64):
+        z = np.full(1 + i % 8, i, dtype=np.complex128)
+        expected += z.sum().real
+        while not ring.put(z, 0.1):
+            assert proc.exitcode is None
+    ring.close()
+    proc.join(30)
+    assert 0 == proc.exitcode
+    assert expected == res.value
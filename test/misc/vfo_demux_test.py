@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from misc.vfo_demux import VfoDemux
+from misc.vfo_server import VfoServer, FRAME_HEADER
+
+
+def test_vfo_demux(waitFor):
+    channels = (100, 200, 300)
+    with VfoServer('localhost', 0, channels) as server:
+        with pytest.raises(ConnectionError):
+            VfoDemux(*server.address, (400,))
+
+        demux = VfoDemux(*server.address, (300, 100))
+        everything = VfoDemux(*server.address)
+        assert demux.frequencies == everything.frequencies == list(channels)
+        assert waitFor(lambda: all(server.subscribed(i) for i in range(3)))
+
+        index = 0
+        for i in range(3):
+            chunks = [np.arange(4 + i, dtype='>f8') + 100 * j for j in range(2)]
+            chunks.append(np.arange(4 + i, dtype='<h'))
+            server.publish(chunks, index)
+            index += 4 + i
+    with demux, everything:
+        frames = list(demux)
+        assert [(f.channel, f.frequency) for f in frames] == [(2, 300), (0, 100)] * 3
+        assert [f.index for f in frames[::2]] == [0, 4, 9]
+        assert all(f.samples.dtype == np.dtype('<h') for f in frames[::2])
+        assert np.all(frames[-1].samples == np.arange(6))
+        assert 9 == len(list(everything))
+        assert not demux.lost
+
+
+def test_vfo_demux_lost(waitFor):
+    with VfoServer('localhost', 0, (100,)) as server:
+        demux = VfoDemux(*server.address, (100,))
+        assert waitFor(lambda: server.subscribed(0))
+        for index in (0, 8, 24):
+            server.publish([np.zeros(8)], index)
+    with demux:
+        assert [f.index for f in demux] == [0, 8, 24]
+        assert {100: 8} == demux.lost
+    assert 16 == FRAME_HEADER.size
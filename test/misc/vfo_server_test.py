@@ -0,0 +1,129 @@
+from socket import create_connection
+from threading import Thread
+from time import sleep
+
+import numpy as np
+import pytest
+
+from misc.io_args import OverrunPolicy
+from misc.vfo_server import VfoServer, VfoClient
+
+
+def _connect(server, request: bytes):
+    sock = create_connection(server.address)
+    sock.sendall(request)
+    return sock
+
+
+def test_vfo_server(receive, waitFor):
+    with pytest.raises(ValueError):
+        VfoServer('localhost', 0, (1, 2), maxBuffered=0)
+
+    with VfoServer('localhost', 0, (100, 200)) as server:
+        # nothing is waited for; chunks of vfos without clients are just discarded
+        server.publish([np.zeros(4), None])
+        assert not server.subscribed(0)
+
+        # an empty request is served the first vfo without a client
+        first = _connect(server, b'\n')
+        assert waitFor(lambda: server.subscribed(0))
+        second = _connect(server, b'200\n')
+        both = _connect(server, b'200,100\n')
+        assert waitFor(lambda: server.subscribed(1) and 4 == sum(
+            len(c.channels) for c in server._clients.values()))
+        for request in (b'300\n', b'x' * 8192):
+            with _connect(server, request) as invalid:
+                assert receive(invalid, 1) == b''
+
+        chunks = [np.arange(i, i + 4, dtype='>f8') for i in (0, 100)]
+        for _ in range(2):
+            server.publish(chunks)
+        assert receive(first, 64) == chunks[0].tobytes() * 2
+        assert receive(second, 64) == chunks[1].tobytes() * 2
+        # samples of several vfos are interleaved in the order requested
+        assert receive(both, 128) == np.stack(chunks[::-1], axis=1).tobytes() * 2
+
+        # late joiners pick up from the next chunk
+        late = _connect(server, b'*\n')
+        assert waitFor(lambda: 3 == len(server._subscribers[0]))
+        server.publish(chunks)
+        assert receive(late, 64) == np.stack(chunks, axis=1).tobytes()
+        assert receive(first, 32) == chunks[0].tobytes()
+        first.close()
+        server.publish(chunks)
+    # whatever was sent is delivered before the clients are disconnected
+    for client, size in ((second, 64), (both, 128), (late, 64)):
+        assert len(receive(client, size + 1)) == size
+        client.close()
+
+
+@pytest.mark.parametrize('policy', (OverrunPolicy.DROP, OverrunPolicy.DISCONNECT))
+def test_vfo_server_overrun(policy, receive, waitFor):
+    with VfoServer('localhost', 0, (100, 200), policy, 1 << 16) as server:
+        stalled, client = _connect(server, b'100\n'), _connect(server, b'200\n')
+        assert waitFor(lambda: server.subscribed(0) and server.subscribed(1))
+        chunk = np.zeros(1 << 11)
+        received = 0
+        # far more than the stalled client's socket, and buffer can hold
+        for _ in range(256):
+            server.publish([chunk, chunk])
+            received += len(receive(client, chunk.nbytes))
+        assert received == 256 * chunk.nbytes
+        if OverrunPolicy.DISCONNECT == policy:
+            assert not server.subscribed(0)
+        else:
+            assert server.subscribed(0)
+    stalled.close()
+    client.close()
+
+
+def test_vfo_server_block(receive, waitFor):
+    # each chunk is larger than the client's whole buffer
+    chunks = [np.arange(256, dtype='>f8') + i for i in range(32)]
+    with VfoServer('localhost', 0, (100,), OverrunPolicy.BLOCK, 1024) as server:
+        client = _connect(server, b'100\n')
+        client.settimeout(5)
+        assert waitFor(lambda: server.subscribed(0))
+
+        def publish():
+            for chunk in chunks:
+                server.publish([chunk])
+
+        publisher = Thread(target=publish, daemon=True)
+        publisher.start()
+        received = []
+        # a slow reader holds the producer back, but loses nothing
+        for _ in chunks:
+            received.append(receive(client, chunks[0].nbytes))
+            sleep(0.005)
+        publisher.join(5)
+        assert not publisher.is_alive()
+        assert b''.join(chunk.tobytes() for chunk in chunks) == b''.join(received)
+    client.close()
+
+
+def test_vfo_server_drop_pinned():
+    with VfoServer('localhost', 0, (100,), OverrunPolicy.DROP, 8) as server:
+        client = VfoClient(None, None)
+        with server._condition:
+            for i in range(3):
+                server._enqueue(client, memoryview(bytes([i]) * 2), 0.)
+            # the first two chunks are being sent, outside the condition
+            client.inflight = 2
+            server._enqueue(client, memoryview(b'\3' * 4), 0.)
+        assert [b'\0\0', b'\1\1', b'\3' * 4] == [bytes(data) for data, _ in client.pending]
+        assert 1 == client.dropped
+
+
+def test_vfo_server_silent_client(receive, waitFor):
+    with VfoServer('localhost', 0, (100, 200)) as server:
+        first = _connect(server, b'100\n')
+        # a client that never sends a request gets the first vfo without one
+        silent = create_connection(server.address)
+        assert waitFor(lambda: server.subscribed(1))
+        chunk = np.arange(8, dtype='>f8')
+        server.publish([chunk, 2 * chunk])
+        assert (2 * chunk).tobytes() == receive(silent, chunk.nbytes)
+        assert chunk.tobytes() == receive(first, chunk.nbytes)
+    first.close()
+    silent.close()
@@ -0,0 +1,157 @@
+from multiprocessing import Value
+from socket import create_server, create_connection, SOL_SOCKET, SO_LINGER
+from struct import pack
+from threading import Thread
+from time import sleep
+
+import numpy as np
+import pytest
+
+from misc.vfo_server import FRAME_HEADER
+from sdr.narrowband_server import NarrowbandServer, NarrowbandChannel
+from sdr.socket_receiver import SocketReceiver
+
+_FS = 1024000
+_OFFSET = 100000
+
+
+def _tone(n, f):
+    z = 0.5 * np.exp(2j * np.pi * f / _FS * np.arange(n))
+    iq = np.empty(2 * n)
+    iq[0::2] = z.real
+    iq[1::2] = z.imag
+    return np.round(127.5 + 127.5 * iq).astype(np.uint8).tobytes()
+
+
+class _Upstream:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.sock = create_server(('localhost', 0))
+        self.thread = Thread(target=self._serve)
+        self.thread.start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            # wait for the clients to connect
+            sleep(0.5)
+            for i in range(0, len(self.data), 1 << 15):
+                conn.sendall(self.data[i:i + (1 << 15)])
+                sleep(0.005)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.thread.join(10)
+        self.sock.close()
+
+
+def _serve(upstream, test):
+    isDead = Value('b', 0)
+    with SocketReceiver(isDead, *upstream.sock.getsockname(), fs=_FS) as receiver:
+        with NarrowbandServer(receiver, 'localhost') as server:
+            pt = Thread(target=receiver.receive)
+            pt.start()
+            try:
+                test(server)
+            finally:
+                isDead.value = 1
+                receiver.disconnect()
+                pt.join(5)
+
+
+def test_narrowband_channel():
+    with pytest.raises(ValueError):
+        NarrowbandChannel(_FS, _FS, 8)
+    with pytest.raises(ValueError):
+        NarrowbandChannel(_FS, 0, 8, _FS)
+    with pytest.raises(ValueError):
+        NarrowbandChannel(_FS, 0, 1)
+    stream = NarrowbandChannel(_FS, _OFFSET, 8, 20000)
+    assert (_OFFSET, 8, 20000) == stream.spec
+    x = (np.frombuffer(_tone(8192, _OFFSET), np.uint8).astype(np.float32).view(np.complex64)
+         - (127.5 + 127.5j)) / 128
+    y = stream(x)
+    assert np.dtype('>c8') == y.dtype
+    assert 1024 == y.size == stream.index
+
+
+def test_narrowband_server(receive):
+    n = 1 << 18
+    with _Upstream(_tone(n, _OFFSET)) as upstream:
+        def test(server):
+            with create_connection(server.address) as client:
+                client.sendall(b'%d 32\n' % _OFFSET)
+                y = np.frombuffer(receive(client, n // 32 * 8), dtype='>c8')
+            # only the decimated stream is sent, and the tone was shifted to dc
+            assert n // 32 == y.size
+            y = y[y.size // 4:]
+            assert np.allclose(np.abs(y), 0.5, atol=0.05)
+            assert np.std(np.diff(np.unwrap(np.angle(y)))) < 0.01
+
+        _serve(upstream, test)
+
+
+def test_narrowband_server_framed(receive):
+    n = 1 << 18
+    with _Upstream(_tone(n, _OFFSET)) as upstream:
+        def test(server):
+            with create_connection(server.address) as client:
+                client.sendall(b'framed %d 16, -200000 32 8000\n' % _OFFSET)
+                assert b'100000,-200000\n' == receive(client, 15)
+                counts = [0, 0]
+                while sum(counts) < n // 16 + n // 32:
+                    fmt, channel, count, index = FRAME_HEADER.unpack(
+                        receive(client, FRAME_HEADER.size))
+                    assert b'>F' == fmt
+                    # each stream's indices are of its own rate
+                    assert counts[channel] == index
+                    assert count * 8 == len(receive(client, count * 8))
+                    counts[channel] += count
+                assert [n // 16, n // 32] == counts
+
+        _serve(upstream, test)
+
+
+def test_narrowband_server_invalid(receive):
+    with _Upstream(b'') as upstream:
+        def test(server):
+            for request in (b'100000\n', b'abc 8\n', b'%d 8\n' % _FS, b'0 8, 1000 16\n', b'0 1\n',
+                            b'0 8, 1000 8 %d\n' % _FS):
+                with create_connection(server.address) as client:
+                    client.sendall(request)
+                    assert b'' == receive(client, 1)
+            # nothing was created for the requests that were only valid in part
+            assert [] == server.channels
+
+        _serve(upstream, test)
+
+
+def _reset(sock):
+    # rather than half-closing, which the server only notices once sending fails
+    sock.setsockopt(SOL_SOCKET, SO_LINGER, pack('ii', 1, 0))
+    sock.close()
+
+
+def test_narrowband_server_free(receive, waitFor):
+    with _Upstream(b'') as upstream:
+        def test(server):
+            first = create_connection(server.address)
+            first.sendall(b'100000 8\n')
+            assert waitFor(lambda: [100000] == server.channels)
+            second = create_connection(server.address)
+            second.sendall(b'framed 200000 8, 100000 8\n')
+            assert b'100000,200000\n' == receive(second, 14)
+            _reset(second)
+            # the stream still shared is kept, and the other's number is free for the next
+            assert waitFor(lambda: [100000] == server.channels)
+            third = create_connection(server.address)
+            third.sendall(b'framed 300000 8\n')
+            assert b'100000,300000\n' == receive(third, 14)
+            _reset(third)
+            assert waitFor(lambda: [100000] == server.channels)
+            _reset(first)
+            assert waitFor(lambda: [] == server.channels)
+
+        _serve(upstream, test)
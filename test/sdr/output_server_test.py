@@ -0,0 +1,78 @@
+from multiprocessing import Value
+from socket import (socket, create_server, create_connection, AF_INET, SOCK_STREAM, SOL_SOCKET,
+                    SO_RCVBUF)
+from threading import Thread
+from time import sleep
+
+import numpy as np
+
+from misc.io_args import OverrunPolicy
+from sdr.output_server import OutputServer, COMMAND, REWIND
+from sdr.rtl_tcp_emulator import RtlTcpEmulator, DONGLE_HEADER, RTL0
+from sdr.socket_receiver import SocketReceiver
+
+
+def test_output_server(receive):
+    data = np.random.default_rng(0).integers(0, 256, 1 << 22, dtype=np.uint8).tobytes()
+    isDead = Value('b', 0)
+    with create_server(('localhost', 0)) as upstream:
+        def serve():
+            conn, _ = upstream.accept()
+            with conn:
+                # wait for the clients to connect, and then stream at about 6 MB/s, like a dongle
+                sleep(0.5)
+                for i in range(0, len(data), 1 << 16):
+                    conn.sendall(data[i:i + (1 << 16)])
+                    sleep(0.01)
+
+        feeder = Thread(target=serve)
+        feeder.start()
+        with SocketReceiver(isDead, *upstream.getsockname(), fs=3200000) as receiver:
+            with OutputServer(receiver, 'localhost', OverrunPolicy.DISCONNECT, 1 << 20) as server:
+                address = server.socket.getsockname()
+                clients = [create_connection(address) for _ in range(8)]
+                # one client stalls, which neither holds back, nor corrupts the others' streams
+                stalled = socket(AF_INET, SOCK_STREAM)
+                stalled.setsockopt(SOL_SOCKET, SO_RCVBUF, 1 << 12)
+                stalled.connect(address)
+                received = [b''] * len(clients)
+
+                def read(i):
+                    received[i] = receive(clients[i], len(data))
+
+                readers = [Thread(target=read, args=(i,)) for i in range(len(clients))]
+                for reader in readers:
+                    reader.start()
+                for reader in readers:
+                    reader.join(30)
+                assert all(data == r for r in received)
+                feeder.join(5)
+                # whereas the stalled client was disconnected
+                assert len(receive(stalled, len(data))) < len(data)
+            isDead.value = 1
+        for client in clients:
+            client.close()
+        stalled.close()
+
+
+def test_output_server_rewind(tmp_path, receive):
+    data = np.random.default_rng(1).integers(0, 256, 2 * 64000 * 4, dtype=np.uint8)
+    path = tmp_path / 'iq.raw'
+    data.tofile(path)
+    stream = DONGLE_HEADER.pack(RTL0, 5, 29) + data.tobytes()
+    isDead = Value('b', 0)
+    with RtlTcpEmulator(str(path), fs=64000, enc='B') as upstream:
+        with SocketReceiver(isDead, *upstream.address, fs=64000, history=1) as receiver:
+            assert 128000 == receiver.history.size
+            with OutputServer(receiver, 'localhost') as server:
+                sleep(1)
+                with create_connection(server.socket.getsockname()) as client:
+                    client.sendall(COMMAND.pack(REWIND, 500))
+                    # half a second of samples, sent as fast as they are read
+                    replayed = receive(client, 64000)
+                    # whatever live data came before the replay, the rest is from half a second ago
+                    i = stream.find(replayed[-32000:])
+                    assert 0 < i
+                    # and the stream carries on live seamlessly
+                    assert stream[i + 32000:i + 64000] == receive(client, 32000)
+            isDead.value = 1
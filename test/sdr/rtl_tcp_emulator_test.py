@@ -0,0 +1,104 @@
+from socket import create_connection, SOL_SOCKET, SO_LINGER
+from struct import pack
+from time import perf_counter, sleep
+import wave
+
+import numpy as np
+import pytest
+
+from sdr.rtl_tcp_commands import RtlTcpCommands
+from sdr.rtl_tcp_emulator import RtlTcpEmulator, DONGLE_HEADER, RTL0, toUint8
+
+
+@pytest.fixture
+def raw(tmp_path):
+    data = np.random.default_rng(0).integers(0, 256, 2 * 32000, dtype=np.uint8)
+    path = tmp_path / 'iq.raw'
+    data.tofile(path)
+    return str(path), data.tobytes()
+
+
+def test_emulator_paced(raw, receive):
+    path, data = raw
+    with RtlTcpEmulator(path, fs=64000, enc='B') as emulator:
+        with create_connection(emulator.address) as client:
+            magic, _, _ = DONGLE_HEADER.unpack(receive(client, DONGLE_HEADER.size))
+            assert RTL0 == magic
+            start = perf_counter()
+            assert data == receive(client, len(data) + 1)
+            # half a second of samples, which ends the connection
+            assert 0.4 < perf_counter() - start < 1.5
+
+
+def test_emulator_speed(raw, receive):
+    path, data = raw
+    with RtlTcpEmulator(path, fs=64000, enc='B', speed=float('inf'), loop=True) as emulator:
+        with create_connection(emulator.address) as client:
+            receive(client, DONGLE_HEADER.size)
+            start = perf_counter()
+            assert 3 * data == receive(client, 3 * len(data))
+            assert perf_counter() - start < 0.4
+
+
+def test_emulator_commands(raw, receive):
+    path, data = raw
+    with RtlTcpEmulator(path, fs=64000, enc='B') as emulator:
+        with create_connection(emulator.address) as client:
+            receive(client, DONGLE_HEADER.size)
+            client.sendall(pack('!BI', RtlTcpCommands.SET_FREQUENCY.value, 162550000))
+            # a quarter of the rate, i.e. four times as long
+            client.sendall(pack('!BI', RtlTcpCommands.SET_SAMPLE_RATE.value, 16000))
+            sleep(0.1)
+            assert 162550000 == emulator.commands[RtlTcpCommands.SET_FREQUENCY]
+            assert 16000 == emulator.fs
+            start = perf_counter()
+            receive(client, len(data) // 4)
+            assert perf_counter() - start > 0.3
+
+
+def test_emulator_client_reset(raw, receive):
+    path, data = raw
+    with RtlTcpEmulator(path, fs=64000, enc='B', speed=float('inf')) as emulator:
+        for _ in range(4):
+            # gone before, or while being sent the header
+            client = create_connection(emulator.address)
+            client.setsockopt(SOL_SOCKET, SO_LINGER, pack('ii', 1, 0))
+            client.close()
+        # which leaves the emulator serving the next client
+        with create_connection(emulator.address, 5) as client:
+            assert RTL0 == DONGLE_HEADER.unpack(receive(client, DONGLE_HEADER.size))[0]
+            assert data == receive(client, len(data))
+
+
+def test_emulator_wav(tmp_path, receive):
+    z = np.exp(2j * np.pi * np.arange(4096) / 64)
+    x = np.empty(2 * z.size, dtype='<h')
+    x[0::2] = np.rint(32767 * z.real)
+    x[1::2] = np.rint(32767 * z.imag)
+    path = str(tmp_path / 'iq.wav')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(48000)
+        f.writeframes(x.tobytes())
+
+    with RtlTcpEmulator(path, speed=float('inf')) as emulator:
+        assert 48000 == emulator.fs
+        with create_connection(emulator.address) as client:
+            receive(client, DONGLE_HEADER.size)
+            y = np.frombuffer(receive(client, x.size + 1), dtype=np.uint8)
+    assert np.array_equal(toUint8(x), y)
+    assert np.allclose((y[0::2] - 127.5) / 127.5, z.real, atol=0.01)
+
+
+def test_emulator_invalid(tmp_path):
+    path = str(tmp_path / 'mono.wav')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(48000)
+        f.writeframes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        RtlTcpEmulator(path)
+    with pytest.raises(ValueError):
+        RtlTcpEmulator(path, speed=0)
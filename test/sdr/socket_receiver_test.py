@@ -0,0 +1,30 @@
+from multiprocessing import Value
+
+import pytest
+
+from sdr.socket_receiver import SocketReceiver
+
+
+def test_socket_receiver_buffer_size():
+    isDead = Value('b', 0)
+    with SocketReceiver(isDead) as receiver:
+        assert 8192 == receiver.bufferSize
+    # about 10 ms of the stream, in whole multiples of the minimum
+    with SocketReceiver(isDead, fs=2400000) as receiver:
+        assert 49152 == receiver.bufferSize
+        receiver.reset(250000)
+        assert 8192 == receiver.bufferSize
+        receiver.reset(1 << 30)
+        assert 1 << 20 == receiver.bufferSize
+
+
+def test_socket_receiver_history():
+    isDead = Value('b', 0)
+    with pytest.raises(ValueError):
+        SocketReceiver(isDead, history=1)
+    # the history is of the current rate only
+    with SocketReceiver(isDead, fs=1000, history=2) as receiver:
+        receiver.history.append(b'\0' * 100)
+        receiver.reset(2000)
+        assert 8000 == receiver.history.size
+        assert receiver.history.start == receiver.history.end == 100